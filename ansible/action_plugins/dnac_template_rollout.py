@@ -0,0 +1,183 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Ansible action plugin that deploys a template to a list of devices in a single task, using the same engine as
+# "scripts/template_runner.py": one login and one pooled connection for every device, a bounded worker pool,
+# optional batched deploy calls, and one adaptive status poller for all deployments.  Action plugins run on the
+# Ansible controller, so the scripts in this repository are imported directly.  See "library/dnac_template_rollout.py"
+# for the documentation of the task options.
+
+import contextlib
+import io
+import os
+import sys
+from argparse import Namespace
+
+from ansible.errors import AnsibleActionFail
+from ansible.plugins.action import ActionBase
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'scripts')
+
+# Task options copied straight onto the template_runner.py options of the same name
+RUNNER_OPTIONS = ['template_project', 'template_name', 'device_column', 'workers', 'batch_size', 'deploy_timeout', 'timeout',
+                  'rate_limit', 'max_retries', 'request_timeout', 'skip_unchanged', 'changed_only', 'journal', 'resume',
+                  'prefix_match', 'waves', 'canary', 'wave_growth', 'max_wave_size', 'group_by', 'max_per_group',
+                  'max_failure_rate', 'failure_window', 'wave_pause', 'rollback_template']
+
+# Types of the task options.  Options left unset get the template_runner.py defaults.
+ARGUMENT_SPEC = {
+    "dnac_host": {"type": 'str', "required": True},
+    "dnac_port": {"type": 'int', "default": 443},
+    "dnac_username": {"type": 'str', "required": True},
+    "dnac_password": {"type": 'str', "no_log": True},
+    "template_project": {"type": 'str', "required": True},
+    "template_name": {"type": 'str', "required": True},
+    "devices": {"type": 'list', "elements": 'str'},
+    "input_file": {"type": 'str'},
+    "input_data": {"type": 'raw'},
+    "device_column": {"type": 'str'},
+    "workers": {"type": 'int'},
+    "batch_size": {"type": 'int'},
+    "deploy_timeout": {"type": 'int'},
+    "timeout": {"type": 'int'},
+    "rate_limit": {"type": 'float'},
+    "max_retries": {"type": 'int'},
+    "request_timeout": {"type": 'float'},
+    "prefix_match": {"type": 'bool'},
+    "skip_unchanged": {"type": 'bool'},
+    "changed_only": {"type": 'bool'},
+    "journal": {"type": 'str'},
+    "resume": {"type": 'bool'},
+    "waves": {"type": 'bool'},
+    "canary": {"type": 'int'},
+    "wave_growth": {"type": 'float'},
+    "max_wave_size": {"type": 'int'},
+    "group_by": {"type": 'str'},
+    "max_per_group": {"type": 'int'},
+    "max_failure_rate": {"type": 'float'},
+    "failure_window": {"type": 'int'},
+    "wave_pause": {"type": 'float'},
+    "rollback_template": {"type": 'str'},
+    "scripts_dir": {"type": 'str'},
+}
+
+
+def option_error(message):
+    # Used in place of ArgumentParser.error(), so template_runner.py's option checks fail the task instead of exiting.
+    raise AnsibleActionFail(f'Invalid options: {message.replace("--", "")}')
+
+
+def password_required():
+    # Used in place of the password prompt, which cannot be answered from a playbook run.
+    raise AnsibleActionFail('"dnac_password" is required: there is no cached DNA Center token that stays valid for the whole rollout.')
+
+
+class ActionModule(ActionBase):
+
+    TRANSFERS_FILES = False
+    _VALID_ARGS = frozenset(ARGUMENT_SPEC)
+
+    def runner_args(self, runner, task_args):
+        # Build the template_runner.py options for this task, starting from the script's own defaults.
+        server = task_args['dnac_host']
+        port = task_args['dnac_port']
+        if port != 443 and '://' not in server:
+            server = f'{server}:{port}'
+        args = runner.build_parser().parse_args(['--dnac_server', server])
+        args.username = task_args['dnac_username']
+        args.password = task_args.get('dnac_password') or password_required
+        for option in RUNNER_OPTIONS:
+            if task_args.get(option) is not None:
+                setattr(args, option, task_args[option])
+        if task_args.get('input_file'):
+            args.input_file = self._loader.path_dwim(task_args['input_file'])
+        if args.journal:
+            args.journal = self._loader.path_dwim(args.journal)
+        # Check mode previews every device instead of deploying
+        args.preview = self._play_context.check_mode
+        # Apply the same checks as the command line.  The devices and input data come from the task rather than files.
+        parser = runner.build_parser()
+        parser.error = option_error
+        runner.check_args(parser, Namespace(**{**vars(args), "devices_file": args.devices_file or 'devices',
+                                                 "input_file": args.input_file or 'input_data'}))
+        return args
+
+    def read_devices(self, runner, args, task_args):
+        # Return the (device name, input_data) Tuples for the task, the same way template_runner.py reads them.
+        names = task_args.get('devices')
+        if args.device_column:
+            devices = runner.stream_input_devices(args.input_file, args.device_column)
+            return ((x, y) for x, y in devices if x in names) if names else devices
+        input_data = task_args['input_data'] if task_args.get('input_data') is not None else runner.parse_input_file(args.input_file)
+        return ((name, input_data) for name in dict.fromkeys(names))
+
+    def run(self, tmp=None, task_vars=None):
+        result = super().run(tmp, task_vars)
+        _, task_args = self.validate_argument_spec(ARGUMENT_SPEC, required_one_of=[['input_file', 'input_data'], ['devices', 'device_column']],
+                                                   required_by={"device_column": 'input_file'})
+
+        scripts_dir = os.path.abspath(task_args.get('scripts_dir') or SCRIPTS_DIR)
+        if scripts_dir not in sys.path:
+            sys.path.insert(0, scripts_dir)
+        import template_runner as runner
+
+        # template_runner.py prints its progress and calls sys.exit() on errors, so its output is captured and returned
+        output = io.StringIO()
+        results = []
+        try:
+            with contextlib.redirect_stdout(output):
+                args = self.runner_args(runner, task_args)
+                runner.verbose = False
+                runner.metrics = runner.journal = runner.deploy_state = runner.render_cache = runner.renderer = runner.event_receiver = None
+                client = runner.setup_client(args)
+                try:
+                    template = runner.lookup_template(client, args)
+                    if args.skip_unchanged or args.changed_only:
+                        runner.open_deploy_state(args)
+                    if args.journal:
+                        runner.open_journal(args)
+                    results = runner.run_devices(client, args, template, self.read_devices(runner, args, task_args))
+                finally:
+                    for state in [runner.journal, runner.deploy_state, client]:
+                        if state:
+                            state.close()
+        except SystemExit:
+            result['failed'] = True
+            result['msg'] = 'The rollout stopped early - see "stdout_lines".'
+        except (OSError, ValueError) as e:
+            result['failed'] = True
+            result['msg'] = f'{type(e).__name__}: {e}'
+        result['stdout_lines'] = output.getvalue().splitlines()
+
+        devices = {}
+        for device_result in results:
+            devices[device_result['device_name']] = {x: device_result.get(x) for x in ['status', 'device_id', 'deploy_id', 'elapsed', 'change', 'result']}
+        failed = sorted(x for x, y in devices.items() if y['status'] not in ['SUCCESS', 'PREVIEW', 'UNCHANGED'])
+        result['devices'] = devices
+        result['summary'] = {"total": len(devices), "failed": len(failed),
+                             **{x.lower(): len([y for y in devices.values() if y['status'] == x]) for x in ['SUCCESS', 'UNCHANGED', 'PREVIEW']}}
+        result['changed'] = result['summary']['success'] > 0
+        if failed and not result.get('failed'):
+            result['failed'] = True
+            result['msg'] = f'{len(failed)} of {len(devices)} devices did not succeed: {", ".join(failed)}'
+        return result
@@ -0,0 +1,161 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Documentation for the "dnac_template_rollout" task, shown by "ansible-doc -M library dnac_template_rollout".
+# The work is done by the action plugin of the same name in "action_plugins", on the Ansible controller.
+
+DOCUMENTATION = r'''
+module: dnac_template_rollout
+short_description: Deploy a DNA Center template to many devices in one task
+description:
+  - Deploys a template to a list of devices with the same engine as C(scripts/template_runner.py).
+  - Logs in once and shares one pooled connection, deploys to up to O(workers) devices at a time, and checks every
+    deployment in one adaptive status loop until it finishes or O(deploy_timeout) runs out.
+  - In check mode every device is previewed with the Preview API instead of being deployed.
+options:
+  dnac_host:
+    description: DNA Center hostname or IP address.
+    required: true
+  dnac_port:
+    description: DNA Center HTTPS port.
+    default: 443
+  dnac_username:
+    description: DNA Center username.
+    required: true
+  dnac_password:
+    description:
+      - DNA Center password.
+      - Required unless a token cached by an earlier run (in C(~/.dnac_templating/token_cache.json) on the controller)
+        stays valid for at least O(timeout), or O(deploy_timeout) when O(timeout) is not set.  Without it the task fails
+        instead of prompting for the password.
+    required: false
+  template_project:
+    description: Name of the Template Editor project holding the template.
+    required: true
+  template_name:
+    description: Name of the template to deploy.
+    required: true
+  devices:
+    description:
+      - Hostnames of the target devices.
+      - With O(device_column), limits the rollout to these devices; otherwise required.
+    type: list
+  input_file:
+    description: CSV, TXT, YAML, JSON or NDJSON input file, relative to the playbook.  Sent to the template as its C(input_data) variable.
+  input_data:
+    description: Input data to send as the template's C(input_data) variable instead of reading O(input_file), e.g. the list from C(read_csv).
+  device_column:
+    description: Read the target devices from this column (or field) of a CSV or NDJSON O(input_file), sending each device only its own records.
+  workers:
+    description: Maximum number of devices processed at once.
+    default: 10
+  batch_size:
+    description: Deploy to up to this many devices per Deploy API call.  0 deploys one device per call.
+    default: 0
+  deploy_timeout:
+    description: Seconds to wait for each deployment before reporting it as C(TIMEOUT).
+    default: 900
+  timeout:
+    description: Overall number of seconds to wait for all deployments.
+  rate_limit:
+    description: Maximum API calls per second to each DNA Center endpoint.  0 only slows down when DNA Center throttles.
+    default: 0
+  max_retries:
+    description: Number of times a throttled or failed API call is retried.
+    default: 5
+  request_timeout:
+    description: Seconds to wait for each DNA Center API response before treating the call as failed.
+    default: 60
+  prefix_match:
+    description: Allow device names to match the start of a hostname in the local device inventory.
+    type: bool
+  skip_unchanged:
+    description: Skip devices whose rendered configuration is the same as at their last successful deployment.
+    type: bool
+  changed_only:
+    description: Skip devices whose input data and template version are the same as at their last successful deployment.
+    type: bool
+  waves:
+    description:
+      - Deploy in waves, starting with a canary wave of O(canary) devices, each wave O(wave_growth) times larger than the one before.
+      - The rollout halts when any canary device fails, or when more than O(max_failure_rate) of the last O(failure_window) devices failed.
+        Devices that were not started are reported as C(HALTED).
+    type: bool
+  canary:
+    description: Number of devices in the canary wave.
+    default: 1
+  wave_growth:
+    description: Growth factor from one wave to the next.
+    default: 2
+  max_wave_size:
+    description: Largest number of devices in one wave.
+  group_by:
+    description: C(family) or C(platform) from the local inventory, or a field of each device's input data (e.g. C(site)), used by O(max_per_group).
+  max_per_group:
+    description: Largest number of devices from any one O(group_by) group in one wave.
+  max_failure_rate:
+    description: Fraction of failed devices in the last O(failure_window) results that halts the rollout.
+    default: 0.1
+  failure_window:
+    description: Number of most recent device results checked by O(max_failure_rate).
+    default: 50
+  wave_pause:
+    description: Seconds to wait between waves.
+    default: 0
+  rollback_template:
+    description: When the rollout halts, deploy this template from O(template_project) to the devices it changed, which are then reported as C(ROLLED_BACK).
+  journal:
+    description: Checkpoint journal file, relative to the playbook, so an interrupted rollout can be resumed.
+  resume:
+    description: Resume the rollout recorded in O(journal).
+    type: bool
+  scripts_dir:
+    description: Directory holding C(template_runner.py).
+    default: the C(scripts) directory of this repository
+'''
+
+EXAMPLES = r'''
+- name: Deploy the port configuration to every switch at the site
+  dnac_template_rollout:
+    dnac_host: "{{ dnac_host }}"
+    dnac_username: "{{ dnac_username }}"
+    dnac_password: "{{ dnac_password }}"
+    template_project: Jinja_Template_Demos
+    template_name: Jinja_CSV_Import_Demo
+    input_file: port_config.csv
+    devices: "{{ groups['site_switches'] }}"
+    workers: 20
+  register: rollout
+'''
+
+RETURN = r'''
+devices:
+  description: Result for each device, keyed by device name, with its C(status), C(device_id), C(deploy_id), C(elapsed) seconds and C(result).
+  returned: always
+summary:
+  description: Number of devices in total and with each outcome (C(success), C(unchanged), C(preview), C(failed)).
+  returned: always
+stdout_lines:
+  description: Progress output of the rollout.
+  returned: always
+'''
@@ -0,0 +1,384 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# A local stand-in for the DNA Center API endpoints used by "scripts/template_runner.py", for benchmarking
+# and testing without a real controller.  Uses only Python built-in packages and plain HTTP, so point the
+# scripts at it with "--dnac_server http://127.0.0.1:<port>".
+# Response latency, error rate, per-endpoint rate limits and deployment completion times are configurable from the
+# command line.
+# "GET /_stats" returns the number of requests received per endpoint.
+# Templates and projects created or updated through the template-programmer API are remembered, for testing
+# "scripts/sync_templates.py".  Every other template name still exists, as a template with no content.
+# With "--event_url", an event notification is posted to that URL as each deployment finishes, the way a DNA Center
+# webhook destination receives them, for testing "template_runner.py --event_listen".
+
+import json
+import random
+import re
+import threading
+import time
+import urllib.request
+import uuid
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class MockState:
+    # Everything the mock server remembers between requests.
+
+    def __init__(self, options):
+        self.options = options
+        self.lock = threading.Lock()
+        self.deployments = {}
+        # Templates and projects created through the API, by ID, and the status of their tasks
+        self.templates = {}
+        self.projects = {}
+        self.tasks = {}
+        self.stats = {}
+        # endpoint -> (current second, requests received in that second), for --rate_limit
+        self.windows = {}
+        self.devices = [
+            {
+                "id": f'{uuid.UUID(int=x)}',
+                "hostname": f'{options.hostname_prefix}{x}',
+                "managementIpAddress": f'10.{x // 65536 % 256}.{x // 256 % 256}.{x % 256}',
+                "platformId": 'C9300-48P',
+                "serialNumber": f'FOC{x:08d}',
+                "family": 'Switches and Hubs',
+            }
+            for x in range(1, options.devices + 1)
+        ]
+        self.devices_by_name = {x['hostname'].lower(): x for x in self.devices}
+
+    def count(self, method, endpoint):
+        with self.lock:
+            key = f'{method} {endpoint}'
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def over_limit(self, method, endpoint):
+        # True if this request goes over the --rate_limit for its endpoint in the current second.
+        if not self.options.rate_limit:
+            return False
+        with self.lock:
+            key = f'{method} {endpoint}'
+            second = int(time.time())
+            window_second, count = self.windows.get(key, (second, 0))
+            count = count + 1 if window_second == second else 1
+            self.windows[key] = (second, count)
+            if count > self.options.rate_limit:
+                self.stats['429 responses'] = self.stats.get('429 responses', 0) + 1
+                return True
+            return False
+
+
+def send_event(state, deploy_id, devices):
+    # Post the event for a finished deployment to --event_url, unless it is one of the --event_loss events.
+    options = state.options
+    if random.random() < options.event_loss:
+        state.count('EVENT', 'lost')
+        return
+    device_status = [{"deviceId": x, "status": status} for x, (finish, status) in devices.items()]
+    event = {
+        "eventId": 'NETWORK-TEMPLATE-DEPLOYMENT',
+        "namespace": 'ASSURANCE',
+        "category": 'INFO',
+        "timestamp": int(time.time() * 1000),
+        "details": {
+            "deploymentId": deploy_id,
+            "status": 'FAILURE' if any(x['status'] == 'FAILURE' for x in device_status) else 'SUCCESS',
+            "devices": device_status,
+        },
+    }
+    request = urllib.request.Request(options.event_url, data=json.dumps(event).encode(), method='POST',
+                                     headers={"Content-Type": 'application/json', **({"X-Event-Token": options.event_token} if options.event_token else {})})
+    try:
+        urllib.request.urlopen(request, timeout=5).close()
+        state.count('EVENT', 'sent')
+    except OSError:
+        state.count('EVENT', 'failed')
+
+
+def endpoint_name(path):
+    # Collapse IDs in a path so that statistics are grouped by endpoint.
+    path = re.sub(r'/deploy/status/[^/]+$', '/deploy/status/{id}', path)
+    path = re.sub(r'/task/[^/]+$', '/task/{id}', path)
+    path = re.sub(r'/project/[^/]+/template$', '/project/{id}/template', path)
+    return re.sub(r'/v1/template-programmer/template/(?!deploy$|preview$|version$)[^/]+$', '/v1/template-programmer/template/{id}', path)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None
+
+    def log_message(self, format, *args):
+        if self.state.options.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status_code, body, headers={}):
+        data = json.dumps(body).encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def handle_api(self, method):
+        # Count the request, apply the configured latency and error rate, then dispatch it.
+        url = urlparse(self.path)
+        options = self.state.options
+        if url.path == '/_stats':
+            with self.state.lock:
+                return self.send_json(200, dict(self.state.stats))
+        self.state.count(method, endpoint_name(url.path))
+        if self.state.over_limit(method, endpoint_name(url.path)):
+            # Discard any request body so the connection can be reused
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            return self.send_json(429, {"error": "Too many requests"}, {"Retry-After": "1"})
+        time.sleep(max(0.0, random.gauss(options.latency, options.latency_jitter)))
+        if random.random() < options.error_rate:
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            return self.send_json(500, {"error": "Injected server error"})
+        handler = getattr(self, f'{method.lower()}_{self.route(url.path)}', None)
+        if not handler:
+            return self.send_json(404, {"error": f'Unknown endpoint: {method} {url.path}'})
+        return handler(url.path, parse_qs(url.query))
+
+    def route(self, path):
+        if path == '/api/system/v1/auth/token':
+            return 'token'
+        if path == '/dna/intent/api/v2/template-programmer/template':
+            return 'template'
+        if path == '/dna/intent/api/v1/network-device':
+            return 'network_device'
+        if path == '/dna/intent/api/v1/template-programmer/template/preview':
+            return 'preview'
+        if path == '/dna/intent/api/v1/template-programmer/template/deploy':
+            return 'deploy'
+        if path.startswith('/dna/intent/api/v1/template-programmer/template/deploy/status/'):
+            return 'deploy_status'
+        if path == '/dna/intent/api/v1/template-programmer/template/version':
+            return 'template_version'
+        if path == '/dna/intent/api/v1/template-programmer/template':
+            return 'template_update'
+        if re.fullmatch(r'/dna/intent/api/v1/template-programmer/template/[^/]+', path):
+            return 'template_details'
+        if path == '/dna/intent/api/v1/template-programmer/project':
+            return 'project'
+        if re.fullmatch(r'/dna/intent/api/v1/template-programmer/project/[^/]+/template', path):
+            return 'project_template'
+        if path.startswith('/dna/intent/api/v1/task/'):
+            return 'task'
+        return 'unknown'
+
+    def do_GET(self):
+        self.handle_api('GET')
+
+    def do_POST(self):
+        self.handle_api('POST')
+
+    def do_PUT(self):
+        self.handle_api('PUT')
+
+    def post_token(self, path, query):
+        if not self.headers.get('Authorization'):
+            return self.send_json(401, {"error": "Authentication required"})
+        return self.send_json(200, {"Token": f'mock-token-{uuid.uuid4()}'})
+
+    def finish_task(self, data, error=None):
+        # Record a template-programmer task, which finishes straight away, and reply with its task ID.
+        task_id = f'{uuid.uuid4()}'
+        self.state.tasks[task_id] = {"id": task_id, "isError": bool(error), "failureReason": error, "progress": data,
+                                     "data": data, "endTime": int(time.time() * 1000)}
+        return self.send_json(202, {"response": {"taskId": task_id, "url": f'/api/v1/task/{task_id}'}})
+
+    def get_template(self, path, query):
+        name = query.get('name', [''])[0]
+        project = query.get('projectName', [''])[0]
+        with self.state.lock:
+            stored = [x for x in self.state.templates.values()
+                      if (not name or x['name'] == name) and (not project or x['projectName'] == project)]
+        if stored or not name:
+            offset = int(query.get('offset', ['1'])[0])
+            limit = int(query.get('limit', [str(len(stored))])[0])
+            return self.send_json(200, {"response": [{x: y for x, y in t.items() if x != 'templateContent'}
+                                                     for t in stored[offset - 1:offset - 1 + limit]]})
+        template = {
+            "id": f'{uuid.uuid5(uuid.NAMESPACE_URL, f"{project}/{name}")}',
+            "name": name,
+            "projectName": project,
+            "templateParams": [{"parameterName": "input_data", "binding": ""}],
+            "versionsInfo": [{"version": "1"}],
+        }
+        return self.send_json(200, {"response": [template]})
+
+    def get_network_device(self, path, query):
+        if 'hostname' in query:
+            device = self.state.devices_by_name.get(query['hostname'][0].lower())
+            return self.send_json(200, {"response": [device] if device else []})
+        offset = int(query.get('offset', ['1'])[0])
+        limit = int(query.get('limit', ['500'])[0])
+        return self.send_json(200, {"response": self.state.devices[offset - 1:offset - 1 + limit]})
+
+    def get_template_details(self, path, query):
+        with self.state.lock:
+            template = self.state.templates.get(path.rsplit('/', 1)[1])
+        if not template:
+            return self.send_json(404, {"error": 'Template not found'})
+        return self.send_json(200, template)
+
+    def get_project(self, path, query):
+        name = query.get('name', [''])[0]
+        with self.state.lock:
+            projects = [x for x in self.state.projects.values() if not name or x['name'] == name]
+        return self.send_json(200, projects)
+
+    def post_project(self, path, query):
+        payload = self.read_json()
+        with self.state.lock:
+            if any(x['name'] == payload.get('name') for x in self.state.projects.values()):
+                return self.finish_task(None, f'Project {payload.get("name")} already exists')
+            project_id = f'{uuid.uuid4()}'
+            self.state.projects[project_id] = {"id": project_id, "name": payload.get('name'), "templates": []}
+            return self.finish_task(project_id)
+
+    def post_project_template(self, path, query):
+        payload = self.read_json()
+        project_id = path.split('/')[-2]
+        with self.state.lock:
+            project = self.state.projects.get(project_id)
+            if not project:
+                return self.finish_task(None, 'Project not found')
+            if any(x['name'] == payload.get('name') and x['projectId'] == project_id for x in self.state.templates.values()):
+                return self.finish_task(None, f'Template {payload.get("name")} already exists')
+            template_id = f'{uuid.uuid4()}'
+            self.state.templates[template_id] = {**payload, "id": template_id, "projectId": project_id, "projectName": project['name'],
+                                                 "versionsInfo": [], "lastUpdateTime": int(time.time() * 1000)}
+            return self.finish_task(template_id)
+
+    def put_template_update(self, path, query):
+        payload = self.read_json()
+        with self.state.lock:
+            template = self.state.templates.get(payload.get('id'))
+            if not template:
+                return self.finish_task(None, 'Template not found')
+            template.update({x: y for x, y in payload.items() if x not in ['id', 'projectId', 'projectName', 'versionsInfo']})
+            template['lastUpdateTime'] = int(time.time() * 1000)
+            return self.finish_task(template['id'])
+
+    def post_template_version(self, path, query):
+        payload = self.read_json()
+        with self.state.lock:
+            template = self.state.templates.get(payload.get('templateId'))
+            if not template:
+                return self.finish_task(None, 'Template not found')
+            version = str(len(template['versionsInfo']) + 1)
+            template['versionsInfo'].append({"version": version, "versionComment": payload.get('comments'),
+                                             "versionTime": int(time.time() * 1000)})
+            return self.finish_task(f'Successfully committed template {template["name"]} to version {version}')
+
+    def get_task(self, path, query):
+        with self.state.lock:
+            task = self.state.tasks.get(path.rsplit('/', 1)[1])
+        if not task:
+            return self.send_json(404, {"error": 'Task not found'})
+        return self.send_json(200, {"response": task})
+
+    def put_preview(self, path, query):
+        payload = self.read_json()
+        preview = f'! Preview of {payload.get("templateId")} for {payload.get("deviceId")}\n{json.dumps(payload.get("params"))}\n'
+        return self.send_json(200, {"cliPreview": preview, "templateId": payload.get('templateId')})
+
+    def post_deploy(self, path, query):
+        payload = self.read_json()
+        options = self.state.options
+        deploy_id = f'{uuid.uuid4()}'
+        devices = {}
+        for target in payload.get('targetInfo', []):
+            finish = time.monotonic() + random.uniform(options.deploy_min, options.deploy_max)
+            status = 'FAILURE' if random.random() < options.failure_rate else 'SUCCESS'
+            devices[target['id']] = (finish, status)
+        with self.state.lock:
+            self.state.deployments[deploy_id] = devices
+        if options.event_url and devices:
+            delay = max(x[0] for x in devices.values()) - time.monotonic()
+            timer = threading.Timer(delay, send_event, (self.state, deploy_id, devices))
+            timer.daemon = True
+            timer.start()
+        return self.send_json(202, {"deploymentId": f'Template Deployemnt Id: {deploy_id}'})
+
+    def get_deploy_status(self, path, query):
+        deploy_id = path.rsplit('/', 1)[1]
+        with self.state.lock:
+            devices = self.state.deployments.get(deploy_id)
+        if devices is None:
+            return self.send_json(404, {"error": f'Unknown deployment: {deploy_id}'})
+        now = time.monotonic()
+        device_status = [{"deviceId": x, "status": status if now >= finish else 'IN_PROGRESS'} for x, (finish, status) in devices.items()]
+        statuses = {x['status'] for x in device_status}
+        overall = 'IN_PROGRESS' if 'IN_PROGRESS' in statuses else ('FAILURE' if 'FAILURE' in statuses else 'SUCCESS')
+        return self.send_json(202, {"deploymentId": deploy_id, "status": overall, "devices": device_status})
+
+
+def build_parser():
+    parser = ArgumentParser(description='Local stand-in for the DNA Center template APIs:')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8080, help="Port to listen on, or 0 for any free port (default: 8080)")
+    parser.add_argument('--devices', type=int, default=1000, help="Number of devices in the inventory (default: 1000)")
+    parser.add_argument('--hostname_prefix', type=str, default='switch', help="Device hostnames are this prefix plus a number (default: switch)")
+    parser.add_argument('--latency', type=float, default=0.02, help="Mean response latency in seconds (default: 0.02)")
+    parser.add_argument('--latency_jitter', type=float, default=0.005, help="Standard deviation of the response latency (default: 0.005)")
+    parser.add_argument('--error_rate', type=float, default=0.0, help="Fraction of API requests answered with HTTP 500 (default: 0)")
+    parser.add_argument('--rate_limit', type=int, default=0, help="Requests per second allowed to each endpoint before answering HTTP 429, or 0 for no limit (default: 0)")
+    parser.add_argument('--deploy_min', type=float, default=0.5, help="Minimum seconds for a deployment to finish (default: 0.5)")
+    parser.add_argument('--deploy_max', type=float, default=3.0, help="Maximum seconds for a deployment to finish (default: 3.0)")
+    parser.add_argument('--failure_rate', type=float, default=0.0, help="Fraction of devices whose deployment ends in FAILURE (default: 0)")
+    parser.add_argument('--event_url', type=str, help="Post an event notification to this URL as each deployment finishes, like a DNA Center webhook")
+    parser.add_argument('--event_loss', type=float, default=0.0, help="Fraction of deployment events that are never sent, with --event_url (default: 0)")
+    parser.add_argument('--event_token', type=str, help="Send this value in an X-Event-Token header with each event")
+    parser.add_argument('--verbose', '-v', action='store_true', help="Log every request")
+    return parser
+
+
+def create_server(options):
+    # Create the HTTP server without starting it.  The listening port is in server.server_address[1].
+    handler = type('Handler', (MockHandler,), {"state": MockState(options)})
+    server = ThreadingHTTPServer((options.host, options.port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == '__main__':
+    options = build_parser().parse_args()
+    server = create_server(options)
+    print(f'Mock DNA Center listening on http://{options.host}:{server.server_address[1]}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,273 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Benchmarks "scripts/template_runner.py" against the local mock DNA Center server in "mock_dnac.py".
+# Each scenario runs in its own process so that its peak memory use is measured on its own:
+#   * single    - the full single-device deploy run (auth, template lookup, device lookup, deploy, status),
+#                 repeated "--single_runs" times
+#   * fanout    - one template deployed to "--devices" devices from a devices file
+#   * large_csv - a CSV input file of "--csv_rows" rows spread over "--devices" devices, using --device_column
+# Reported for each scenario: API requests/sec, device deployments/min, p50/p95/p99 end-to-end latency per
+# device and peak memory (maximum resident set size).
+# With "--events", the mock server posts an event as each deployment finishes and the script resolves deployments
+# from those events (template_runner.py --event_listen), polling only deployments whose event is lost.
+
+import contextlib
+import csv
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+import requests
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(BENCHMARK_DIR, '..', 'scripts')
+SCENARIOS = ['single', 'fanout', 'large_csv']
+
+
+def start_mock_server(args):
+    # Start "mock_dnac.py" on a free port and return the process and its URL.
+    command = [sys.executable, os.path.join(BENCHMARK_DIR, 'mock_dnac.py'), '--port', '0',
+               '--devices', str(args.devices), '--latency', str(args.latency), '--latency_jitter', str(args.latency_jitter),
+               '--error_rate', str(args.error_rate), '--rate_limit', str(args.server_rate_limit), '--deploy_min', str(args.deploy_min), '--deploy_max', str(args.deploy_max),
+               '--failure_rate', str(args.failure_rate)]
+    if args.events:
+        command += ['--event_url', f'http://127.0.0.1:{args.event_port}/', '--event_loss', str(args.event_loss)]
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = server.stdout.readline()
+    if 'listening on' not in line:
+        server.kill()
+        print(f'Unable to start the mock DNA Center server: {line}')
+        sys.exit(1)
+    return server, line.split()[-1]
+
+
+def request_count(server_url):
+    # Total number of API requests the mock server has received so far.  Events it has posted are not counted.
+    return sum(y for x, y in requests.get(f'{server_url}/_stats').json().items() if not x.startswith('EVENT '))
+
+
+def free_port():
+    # Return a TCP port that is free on the loopback address, for the script's event listener.
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, pct):
+    # Nearest-rank percentile of a List of numbers.
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, min(len(values) - 1, round(pct / 100 * len(values) + 0.5) - 1))]
+
+
+def runner_argv(args, server_url, work_dir, *options):
+    # Command line options for template_runner.py, with every cache kept in the scenario's temporary directory.
+    return ['--username', 'admin', '--password', 'benchmark', '--dnac_server', server_url,
+            '--template_project', 'Benchmark', '--template_name', 'Benchmark_Template',
+            '--workers', str(args.workers), '--batch_size', str(args.batch_size), '--rate_limit', str(args.rate_limit),
+            '--token_cache', os.path.join(work_dir, 'token_cache.json'),
+            '--template_cache', os.path.join(work_dir, 'templates.db'),
+            '--inventory_db', os.path.join(work_dir, 'inventory.db'), *options,
+            *(['--event_listen', f'127.0.0.1:{args.event_port}', '--event_timeout', str(args.event_timeout)] if args.events else [])]
+
+
+def write_inputs(args, work_dir):
+    # Write the devices file and the input files used by the scenarios.
+    devices_file = os.path.join(work_dir, 'devices.txt')
+    with open(devices_file, 'wt') as f:
+        f.writelines(f'switch{x}\n' for x in range(1, args.devices + 1))
+    input_file = os.path.join(work_dir, 'input.csv')
+    with open(input_file, 'wt', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['interface', 'vlan', 'description'])
+        writer.writerows([f'GigabitEthernet1/0/{x}', 100 + x, f'Port {x}'] for x in range(1, 49))
+    csv_file = os.path.join(work_dir, 'large_input.csv')
+    rows_per_device = max(1, args.csv_rows // args.devices)
+    with open(csv_file, 'wt', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['hostname', 'interface', 'vlan', 'description'])
+        for x in range(args.csv_rows):
+            device = x // rows_per_device % args.devices + 1
+            writer.writerow([f'switch{device}', f'GigabitEthernet1/0/{x % rows_per_device + 1}', 100 + x % 4000, f'Row {x}'])
+    return devices_file, input_file, csv_file
+
+
+def run_scenario(scenario, args, server_url, work_dir, results_queue):
+    # Run one scenario in this (child) process and put its measurements on "results_queue".
+    sys.path.insert(0, SCRIPTS_DIR)
+    import template_runner
+    devices_file, input_file, csv_file = write_inputs(args, work_dir)
+    latencies = []
+    statuses = {}
+    with open(os.devnull, 'wt') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.monotonic()
+        if scenario == 'single':
+            for x in range(args.single_runs):
+                run_start = time.monotonic()
+                runner_args = template_runner.parse_args(runner_argv(args, server_url, work_dir, '--no_inventory',
+                                                                     '--device_name', f'switch{x % args.devices + 1}', '--input_file', input_file))
+                # The template_runner.py helper functions call sys.exit() on errors, as a single-device run would
+                try:
+                    if runner_args.event_listen:
+                        template_runner.open_event_receiver(runner_args)
+                    client = template_runner.setup_client(runner_args)
+                    template = template_runner.get_template_info(client, runner_args.template_project, runner_args.template_name)
+                    device_id = template_runner.get_device_uuid(client, runner_args.device_name)
+                    deploy_id = template_runner.deploy_template(client, template['id'], device_id,
+                                                                template_runner.parse_input_file(input_file), template['bind_variables'])
+                    status = template_runner.check_deployment(client, deploy_id, runner_args.deploy_timeout, runner_args.timeout).get('status')
+                    client.close()
+                except SystemExit:
+                    status = 'ERROR'
+                finally:
+                    if template_runner.event_receiver:
+                        template_runner.event_receiver.close()
+                        template_runner.event_receiver = None
+                statuses[status] = statuses.get(status, 0) + 1
+                latencies.append(time.monotonic() - run_start)
+        else:
+            if scenario == 'fanout':
+                options = ['--devices_file', devices_file, '--input_file', input_file]
+            else:
+                options = ['--device_column', 'hostname', '--input_file', csv_file]
+            runner_args = template_runner.parse_args(runner_argv(args, server_url, work_dir, '--sync_inventory', *options))
+            client = template_runner.setup_client(runner_args)
+            template_runner.sync_inventory(client, client.inventory)
+            template = template_runner.get_template_info(client, runner_args.template_project, runner_args.template_name)
+            if runner_args.event_listen:
+                template_runner.open_event_receiver(runner_args)
+            results = template_runner.run_devices(client, runner_args, template, template_runner.read_devices(runner_args))
+            client.close()
+            if template_runner.event_receiver:
+                template_runner.event_receiver.close()
+            for device_result in results:
+                statuses[device_result['status']] = statuses.get(device_result['status'], 0) + 1
+                latencies.append(device_result['elapsed'])
+        wall_time = time.monotonic() - start
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_memory = peak_memory / 1024 / 1024 if sys.platform == 'darwin' else peak_memory / 1024
+    results_queue.put({"wall_time": wall_time, "latencies": latencies, "statuses": statuses, "peak_memory_mb": peak_memory})
+
+
+def benchmark(scenario, args, server_url):
+    # Run a scenario in a fresh process and return its summary Dictionary.
+    with tempfile.TemporaryDirectory() as work_dir:
+        before = request_count(server_url)
+        context = multiprocessing.get_context('spawn')
+        results_queue = context.Queue()
+        process = context.Process(target=run_scenario, args=(scenario, args, server_url, work_dir, results_queue))
+        process.start()
+        measurements = None
+        while measurements is None:
+            try:
+                measurements = results_queue.get(timeout=1)
+            except queue.Empty:
+                if process.exitcode is not None:
+                    print(f'The "{scenario}" scenario stopped without reporting results (exit code {process.exitcode}).')
+                    sys.exit(1)
+        process.join()
+        api_requests = request_count(server_url) - before
+    wall_time = measurements['wall_time']
+    latencies = measurements['latencies']
+    deployed = sum(count for status, count in measurements['statuses'].items() if status in ['SUCCESS', 'FAILURE'])
+    return {
+        "scenario": scenario,
+        "devices": len(latencies),
+        "wall_time": round(wall_time, 2),
+        "api_requests": api_requests,
+        "requests_per_sec": round(api_requests / wall_time, 1),
+        "deployments_per_min": round(deployed / wall_time * 60, 1),
+        "p50": round(percentile(latencies, 50), 3),
+        "p95": round(percentile(latencies, 95), 3),
+        "p99": round(percentile(latencies, 99), 3),
+        "peak_memory_mb": round(measurements['peak_memory_mb'], 1),
+        "statuses": measurements['statuses'],
+    }
+
+
+def print_report(results):
+    columns = ['scenario', 'devices', 'wall_time', 'api_requests', 'requests_per_sec', 'deployments_per_min',
+               'p50', 'p95', 'p99', 'peak_memory_mb']
+    widths = [max(len(x), *(len(str(r[x])) for r in results)) for x in columns]
+    print('  '.join(x.ljust(w) for x, w in zip(columns, widths)))
+    for result in results:
+        print('  '.join(str(result[x]).ljust(w) for x, w in zip(columns, widths)))
+    for result in results:
+        print(f'\n{result["scenario"]} device results: {result["statuses"]}', end='')
+    print()
+
+
+def parse_args():
+    parser = ArgumentParser(description='Benchmark template_runner.py against a local mock DNA Center server:')
+    parser.add_argument('--scenarios', type=str, default=','.join(SCENARIOS), help=f"Comma separated scenarios to run (default: {','.join(SCENARIOS)})")
+    parser.add_argument('--devices', type=int, default=200, help="Number of devices for the fan-out and large-CSV scenarios (default: 200)")
+    parser.add_argument('--csv_rows', type=int, default=100000, help="Number of rows in the large-CSV scenario input file (default: 100000)")
+    parser.add_argument('--single_runs', type=int, default=10, help="Number of single-device runs (default: 10)")
+    parser.add_argument('--workers', type=int, default=20, help="template_runner.py --workers (default: 20)")
+    parser.add_argument('--batch_size', type=int, default=0, help="template_runner.py --batch_size (default: 0)")
+    parser.add_argument('--latency', type=float, default=0.02, help="Mock server mean response latency in seconds (default: 0.02)")
+    parser.add_argument('--latency_jitter', type=float, default=0.005, help="Mock server response latency standard deviation (default: 0.005)")
+    parser.add_argument('--error_rate', type=float, default=0.0, help="Fraction of API requests failed with HTTP 500 (default: 0)")
+    parser.add_argument('--server_rate_limit', type=int, default=0, help="Requests per second the mock server allows to each endpoint before answering HTTP 429 (default: 0, no limit)")
+    parser.add_argument('--rate_limit', type=float, default=0.0, help="template_runner.py --rate_limit (default: 0, no limit until throttled)")
+    parser.add_argument('--deploy_min', type=float, default=0.5, help="Minimum seconds for a deployment to finish (default: 0.5)")
+    parser.add_argument('--deploy_max', type=float, default=3.0, help="Maximum seconds for a deployment to finish (default: 3.0)")
+    parser.add_argument('--failure_rate', type=float, default=0.0, help="Fraction of device deployments that fail (default: 0)")
+    parser.add_argument('--events', action='store_true', help="Resolve deployments from events posted by the mock server (template_runner.py --event_listen)")
+    parser.add_argument('--event_loss', type=float, default=0.0, help="Fraction of deployment events the mock server never sends, with --events (default: 0)")
+    parser.add_argument('--event_timeout', type=float, default=10.0, help="template_runner.py --event_timeout, with --events (default: 10)")
+    parser.add_argument('--json_output', type=str, help="Also write the results to this JSON file")
+    args = parser.parse_args()
+    args.scenarios = [x.strip() for x in args.scenarios.split(',') if x.strip()]
+    unknown = [x for x in args.scenarios if x not in SCENARIOS]
+    if unknown:
+        parser.error(f'unknown scenario(s): {", ".join(unknown)}')
+    if args.devices < 1:
+        parser.error('--devices must be 1 or greater')
+    args.event_port = free_port() if args.events else None
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    server, server_url = start_mock_server(args)
+    try:
+        results = [benchmark(x, args, server_url) for x in args.scenarios]
+    finally:
+        server.terminate()
+        server.wait()
+    print_report(results)
+    if args.json_output:
+        with open(args.json_output, 'wt') as f:
+            json.dump({"options": vars(args), "results": results}, f, indent=2)
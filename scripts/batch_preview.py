@@ -0,0 +1,121 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Batch preview support for "template_runner.py".  Devices that would render identically - the same template
+# version and the same input data, and for templates using System Bind Variables the same device - share a single
+# render, so the number of Preview API calls (or local renders) follows the number of distinct renders rather than
+# the number of devices.  The previews can be written to a directory, one file per device, together with an index
+# of the devices that share identical output.
+
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import Future
+
+INDEX_FILE = 'index.json'
+
+
+def params_hash(input_data):
+    # Hash the input data sent to the template.  Dictionary keys are sorted, so equal data always hashes the same.
+    return hashlib.sha256(json.dumps(input_data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def render_key(template_version, input_data, device=None):
+    # Identify one render of a template.  "device" should only be given for templates that use System Bind
+    # Variables, since only those render differently from one device to the next.
+    return (template_version, params_hash(input_data), json.dumps(device, sort_keys=True, default=str) if device else None)
+
+
+def output_hash(output):
+    return hashlib.sha256(output.encode()).hexdigest()
+
+
+class RenderCache:
+    # Runs each distinct render once.  A thread asking for a render that another thread has already started waits
+    # for that result instead of rendering it again.  A render that fails (including with sys.exit()) fails for
+    # every device sharing it.  Safe to share between threads.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.renders = {}
+
+    def get(self, key, render):
+        # Return the result of "render()" for "key", calling it only the first time the key is seen.
+        with self.lock:
+            future = self.renders.get(key)
+            first = future is None
+            if first:
+                future = self.renders[key] = Future()
+        if first:
+            try:
+                future.set_result(render())
+            except BaseException as e:
+                future.set_exception(e)
+        return future.result()
+
+    def __len__(self):
+        return len(self.renders)
+
+
+def device_file_name(device_name, used):
+    # Turn a device name into a file name, adding a number if two device names end up with the same file name.
+    base = re.sub(r'[^\w.-]', '_', device_name) or 'device'
+    name = f'{base}.txt'
+    count = 1
+    while name.lower() in used:
+        count += 1
+        name = f'{base}-{count}.txt'
+    used.add(name.lower())
+    return name
+
+
+def write_preview_dir(output_dir, run_info, results):
+    # Write each previewed device's output to its own file in "output_dir", and an index file listing every device,
+    # its output file and output hash, and the groups of devices whose output is identical (largest group first).
+    os.makedirs(output_dir, exist_ok=True)
+    used = set()
+    devices = {}
+    groups = {}
+    for device_result in sorted(results, key=lambda x: x['device_name']):
+        entry = {"status": device_result['status']}
+        if device_result['status'] == 'PREVIEW':
+            entry['file'] = device_file_name(device_result['device_name'], used)
+            entry['output_hash'] = output_hash(device_result['result'])
+            with open(os.path.join(output_dir, entry['file']), 'wt') as f:
+                f.write(device_result['result'])
+            groups.setdefault(entry['output_hash'], []).append(device_result['device_name'])
+        else:
+            entry['error'] = device_result['result']
+        devices[device_result['device_name']] = entry
+    index = {
+        **run_info,
+        "device_count": len(devices),
+        "distinct_outputs": len(groups),
+        "groups": [{"output_hash": k, "devices": v} for k, v in sorted(groups.items(), key=lambda x: (-len(x[1]), x[1][0]))],
+        "devices": devices,
+    }
+    with open(os.path.join(output_dir, INDEX_FILE), 'wt') as f:
+        json.dump(index, f, indent=4)
+    return index
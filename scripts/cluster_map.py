@@ -0,0 +1,95 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Cluster map for "template_runner.py --cluster_map": the DNA Center clusters one run deploys to, each with its own
+# connection pool, token, rate limits and worker budget.  The map is a YAML or JSON file:
+#
+#   clusters:
+#     - name: east
+#       dnac_server: dnac-east.example.com
+#       username: admin                      # optional, defaults to --username
+#       password_env: DNAC_EAST_PASSWORD     # optional environment variable holding the password
+#       workers: 20                          # optional, defaults to --workers
+#       rate_limit: 10                       # optional, defaults to --rate_limit
+#       devices: ['nyc-*', 'bos-*']          # optional hostname patterns always deployed through this cluster
+#     - name: west
+#       dnac_server: dnac-west.example.com
+#
+# Devices that do not match any "devices" pattern are routed to the cluster whose inventory holds them.
+
+import fnmatch
+import os
+from argparse import Namespace
+
+from input_loaders import InputFormatError, load_input
+
+# template_runner.py options that a cluster may set for itself
+CLUSTER_OPTIONS = ['dnac_server', 'username', 'password', 'workers', 'batch_size', 'rate_limit', 'max_retries']
+CLUSTER_KEYS = CLUSTER_OPTIONS + ['name', 'password_env', 'devices']
+
+
+class ClusterMapError(ValueError):
+    pass
+
+
+def load_cluster_map(map_file):
+    # Read and check a cluster map file, returning a List of cluster Dictionaries in the order they are listed.
+    try:
+        data = load_input(map_file)
+    except (InputFormatError, OSError) as e:
+        raise ClusterMapError(f'Unable to read the cluster map "{map_file}": {e}') from None
+    clusters = data.get('clusters') if isinstance(data, dict) else None
+    if isinstance(clusters, dict):
+        clusters = [{"name": x, **(y or {})} for x, y in clusters.items()]
+    if not clusters or not isinstance(clusters, list):
+        raise ClusterMapError(f'The cluster map "{map_file}" does not list any clusters.')
+    names = set()
+    for number, cluster in enumerate(clusters, 1):
+        if not isinstance(cluster, dict) or not cluster.get('dnac_server'):
+            raise ClusterMapError(f'Cluster {number} in "{map_file}" does not have a "dnac_server".')
+        unknown = sorted(set(cluster) - set(CLUSTER_KEYS))
+        if unknown:
+            raise ClusterMapError(f'Cluster {number} in "{map_file}" has unknown settings: {", ".join(unknown)}')
+        cluster.setdefault('name', cluster['dnac_server'])
+        if cluster['name'] in names:
+            raise ClusterMapError(f'Cluster "{cluster["name"]}" is listed more than once in "{map_file}".')
+        names.add(cluster['name'])
+        patterns = cluster.get('devices') or []
+        cluster['devices'] = [patterns] if isinstance(patterns, str) else list(patterns)
+    return clusters
+
+
+def cluster_args(args, cluster):
+    # Return a copy of the template_runner.py options with the cluster's own settings applied.
+    options = {**vars(args), **{x: cluster[x] for x in CLUSTER_OPTIONS if cluster.get(x) is not None}}
+    if cluster.get('password_env'):
+        options['password'] = os.environ.get(cluster['password_env']) or options['password']
+    return Namespace(**options)
+
+
+def pattern_cluster(clusters, device_name):
+    # Return the first cluster with a "devices" pattern matching the hostname (without regard to case), or None.
+    for cluster in clusters:
+        if any(fnmatch.fnmatchcase(device_name.lower(), x.lower()) for x in cluster['devices']):
+            return cluster
+    return None
@@ -0,0 +1,119 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Append-only checkpoint journal for multi-device rollouts.  Each change in a device's state is written to the
+# journal file as one JSON line, as soon as it happens:
+#   RESOLVED  - the device name was resolved to its UUID
+#   SUBMITTED - the deployment was sent to DNA Center; the record holds the Deployment ID
+#   SUCCESS, FAILURE, TIMEOUT or ERROR - the final result for the device in this run
+#   UNCHANGED - the device was skipped by --skip_unchanged, since its configuration had not changed
+#   HALTED    - the device's wave was not started because the --waves rollout halted
+#   ROLLBACK_RESOLVED, ROLLBACK_SUBMITTED, ROLLBACK_SUCCESS, ... - the same states for the device's --rollback_template
+#               deployment, which never count as the rollout's own deployment, then ROLLED_BACK once it succeeded
+# An interrupted rollout can then be resumed from the journal: devices that succeeded are skipped, and devices
+# with a deployment still in flight are checked using their Deployment ID instead of being deployed again.
+
+import json
+import os
+import threading
+import time
+
+# A device in one of these states already succeeded (or needed no change) and is skipped when resuming
+FINISHED_STATES = ['SUCCESS', 'UNCHANGED']
+# A device in one of these states has a deployment that may still be running, so its Deployment ID is checked again
+IN_FLIGHT_STATES = ['SUBMITTED', 'TIMEOUT']
+# Prefix of the states recorded for a --rollback_template deployment.  Devices in any other state (including these
+# and ROLLED_BACK) are deployed again when resuming.
+ROLLBACK_PREFIX = 'ROLLBACK_'
+
+# Run details that must match for a journal to be resumed
+RUN_KEYS = ['dnac_server', 'template_project', 'template_name']
+
+
+class JournalError(ValueError):
+    pass
+
+
+def read_journal(journal_file):
+    # Replay a journal file and return a Tuple of (the last "run" record, Dictionary of device name -> last device record).
+    # A line cut short by a crash is ignored.
+    run = None
+    devices = {}
+    with open(journal_file, 'rt') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('type') == 'run':
+                run = record
+            elif record.get('type') == 'device':
+                devices[record['device_name']] = record
+    return run, devices
+
+
+class DeployJournal:
+    # Writes the journal for one run.  "run_info" holds the RUN_KEYS of the rollout.  With "resume" set, the
+    # state of an earlier run is loaded from an existing journal into self.devices and new records are appended.
+    # Safe to share between threads.
+
+    def __init__(self, journal_file, run_info, resume=False):
+        self.journal_file = journal_file
+        self.devices = {}
+        exists = os.path.exists(journal_file) and os.path.getsize(journal_file) > 0
+        if exists and not resume:
+            raise JournalError(f'Journal "{journal_file}" already exists.  Use --resume to continue that rollout, or remove the file to start again.')
+        if exists:
+            run, self.devices = read_journal(journal_file)
+            changed = [x for x in RUN_KEYS if run and run.get(x) != run_info.get(x)]
+            if changed:
+                raise JournalError(f'Journal "{journal_file}" belongs to a different rollout ({", ".join(f"{x}: {run.get(x)}" for x in changed)}).')
+        self.lock = threading.Lock()
+        self.file = open(journal_file, 'at')
+        if exists and not self.ends_with_newline():
+            # The last line was cut short, so start on a fresh line
+            self.file.write('\n')
+        self.write({"type": "run", **{x: run_info.get(x) for x in RUN_KEYS}, "resumed": bool(exists)})
+
+    def ends_with_newline(self):
+        with open(self.journal_file, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def write(self, record):
+        # Lines are flushed as they are written, so they survive the script being killed.
+        with self.lock:
+            self.file.write(json.dumps({**record, "time": round(time.time(), 3)}) + '\n')
+            self.file.flush()
+
+    def record(self, device_name, state, **fields):
+        # Record a device's new state, e.g. record(name, 'SUBMITTED', device_id=..., deploy_id=...).
+        self.write({"type": "device", "device_name": device_name, "state": state, **fields})
+
+    def previous(self, device_name):
+        # Return the device's last record from the resumed journal, or None.
+        return self.devices.get(device_name)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
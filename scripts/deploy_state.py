@@ -0,0 +1,120 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Local record of the configuration last deployed to each device, stored in SQLite.  After each successful
+# deployment the hash of the device's rendered configuration is saved, so "template_runner.py --skip_unchanged"
+# can skip devices whose rendered configuration is the same as last time instead of pushing it again.  The hash
+# of each device's input data and the template version are saved too, so "template_runner.py --changed_only"
+# can skip devices whose input and template have not changed, without rendering anything.
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from dnac_client import CACHE_DIR
+
+DEFAULT_DEPLOY_DB = os.path.join(CACHE_DIR, 'deployments.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deployments (
+    server TEXT NOT NULL,
+    device_id TEXT NOT NULL,
+    template_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    config_hash TEXT NOT NULL,
+    deployed_at REAL NOT NULL,
+    PRIMARY KEY (server, device_id, template_id, source)
+);
+CREATE TABLE IF NOT EXISTS inputs (
+    server TEXT NOT NULL,
+    template_id TEXT NOT NULL,
+    device_name TEXT NOT NULL,
+    input_hash TEXT NOT NULL,
+    template_version TEXT NOT NULL,
+    deployed_at REAL NOT NULL,
+    PRIMARY KEY (server, template_id, device_name)
+);
+"""
+
+
+def config_hash(config):
+    # Hash a rendered configuration.  Trailing whitespace and blank lines are ignored, since they do not change
+    # what is applied to the device.
+    lines = [x.rstrip() for x in config.splitlines()]
+    normalized = '\n'.join(x for x in lines if x)
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class DeployState:
+    # SQLite record of the last successful deployment of each template to each device.  Hashes from the Preview API
+    # and from local renders are kept apart ("source"), since the two renderers can differ in whitespace and
+    # formatting.  Safe to share between threads.
+
+    def __init__(self, db_file=DEFAULT_DEPLOY_DB):
+        if db_file != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(db_file)), mode=0o700, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_file, check_same_thread=False)
+        with self.lock:
+            self.db.executescript(SCHEMA)
+
+    def get(self, server, device_id, template_id, source):
+        # Return the configuration hash of the last successful deployment, or None.
+        with self.lock:
+            row = self.db.execute('SELECT config_hash FROM deployments WHERE server = ? AND device_id = ? AND template_id = ? AND source = ?',
+                                  (server, device_id, template_id, source)).fetchone()
+        return row[0] if row else None
+
+    def put(self, server, device_id, template_id, source, config_hash):
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO deployments VALUES (?, ?, ?, ?, ?, ?)',
+                            (server, device_id, template_id, source, config_hash, time.time()))
+
+    def get_input(self, server, template_id, device_name):
+        # Return a Dictionary with the "input_hash" and "template_version" of the last successful deployment, or None.
+        with self.lock:
+            row = self.db.execute('SELECT input_hash, template_version FROM inputs WHERE server = ? AND template_id = ? AND device_name = ?',
+                                  (server, template_id, device_name)).fetchone()
+        return {"input_hash": row[0], "template_version": row[1]} if row else None
+
+    def put_input(self, server, template_id, device_name, input_hash, template_version):
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO inputs VALUES (?, ?, ?, ?, ?, ?)',
+                            (server, template_id, device_name, input_hash, template_version, time.time()))
+
+    def input_devices(self, server, template_id):
+        # Return the names of every device the template has been deployed to successfully.
+        with self.lock:
+            rows = self.db.execute('SELECT device_name FROM inputs WHERE server = ? AND template_id = ?', (server, template_id)).fetchall()
+        return [x[0] for x in rows]
+
+    def forget(self, server, template_id, device_id, device_name):
+        # Remove the record of a template's deployment to one device, e.g. after it was rolled back.
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM deployments WHERE server = ? AND device_id = ? AND template_id = ?', (server, device_id, template_id))
+            self.db.execute('DELETE FROM inputs WHERE server = ? AND template_id = ? AND device_name = ?', (server, template_id, device_name))
+
+    def close(self):
+        self.db.close()
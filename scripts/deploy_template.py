@@ -23,7 +23,6 @@ __license__ = "Cisco Sample Code License, Version 1.1"
 
 import csv
 import json
-import time
 import sys
 from argparse import ArgumentParser
 # External packages from Pip
@@ -31,6 +30,8 @@ import requests
 from requests.auth import HTTPBasicAuth
 import urllib3
 
+import deployment_poller
+
 # Disable insecure connection warnings on destinations with untrusted certificates
 urllib3.disable_warnings()
 
@@ -93,35 +94,15 @@ def deploy_template(token, dnac_server, template_id, device_id, csv_data):
         sys.exit(1)
 
 
-def check_deployment(dnac_server, token, deploy_id):
-    # Check the status of the template deployment every 10 seconds until a proper response is received.
-    url = f'https://{dnac_server}/dna/intent/api/v1/template-programmer/template/deploy/status/{deploy_id}'
-    headers = {
-        "Content-Type": "application/json",
-        "x-auth-token": token
-    }
-    while True:
-        result = requests.get(url, headers=headers, verify=False)
-        if result.status_code in [201, 202, 204]:
-            try:
-                status = result.json()['status']
-            except KeyError:
-                print('Waiting 10 seconds...')
-                time.sleep(10)
-                continue
-            if status in ['SUCCESS', 'FAILURE']:
-                print('Deployment status:\n')
-                print(json.dumps(result.json(), indent=4))
-                break
-            else:
-                print('Waiting 10 seconds...')
-                time.sleep(10)
-                continue
-        else:
-            print('Waiting 10 seconds...')
-            time.sleep(10)
-            continue
-    return result.json()
+def check_deployment(dnac_server, token, deploy_id, deploy_timeout=None):
+    # Check the status of the template deployment until SUCCESS or FAILURE is returned.
+    # Checks start at half a second apart and back off to a maximum of 10 seconds, and the deployment is
+    # reported as "TIMEOUT" if it has not finished after "deploy_timeout" seconds.
+    fetch_status = lambda x: deployment_poller.get_deployment_status(dnac_server, token, x)
+    result = deployment_poller.wait_for_deployment(fetch_status, deploy_id, deploy_timeout=deploy_timeout)
+    print('Deployment status:\n')
+    print(json.dumps(result, indent=4))
+    return result
 
 
 if __name__ == '__main__':
@@ -132,9 +113,10 @@ if __name__ == '__main__':
     parser.add_argument('--templateId', type=str, required=True, help="Template UUID")
     parser.add_argument('--deviceId', type=str, required=True, help="Target Device UUID")
     parser.add_argument('--csv_file', type=str, required=True, help="CSV Input File")
+    parser.add_argument('--deploy_timeout', type=int, default=900, help="Seconds to wait for the deployment to finish before reporting TIMEOUT (default: 900)")
     args = parser.parse_args()
     
     token = auth(args.dnac_server, args.username, args.password)
     csv_data = parse_csv(args.csv_file)
     deploy_id = deploy_template(token, args.dnac_server, args.templateId, args.deviceId, csv_data)
-    result = check_deployment(args.dnac_server, token, deploy_id)
+    result = check_deployment(args.dnac_server, token, deploy_id, args.deploy_timeout)
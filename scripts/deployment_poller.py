@@ -0,0 +1,144 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Shared deployment status poller used by "deploy_template.py", "template_runner.py" and
+# "template_runner_no_input.py".  A single loop tracks any number of Deployment IDs, checking each one
+# on its own exponential backoff schedule and returning results as soon as each deployment finishes.
+# Deployments can also be resolved by DNA Center event notifications (see "event_receiver.py"), with polling
+# only as a fallback for deployments whose event does not arrive.
+
+import heapq
+import random
+import time
+
+import requests
+
+from dnac_client import CONNECT_TIMEOUT, DEFAULT_REQUEST_TIMEOUT
+
+# Deployment states that DNA Center will not change any further
+FINAL_STATES = ['SUCCESS', 'FAILURE']
+
+
+def get_deployment_status(dnac_server, token, deploy_id):
+    # Make a single API call to DNAC for the status of one template deployment.  The call has a timeout, because
+    # every deployment is polled from one thread and a status check that never returns would stall all of them.
+    url = f'https://{dnac_server}/dna/intent/api/v1/template-programmer/template/deploy/status/{deploy_id}'
+    headers = {
+        "Content-Type": "application/json",
+        "x-auth-token": token
+    }
+    return requests.get(url, headers=headers, verify=False, timeout=(CONNECT_TIMEOUT, DEFAULT_REQUEST_TIMEOUT))
+
+
+def next_delay(delay, max_delay):
+    # Double the previous delay up to "max_delay", then apply jitter so that many deployments
+    # started at the same moment do not all poll the controller at the same moment.
+    delay = min(delay * 2, max_delay)
+    return random.uniform(delay / 2, delay)
+
+
+def timeout_result(deploy_id, reason):
+    # Build a status Dictionary for a deployment that did not finish in time.
+    return {"deploymentId": deploy_id, "status": "TIMEOUT", "detailedStatusMessage": reason}
+
+
+def poll_deployments(fetch_status, deploy_ids, initial_delay=0.5, max_delay=10.0, deploy_timeout=None, deadline=None,
+                     events=None, event_timeout=60.0):
+    # Generator that polls every Deployment ID in "deploy_ids" and yields a (deploy_id, status) Tuple as each
+    # deployment reaches SUCCESS or FAILURE.  "fetch_status" is called with a Deployment ID and must return
+    # the requests.Response from the deployment status API, or its already parsed body (None for an error reply).
+    # "deploy_timeout" limits how long (in seconds) any one deployment is polled and "deadline" limits the
+    # whole loop.  Deployments that run out of time are yielded with a "TIMEOUT" status.
+    # With "events" (an event_receiver.EventReceiver), deployments are resolved by their DNA Center events as they
+    # arrive, and a deployment is only polled if no event has been received for it within "event_timeout" seconds.
+    start = time.monotonic()
+    stop_time = start + deadline if deadline else None
+    first_poll = start + event_timeout if events else start
+    schedule = []
+    pending = set()
+    for deploy_id in dict.fromkeys(deploy_ids):
+        # Heap entries are (next poll time, Deployment ID, current delay, time this deployment gives up)
+        give_up = start + deploy_timeout if deploy_timeout else None
+        heapq.heappush(schedule, (min(first_poll, give_up) if give_up else first_poll, deploy_id, initial_delay, give_up))
+        pending.add(deploy_id)
+    received = None
+    while schedule:
+        if events and events.received != received:
+            received = events.received
+            for deploy_id, status in events.take(pending).items():
+                pending.discard(deploy_id)
+                yield deploy_id, status
+        poll_time, deploy_id, delay, give_up = heapq.heappop(schedule)
+        if deploy_id not in pending:
+            # Already resolved by an event
+            continue
+        now = time.monotonic()
+        if stop_time and poll_time > stop_time:
+            # Nothing left can be checked again before the deadline
+            heapq.heappush(schedule, (poll_time, deploy_id, delay, give_up))
+            if events:
+                events.wait(max(0.0, stop_time - now), received)
+                if events.received != received and time.monotonic() < stop_time:
+                    continue
+            for entry in sorted(schedule):
+                if entry[1] in pending:
+                    pending.discard(entry[1])
+                    yield entry[1], timeout_result(entry[1], f'Deployment did not finish within {deadline} seconds.')
+            return
+        if poll_time > now:
+            if events:
+                # Wake up for the next event, then look at the schedule again
+                heapq.heappush(schedule, (poll_time, deploy_id, delay, give_up))
+                events.wait(poll_time - now, received)
+                continue
+            time.sleep(poll_time - now)
+        try:
+            result = fetch_status(deploy_id)
+            if result is None or isinstance(result, dict):
+                status = result or {}
+            else:
+                status = result.json() if result.status_code in [200, 201, 202] else {}
+        except (ValueError, requests.RequestException):
+            # A bad reply or a connection error that outlasted the client's retries only affects this one
+            # deployment, which is checked again later on its backoff schedule
+            status = {}
+        if status.get('status') in FINAL_STATES:
+            pending.discard(deploy_id)
+            yield deploy_id, status
+            continue
+        now = time.monotonic()
+        if give_up and now >= give_up:
+            pending.discard(deploy_id)
+            yield deploy_id, timeout_result(deploy_id, f'Deployment did not finish within {deploy_timeout} seconds.')
+            continue
+        delay = next_delay(delay, max_delay)
+        poll_time = now + delay
+        if give_up:
+            poll_time = min(poll_time, give_up)
+        heapq.heappush(schedule, (poll_time, deploy_id, delay, give_up))
+
+
+def wait_for_deployment(fetch_status, deploy_id, **kwargs):
+    # Poll a single deployment until it finishes or times out, and return its status Dictionary.
+    for _, status in poll_deployments(fetch_status, [deploy_id], **kwargs):
+        return status
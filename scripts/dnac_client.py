@@ -0,0 +1,276 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Shared DNA Center API client.  One requests.Session is reused for every API call, so TLS connections are
+# kept alive and pooled between calls and between worker threads.  Auth tokens are cached on disk and reused
+# by later runs until shortly before they expire.
+
+import json
+import os
+import sys
+import threading
+import time
+from getpass import getpass
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+
+from rate_limiter import RateLimiter
+
+# DNA Center tokens are valid for 60 minutes.  Refresh them 5 minutes early so a long API call never starts
+# with a token that is about to expire.
+TOKEN_LIFETIME = 60 * 60
+TOKEN_REFRESH_MARGIN = 5 * 60
+
+# Seconds to wait for a connection to DNA Center, and (by default) for each response.  Without a limit, one API call
+# that never gets an answer would hang its worker thread, or every deployment waiting on the status poller, forever.
+CONNECT_TIMEOUT = 10
+DEFAULT_REQUEST_TIMEOUT = 60
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.dnac_templating')
+DEFAULT_TOKEN_CACHE = os.path.join(CACHE_DIR, 'token_cache.json')
+
+
+def read_token_cache(cache_file):
+    # Read the token cache file and return its contents as a Dictionary.  A missing or damaged file is treated as empty.
+    try:
+        with open(cache_file, 'rt') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_token_cache(cache_file, cache_data):
+    # Write the token cache so that only the current user can read it.  The file is written to a temporary
+    # name first and then renamed, so a run that is interrupted never leaves a half-written cache behind.
+    os.makedirs(os.path.dirname(os.path.abspath(cache_file)), mode=0o700, exist_ok=True)
+    temp_file = f'{cache_file}.{os.getpid()}.tmp'
+    fd = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wt') as f:
+        json.dump(cache_data, f)
+    os.replace(temp_file, cache_file)
+
+
+class PasswordRequired(RuntimeError):
+    # Raised instead of prompting for a password from a worker thread.  Not a ValueError, so that the deployment
+    # poller (which treats ValueError as an unreadable reply and keeps polling) reports it straight away.
+    pass
+
+
+class DnacClient:
+    # Holds the connection pool and auth token for one DNA Center server.  Safe to share between threads.
+
+    def __init__(self, dnac_server, username, password=None, pool_size=10, token_cache=DEFAULT_TOKEN_CACHE,
+                 request_timeout=DEFAULT_REQUEST_TIMEOUT):
+        # "password" may be a string or a function returning a string.  A function is only called when a new
+        # token actually has to be requested, so a cached token avoids prompting for the password at all.
+        # "request_timeout" is the number of seconds to wait for each response.  A call that times out raises
+        # requests.Timeout (a requests.RequestException), and is retried like any other connection error.
+        self.dnac_server = dnac_server
+        self.username = username
+        self.password = password
+        self.token_cache = token_cache
+        self.timeout = (min(CONNECT_TIMEOUT, request_timeout), request_timeout)
+        self.cache_key = f'{username}@{dnac_server}'
+        self.token = None
+        self.token_expires = 0
+        # Optional local device inventory (inventory_store.InventoryStore) used to resolve device names for this server
+        self.inventory = None
+        # Optional local template lookup cache (template_cache.TemplateCache) for this server
+        self.template_cache = None
+        # Optional timing instrumentation (metrics.Metrics); every API call made by this client is recorded in it
+        self.metrics = None
+        # Optional request scheduler (rate_limiter.RateLimiter) that paces and retries every API call
+        self.limiter = None
+        self.lock = threading.Lock()
+        self.session = requests.Session()
+        self.session.verify = False
+        self.session.headers.update({"Content-Type": "application/json"})
+        # pool_block makes extra worker threads wait for a free connection instead of opening throwaway ones
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def url(self, path):
+        # "dnac_server" is normally a hostname or IP address, but may also include a scheme and port
+        # (e.g. "http://127.0.0.1:8080") to reach a test server such as the one in the "benchmark" directory.
+        if '://' in self.dnac_server:
+            return f'{self.dnac_server}{path}'
+        return f'https://{self.dnac_server}{path}'
+
+    def get_password(self):
+        # A password function may prompt on the console, which is only done from the main thread.  A prompt from a
+        # worker thread would hang an unattended run (and interleave with other output), so that is an error instead.
+        if callable(self.password):
+            if threading.current_thread() is not threading.main_thread():
+                raise PasswordRequired(f'A new auth token is needed for {self.dnac_server} but no password was given.  '
+                                       'Use --password, or start the run with more of the cached token\'s lifetime left.')
+            self.password = self.password()
+        return self.password
+
+    def record_call(self, method, path, result, start, retries=0):
+        # Record an API call in self.metrics.  "result" is the final response, or None if no response was received.
+        if not self.metrics:
+            return
+        request_bytes = len(result.request.body or b'') if result is not None else 0
+        response_bytes = len(result.content) if result is not None else 0
+        self.metrics.record_call(method, path, result.status_code if result is not None else 'error',
+                                 time.monotonic() - start, retries, request_bytes, response_bytes)
+
+    def request_token(self):
+        # Authenticate to DNA Center API and return the raw response.
+        credentials = HTTPBasicAuth(self.username, self.get_password())
+        path = '/api/system/v1/auth/token'
+        start = time.monotonic()
+        result = None
+        try:
+            result = self.session.post(self.url(path), auth=credentials, timeout=self.timeout)
+            return result
+        finally:
+            self.record_call('POST', path, result, start)
+
+    def load_cached_token(self):
+        # Use a token saved by an earlier run, if it is not close to expiring.
+        if not self.token_cache:
+            return False
+        cached = read_token_cache(self.token_cache).get(self.cache_key)
+        if cached and cached.get('expires', 0) - TOKEN_REFRESH_MARGIN > time.time():
+            self.token = cached['token']
+            self.token_expires = cached['expires']
+            return True
+        return False
+
+    def save_token(self):
+        if not self.token_cache:
+            return
+        cache_data = read_token_cache(self.token_cache)
+        # Drop any expired tokens for other servers while the file is being rewritten anyway
+        cache_data = {k: v for k, v in cache_data.items() if v.get('expires', 0) > time.time()}
+        cache_data[self.cache_key] = {"token": self.token, "expires": self.token_expires}
+        try:
+            write_token_cache(self.token_cache, cache_data)
+        except OSError as e:
+            print(f'Unable to save the auth token cache "{self.token_cache}": {e}\n')
+
+    def set_token(self, token):
+        # Store a newly issued token and save it for later runs.  Callers must hold self.lock.
+        self.token = token
+        self.token_expires = time.time() + TOKEN_LIFETIME
+        self.save_token()
+
+    def auth(self, force=False, stale_token=None):
+        # Return a valid token, requesting a new one only when there is no cached token, the current one is
+        # about to expire, or "force" is set.  "stale_token" is the token that was rejected with a 401; if another
+        # thread has already replaced it, that new token is used rather than requesting yet another one.
+        with self.lock:
+            if stale_token and self.token != stale_token:
+                return self.token
+            if not force and self.token and self.token_expires - TOKEN_REFRESH_MARGIN > time.time():
+                return self.token
+            if not force and self.load_cached_token():
+                return self.token
+            result = self.request_token()
+            if result.status_code != 200:
+                return None
+            self.set_token(result.json()['Token'])
+            return self.token
+
+    def request(self, method, path, **kwargs):
+        # Send an API request with the current token.  If DNA Center rejects the token with a 401, a new token is
+        # requested and the call is retried once.  With self.limiter set, the call waits for its endpoint's rate
+        # limit first, and throttled or failed calls are retried as the limiter decides.
+        token = self.auth()
+        headers = kwargs.pop('headers', {})
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.monotonic()
+        result = None
+        retries = 0
+        reauthenticated = False
+        try:
+            while True:
+                if self.limiter:
+                    self.limiter.acquire(path)
+                result = None
+                try:
+                    result = self.session.request(method, self.url(path), headers={**headers, "x-auth-token": token}, **kwargs)
+                except requests.RequestException:
+                    delay = self.limiter.retry_delay(method, path, None, retries) if self.limiter else None
+                    if delay is None:
+                        raise
+                else:
+                    if result.status_code == 401 and not reauthenticated:
+                        reauthenticated = True
+                        token = self.auth(force=True, stale_token=token)
+                        if not token:
+                            return result
+                        retries += 1
+                        continue
+                    delay = self.limiter.retry_delay(method, path, result, retries) if self.limiter else None
+                    if delay is None:
+                        return result
+                retries += 1
+                time.sleep(delay)
+        finally:
+            self.record_call(method, path, result, start, retries)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def connect(args, metrics=None, token_life=0, on_response=None):
+    # Create the shared API client from the common command line options (--dnac_server, --username, --password,
+    # --workers, --rate_limit, --max_retries, --request_timeout, --token_cache and --no_token_cache) and make sure it
+    # holds a valid access token.  A token cached by an earlier run is reused when possible, and the password is only
+    # asked for when a new token is needed.  Worker threads cannot ask for the password, so it is also asked for now if
+    # the cached token expires within "token_life" seconds.  "on_response(result, body)" is called with the token
+    # response and its parsed body, e.g. for verbose output.
+    password = args.password or (lambda: getpass("Enter the DNAC Password: ", stream=None))
+    token_cache = None if args.no_token_cache else args.token_cache
+    client = DnacClient(args.dnac_server, args.username, password, pool_size=args.workers, token_cache=token_cache,
+                        request_timeout=args.request_timeout)
+    client.metrics = metrics
+    client.limiter = RateLimiter(args.rate_limit, args.max_retries)
+    if client.load_cached_token():
+        if callable(password) and client.token_expires - TOKEN_REFRESH_MARGIN - time.time() < token_life:
+            client.get_password()
+        return client
+    result = client.request_token()
+    body = result.json() if result.status_code == 200 else None
+    if on_response:
+        on_response(result, body)
+    if body is None:
+        print('Error during authentication.\n')
+        sys.exit(1)
+    with client.lock:
+        client.set_token(body['Token'])
+    return client
@@ -0,0 +1,164 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Local HTTP listener for DNA Center event notifications (webhooks), used by "template_runner.py --event_listen".
+# DNA Center posts an event when a template deployment or provisioning task finishes, so deployments can be
+# resolved as their events arrive instead of being polled.  Events are kept until "deployment_poller.py" takes
+# them, so an event that arrives before the poller starts waiting for its deployment is not lost.
+# Only Python built-in packages are used.  A DNA Center webhook destination normally requires HTTPS, so pass
+# a certificate file to serve HTTPS, and a token to reject events that do not carry it.
+# Any host that can reach the listener could otherwise report a deployment as finished, so it listens on the loopback
+# address unless told otherwise, and refuses to listen on any other address without a token.
+
+import hmac
+import ipaddress
+import json
+import ssl
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from deployment_poller import FINAL_STATES
+
+# Header holding the shared token, when one is configured.  Add it to the webhook destination's headers in DNA Center.
+TOKEN_HEADER = 'X-Event-Token'
+
+# Keys that may hold the Deployment ID and status, at the top level of an event or in its "details"
+DEPLOY_ID_KEYS = ['deploymentId', 'deployment_id', 'deployId']
+STATUS_KEYS = ['status', 'deploymentStatus', 'result']
+
+# Most finished deployments kept until taken.  DNA Center also sends events for deployments this run did not start,
+# which are never taken, so the oldest are dropped beyond this.
+MAX_EVENTS = 10000
+
+
+def parse_listen(listen):
+    # Split a "host:port" (or just "port") listen address into a (host, port) Tuple.  The host defaults to loopback.
+    host, _, port = listen.rpartition(':')
+    return host.strip('[]') or '127.0.0.1', int(port)
+
+
+def is_loopback(host):
+    # True if a listen host only accepts connections from this computer.
+    if host.lower() == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def event_status(event):
+    # Return the deployment status Dictionary described by one event, in the same form as the deployment status API,
+    # or None if the event is not about a finished template deployment.
+    if not isinstance(event, dict):
+        return None
+    fields = {**event, **event['details']} if isinstance(event.get('details'), dict) else event
+    deploy_id = next((fields[x] for x in DEPLOY_ID_KEYS if fields.get(x)), None)
+    status = next((fields[x] for x in STATUS_KEYS if isinstance(fields.get(x), str)), '').upper()
+    if not deploy_id or status not in FINAL_STATES:
+        return None
+    result = {"deploymentId": str(deploy_id).split(':')[-1].strip(), "status": status, "source": 'event'}
+    for key in ['devices', 'detailedStatusMessage', 'eventId', 'timestamp']:
+        if key in fields:
+            result[key] = fields[key]
+    return result
+
+
+class EventHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    receiver = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status_code):
+        self.send_response(status_code)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.receiver.token and not hmac.compare_digest(self.headers.get(TOKEN_HEADER, ''), self.receiver.token):
+            return self.reply(401)
+        try:
+            events = json.loads(body)
+        except ValueError:
+            return self.reply(400)
+        # DNA Center sends one event per request, but a List of events is accepted too
+        self.receiver.add(events if isinstance(events, list) else [events])
+        self.reply(200)
+
+
+class EventReceiver:
+    # Listens for events on a background thread.  Finished deployments are kept by Deployment ID until taken.
+    # "event_timeout" is how long the poller waits for a deployment's event before polling it instead.
+
+    def __init__(self, listen, token=None, cert_file=None, event_timeout=60.0):
+        address = parse_listen(listen)
+        if not token and not is_loopback(address[0]):
+            raise ValueError('a token is required to listen for events on an address other than loopback')
+        self.token = token
+        self.event_timeout = event_timeout
+        self.finished = OrderedDict()
+        self.received = 0
+        self.condition = threading.Condition()
+        handler = type('Handler', (EventHandler,), {"receiver": self})
+        self.server = ThreadingHTTPServer(address, handler)
+        self.server.daemon_threads = True
+        if cert_file:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(cert_file)
+            self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def address(self):
+        return self.server.server_address[:2]
+
+    def add(self, events):
+        with self.condition:
+            for event in events:
+                self.received += 1
+                status = event_status(event)
+                if status:
+                    self.finished[status['deploymentId']] = status
+                    self.finished.move_to_end(status['deploymentId'])
+                    if len(self.finished) > MAX_EVENTS:
+                        self.finished.popitem(last=False)
+            self.condition.notify_all()
+
+    def take(self, deploy_ids):
+        # Remove and return the statuses received for any of "deploy_ids", as a Dictionary keyed by Deployment ID.
+        with self.condition:
+            return {x: self.finished.pop(x) for x in list(self.finished) if x in deploy_ids}
+
+    def wait(self, timeout, received):
+        # Block until more than "received" events have arrived in total, or "timeout" seconds pass.
+        with self.condition:
+            self.condition.wait_for(lambda: self.received != received, timeout)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
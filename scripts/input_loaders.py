@@ -0,0 +1,154 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Input file loaders for "template_runner.py".  The format of an input file is taken from its content where the
+# content makes it clear (JSON, NDJSON and YAML documents), and otherwise from its file extension:
+#   csv          - a List with a Dictionary for each row, keyed by the column headers
+#   txt          - the whole file as one String
+#   yaml / yml   - parsed with libyaml's C loader when PyYAML was built with it, which is many times faster
+#   json         - parsed with the standard library's C-accelerated JSON decoder
+#   ndjson / jsonl - one JSON record per line, read one line at a time, so it can be streamed with bounded memory
+
+import csv
+import json
+import os
+
+EXTENSIONS = {
+    '.csv': 'csv',
+    '.txt': 'txt',
+    '.yaml': 'yaml',
+    '.yml': 'yaml',
+    '.json': 'json',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+}
+
+# Formats that hold a sequence of records, which can be streamed one record at a time
+RECORD_FORMATS = ['csv', 'ndjson']
+
+SNIFF_BYTES = 64 * 1024
+
+
+class InputFormatError(ValueError):
+    pass
+
+
+def sniff_format(head):
+    # Guess the format from the start of a file, or return None if the content alone does not settle it.
+    text = head.lstrip()
+    if text.startswith(('---', '%YAML')):
+        return 'yaml'
+    if not text.startswith(('{', '[')):
+        return None
+    first_line, _, rest = text.partition('\n')
+    if rest.strip():
+        # A complete JSON value on the first line followed by more lines is NDJSON
+        try:
+            json.loads(first_line)
+            return 'ndjson'
+        except ValueError:
+            pass
+    return 'json'
+
+
+def detect_format(input_file):
+    # Return the format of an input file, from its content where possible and otherwise from its extension.
+    # Only the extension after the last dot is used, so directory and file names may contain dots.
+    with open(input_file, 'rt', encoding='utf-8-sig', errors='replace') as f:
+        head = f.read(SNIFF_BYTES)
+    extension = EXTENSIONS.get(os.path.splitext(input_file)[1].lower())
+    # TXT files are sent as they are, and YAML files may hold JSON-style YAML, so those extensions are trusted
+    if extension in ['txt', 'yaml']:
+        return extension
+    sniffed = sniff_format(head)
+    if sniffed:
+        return sniffed
+    if extension:
+        return extension
+    raise InputFormatError(f'Input file type of "{input_file}" not supported.  Use a .csv, .txt, .yaml, .yml, .json, .ndjson or .jsonl file.')
+
+
+def read_csv(input_file):
+    # Yield a Dictionary for each CSV row (headers become Keys).
+    with open(input_file, 'rt', newline='') as f:
+        for row in csv.DictReader(f):
+            if 'additional_config' in row.keys():
+                row['additional_config'] = row['additional_config'].replace('\\n', '\n') # Fix up the escaped backslash problem
+            yield row
+
+
+def read_ndjson(input_file):
+    # Yield one record for each non-blank line.
+    with open(input_file, 'rt', encoding='utf-8-sig') as f:
+        for line_num, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise InputFormatError(f'Error parsing NDJSON file "{input_file}" line {line_num}: {e}') from None
+
+
+def read_yaml(input_file):
+    import yaml # Packaged named "PyYAML" at pypi.org - only imported if needed
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    with open(input_file, 'rb') as f:
+        try:
+            return yaml.load(f, Loader=loader)
+        except yaml.YAMLError as e:
+            raise InputFormatError(f'Error parsing YAML file:\n{e}') from None
+
+
+def read_json(input_file):
+    with open(input_file, 'rb') as f:
+        try:
+            return json.load(f)
+        except ValueError as e:
+            raise InputFormatError(f'Error parsing JSON file "{input_file}": {e}') from None
+
+
+def read_txt(input_file):
+    with open(input_file, 'rt') as f:
+        return f.read()
+
+
+def load_input(input_file, input_format=None):
+    # Read a whole input file into the value sent as the template's "input_data" variable.
+    input_format = input_format or detect_format(input_file)
+    if input_format == 'csv':
+        return list(read_csv(input_file))
+    if input_format == 'ndjson':
+        return list(read_ndjson(input_file))
+    if input_format == 'yaml':
+        return read_yaml(input_file)
+    if input_format == 'json':
+        return read_json(input_file)
+    return read_txt(input_file)
+
+
+def iter_records(input_file, input_format=None):
+    # Yield the records of a CSV or NDJSON input file one at a time.
+    input_format = input_format or detect_format(input_file)
+    if input_format not in RECORD_FORMATS:
+        raise InputFormatError(f'"{input_file}" is a {input_format.upper()} file; only CSV and NDJSON files can be read one record at a time.')
+    return read_csv(input_file) if input_format == 'csv' else read_ndjson(input_file)
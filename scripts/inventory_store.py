@@ -0,0 +1,146 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Local copy of the DNA Center device inventory, stored in SQLite.  The whole "network-device" inventory is
+# downloaded once by "template_runner.py --sync_inventory", after which device names can be resolved to UUIDs
+# without making an API call for every device.
+
+import os
+import sqlite3
+import threading
+import time
+from itertools import islice
+
+from dnac_client import CACHE_DIR
+
+DEFAULT_INVENTORY_DB = os.path.join(CACHE_DIR, 'inventory.db')
+DEFAULT_INVENTORY_TTL = 24 * 60 * 60
+
+# Largest page size accepted by the "network-device" API
+PAGE_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    server TEXT NOT NULL,
+    hostname TEXT NOT NULL COLLATE NOCASE,
+    id TEXT NOT NULL,
+    management_ip TEXT,
+    platform TEXT,
+    serial TEXT,
+    family TEXT,
+    PRIMARY KEY (server, id)
+);
+CREATE INDEX IF NOT EXISTS devices_hostname ON devices (server, hostname COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS syncs (
+    server TEXT PRIMARY KEY,
+    synced_at REAL NOT NULL,
+    device_count INTEGER NOT NULL
+);
+CREATE TEMP TABLE IF NOT EXISTS devices_staging (
+    server TEXT NOT NULL,
+    hostname TEXT NOT NULL,
+    id TEXT NOT NULL,
+    management_ip TEXT,
+    platform TEXT,
+    serial TEXT,
+    family TEXT
+);
+"""
+
+DEVICE_COLUMNS = ['hostname', 'id', 'management_ip', 'platform', 'serial', 'family']
+
+
+def device_record(device):
+    # Pick out the fields that are kept locally from one "network-device" API record.
+    return {
+        "hostname": device.get('hostname') or '',
+        "id": device['id'],
+        "management_ip": device.get('managementIpAddress'),
+        "platform": device.get('platformId'),
+        "serial": device.get('serialNumber'),
+        "family": device.get('family'),
+    }
+
+
+class InventoryStore:
+    # SQLite device inventory for one or more DNA Center servers.  Safe to share between threads.
+
+    def __init__(self, db_file=DEFAULT_INVENTORY_DB, ttl=DEFAULT_INVENTORY_TTL):
+        if db_file != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(db_file)), mode=0o700, exist_ok=True)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_file, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock:
+            self.db.executescript(SCHEMA)
+
+    def replace_devices(self, server, devices):
+        # Replace every stored device for "server" with the records in "devices", in a single transaction.
+        # "devices" may be a generator still downloading the inventory.  Its records are written to a staging table
+        # one page at a time as they arrive, and only copied over the stored devices once the download is complete,
+        # so the whole inventory is never held in memory and the database is not locked while waiting on the network.
+        columns = ', '.join(['server'] + DEVICE_COLUMNS)
+        rows = ((server, x['hostname'], x['id'], x['management_ip'], x['platform'], x['serial'], x['family']) for x in devices)
+        count = 0
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM devices_staging WHERE server = ?', (server,))
+        try:
+            while True:
+                chunk = list(islice(rows, PAGE_SIZE))
+                if not chunk:
+                    break
+                with self.lock, self.db:
+                    self.db.executemany(f'INSERT INTO devices_staging ({columns}) VALUES (?, ?, ?, ?, ?, ?, ?)', chunk)
+                count += len(chunk)
+            with self.lock, self.db:
+                self.db.execute('DELETE FROM devices WHERE server = ?', (server,))
+                self.db.execute(f'INSERT OR REPLACE INTO devices ({columns}) '
+                                f'SELECT {columns} FROM devices_staging WHERE server = ? ORDER BY rowid', (server,))
+                self.db.execute('INSERT OR REPLACE INTO syncs VALUES (?, ?, ?)', (server, time.time(), count))
+        finally:
+            # Also reached when the download fails part way, leaving the stored devices as they were
+            with self.lock, self.db:
+                self.db.execute('DELETE FROM devices_staging WHERE server = ?', (server,))
+        return count
+
+    def is_fresh(self, server):
+        # True if the inventory for "server" was synchronized within the TTL.
+        with self.lock:
+            row = self.db.execute('SELECT synced_at FROM syncs WHERE server = ?', (server,)).fetchone()
+        return bool(row) and time.time() - row['synced_at'] < self.ttl
+
+    def lookup(self, server, hostname, prefix=False):
+        # Return a List of matching device records.  Hostnames are matched without regard to case.
+        # With "prefix" set, a name such as "switch1" also matches "switch1.example.com", unless an exact match exists.
+        columns = ', '.join(DEVICE_COLUMNS)
+        with self.lock:
+            rows = self.db.execute(f'SELECT {columns} FROM devices WHERE server = ? AND hostname = ?', (server, hostname)).fetchall()
+            if prefix and not rows:
+                pattern = hostname.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                rows = self.db.execute(f"SELECT {columns} FROM devices WHERE server = ? AND hostname LIKE ? ESCAPE '\\'",
+                                       (server, pattern)).fetchall()
+        return [dict(x) for x in rows]
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,312 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Offline preview of Jinja templates, using the project export files in the "templates" directory of this
+# repository.  DNA Center renders Jinja templates with Jinjava (a Java implementation of Jinja), so the
+# Jinjava-specific behaviour used by these templates is emulated here:
+#   * {% include %} inlines the named template (quoted or unquoted, "Project/Template" or just "Template" for the
+#     same project), so macros and variables set by the included template can be used afterwards.
+#   * The "split" and "fromjson" filters.
+#   * Java String methods such as .matches(), .contains(), .indexOf() and .replaceAll(), and Java Map and List
+#     methods such as .replace(), .remove() and .add().
+#   * The type() function.
+#   * The "+" operator joins two values as text when either one is a string ("1" + 1 is "11").
+# Each template is compiled once, together with everything it includes, and the compiled template is kept in
+# memory by a hash of its expanded source.  An optional directory keeps Jinja's compiled bytecode between runs.
+
+import glob
+import hashlib
+import json
+import os
+import re
+import threading
+
+import jinja2  # Package named "Jinja2" at pypi.org
+from jinja2.compiler import CodeGenerator, optimizeconst
+
+from template_index import INCLUDE_TAG, COMMENT_TAG, load_bundle
+
+
+# File names of the compiled bytecode kept between runs.  Changed whenever the emulation changes the code that
+# templates compile to, so bytecode compiled by an older version is not reused.
+BYTECODE_PATTERN = '__jinjava2_%s.cache'
+
+
+class TemplateNotFound(LookupError):
+    pass
+
+
+def load_bundles(templates_dir):
+    # Load every "*.json" export in "templates_dir" into a Dictionary keyed by "Project/Template".
+    # The same template can appear in more than one export; the most recently changed copy is kept.
+    templates = {}
+    for bundle_file in sorted(glob.glob(os.path.join(templates_dir, '*.json'))):
+        for template in load_bundle(bundle_file):
+            key = f'{template["projectName"]}/{template["name"]}'
+            current = templates.get(key)
+            if not current or (template.get('lastUpdateTime') or 0) >= (current.get('lastUpdateTime') or 0):
+                templates[key] = template
+    return templates
+
+
+def java_replacement(replacement):
+    # Convert a Java regex replacement string to a function for re.sub().  Java refers to groups as "$1" and
+    # uses a backslash to make the next character literal.
+    def replace(match):
+        result = []
+        chars = iter(replacement)
+        for char in chars:
+            if char == '\\':
+                result.append(next(chars, ''))
+            elif char == '$':
+                digits = ''
+                for char in chars:
+                    if not char.isdigit():
+                        break
+                    digits += char
+                else:
+                    char = ''
+                result.append((match.group(int(digits)) or '') + char if digits else '$' + char)
+            else:
+                result.append(char)
+        return ''.join(result)
+    return replace
+
+
+def java_type(value):
+    # Jinjava's type() function, which reports the type name of a value.
+    if value is None:
+        return 'null'
+    names = {bool: 'bool', int: 'int', float: 'float', str: 'str', list: 'list', tuple: 'list', dict: 'dict'}
+    return names.get(type(value), type(value).__name__)
+
+
+def java_string(value):
+    # Convert a value to text the way Java does when it is joined to a string.
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return '' if value is None else str(value)
+
+
+def java_add(left, right):
+    # Jinjava's "+" operator: string concatenation if either value is a string, otherwise the usual addition.
+    if isinstance(left, str) or isinstance(right, str):
+        return java_string(left) + java_string(right)
+    return left + right
+
+
+def java_list_remove(items, item):
+    # Java's List.remove(): remove(int) removes and returns the item at that index, remove(Object) removes the
+    # first equal item and returns whether there was one.
+    if isinstance(item, int) and not isinstance(item, bool):
+        return items.pop(item)
+    if item in items:
+        items.remove(item)
+        return True
+    return False
+
+
+# Java String methods that Jinjava templates can call on any string value
+JAVA_STRING_METHODS = {
+    "matches": lambda s: lambda pattern: re.fullmatch(pattern, s) is not None,
+    "contains": lambda s: lambda x: str(x) in s,
+    "indexOf": lambda s: lambda x, start=0: s.find(str(x), start),
+    "lastIndexOf": lambda s: lambda x: s.rfind(str(x)),
+    "replaceAll": lambda s: lambda pattern, replacement: re.sub(pattern, java_replacement(replacement), s),
+    "replaceFirst": lambda s: lambda pattern, replacement: re.sub(pattern, java_replacement(replacement), s, count=1),
+    "startsWith": lambda s: lambda x: s.startswith(x),
+    "endsWith": lambda s: lambda x: s.endswith(x),
+    "equals": lambda s: lambda x: s == x,
+    "equalsIgnoreCase": lambda s: lambda x: s.lower() == str(x).lower(),
+    "toLowerCase": lambda s: lambda: s.lower(),
+    "toUpperCase": lambda s: lambda: s.upper(),
+    "trim": lambda s: lambda: s.strip(),
+    "length": lambda s: lambda: len(s),
+    "isEmpty": lambda s: lambda: len(s) == 0,
+    "substring": lambda s: lambda start, end=None: s[start:end],
+    "charAt": lambda s: lambda x: s[x],
+}
+
+
+# Java Map methods that Jinjava templates can call on any Dictionary value
+JAVA_MAP_METHODS = {
+    "containsKey": lambda d: lambda key: key in d,
+    "put": lambda d: lambda key, value: d.__setitem__(key, value),
+    "replace": lambda d: lambda key, value: d.__setitem__(key, value) if key in d else None,
+    "remove": lambda d: lambda key: d.pop(key, None),
+    "size": lambda d: lambda: len(d),
+    "isEmpty": lambda d: lambda: len(d) == 0,
+}
+
+# Java List methods that Jinjava templates can call on any List value
+JAVA_LIST_METHODS = {
+    "add": lambda l: lambda item: l.append(item),
+    "contains": lambda l: lambda item: item in l,
+    "remove": lambda l: lambda item: java_list_remove(l, item),
+    "size": lambda l: lambda: len(l),
+    "isEmpty": lambda l: lambda: len(l) == 0,
+}
+
+
+def split_filter(value, separator=None, limit=0):
+    # Jinjava's "split" filter, which uses Guava's Splitter: splits on any whitespace unless a separator is given,
+    # trims every item and drops empty ones.  With "limit", the last item holds the rest of the string.
+    text = '' if value is None else str(value)
+    pattern = re.compile(re.escape(str(separator)) if separator else r'\s')
+    items = []
+    start = 0
+    while True:
+        match = None if limit and len(items) == limit - 1 else pattern.search(text, start)
+        item = text[start:match.start() if match else len(text)].strip()
+        if item:
+            items.append(item)
+        if not match:
+            return items
+        start = match.end()
+
+
+class JinjavaCodeGenerator(CodeGenerator):
+    # Compiles "+" to a call of java_add().  Constant expressions are still worked out once, at compile time.
+
+    @optimizeconst
+    def visit_Add(self, node, frame):
+        self.write('environment.java_add(')
+        self.visit(node.left, frame)
+        self.write(', ')
+        self.visit(node.right, frame)
+        self.write(')')
+
+
+class JinjavaEnvironment(jinja2.Environment):
+    # Jinja Environment that adds the Java String, Map and List methods when a template looks up an attribute.
+    code_generator_class = JinjavaCodeGenerator
+    java_add = staticmethod(java_add)
+
+    def getattr(self, obj, attribute):
+        if isinstance(obj, str) and attribute in JAVA_STRING_METHODS:
+            return JAVA_STRING_METHODS[attribute](obj)
+        if isinstance(obj, dict) and attribute in JAVA_MAP_METHODS:
+            # A key of the same name (e.g. a "size" column) takes priority over the Java method
+            return obj[attribute] if attribute in obj else JAVA_MAP_METHODS[attribute](obj)
+        if isinstance(obj, list) and attribute in JAVA_LIST_METHODS:
+            return JAVA_LIST_METHODS[attribute](obj)
+        return super().getattr(obj, attribute)
+
+
+class ExpandedSourceLoader(jinja2.BaseLoader):
+    # Jinja loader that serves the include-expanded source of each template, using its content hash as the name.
+    # Loading through a loader (rather than Environment.from_string) lets Jinja use its bytecode cache.
+
+    def __init__(self):
+        self.sources = {}
+
+    def get_source(self, environment, name):
+        if name not in self.sources:
+            raise jinja2.TemplateNotFound(name)
+        return self.sources[name], None, lambda: True
+
+
+def create_environment(bytecode_dir=None):
+    bytecode_cache = None
+    if bytecode_dir:
+        os.makedirs(bytecode_dir, mode=0o700, exist_ok=True)
+        bytecode_cache = jinja2.FileSystemBytecodeCache(bytecode_dir, BYTECODE_PATTERN)
+    env = JinjavaEnvironment(loader=ExpandedSourceLoader(), bytecode_cache=bytecode_cache, cache_size=0,
+                             extensions=['jinja2.ext.do', 'jinja2.ext.loopcontrols'], keep_trailing_newline=True)
+    env.filters['split'] = split_filter
+    env.filters['fromjson'] = json.loads
+    env.globals['type'] = java_type
+    return env
+
+
+class LocalRenderer:
+    # Renders templates from the export files without contacting DNA Center.  Safe to share between threads.
+
+    def __init__(self, templates_dir, bytecode_dir=None):
+        self.templates = load_bundles(templates_dir)
+        self.env = create_environment(bytecode_dir)
+        self.lock = threading.Lock()
+        # "Project/Template" -> hash of the expanded source, and hash -> compiled jinja2.Template
+        self.source_hashes = {}
+        self.compiled = {}
+
+    def find(self, project, name):
+        # Look up a template record by project and name.
+        template = self.templates.get(f'{project}/{name}')
+        if not template:
+            raise TemplateNotFound(f'Template "{project}/{name}" was not found in the template export files.')
+        return template
+
+    def expand_includes(self, project, content, seen=()):
+        # Replace each {% include %} tag with the content of the included template, the way DNA Center does,
+        # so that macros and variables defined by the included template are available afterwards.
+        content = COMMENT_TAG.sub('', content)
+
+        def include(match):
+            target = next(x for x in match.groups() if x)
+            target_project, _, target_name = target.rpartition('/')
+            key = f'{target_project or project}/{target_name}'
+            if key in seen:
+                raise TemplateNotFound(f'Template "{key}" includes itself.')
+            included = self.find(target_project or project, target_name)
+            return self.expand_includes(included['projectName'], included['templateContent'], seen + (key,))
+
+        return INCLUDE_TAG.sub(include, content)
+
+    def source_hash(self, project, name):
+        # Return the hash of a template's source with all of its includes expanded.  Two templates (or two
+        # versions of one template) with the same content and the same included content share a hash.
+        key = f'{project}/{name}'
+        if key not in self.source_hashes:
+            template = self.find(project, name)
+            if template.get('language', 'JINJA') != 'JINJA':
+                raise ValueError(f'Template "{key}" is a {template["language"]} template; only Jinja templates can be previewed locally.')
+            source = self.expand_includes(project, template['templateContent'], (key,))
+            source_hash = hashlib.sha256(source.encode()).hexdigest()
+            self.env.loader.sources[source_hash] = source
+            self.source_hashes[key] = source_hash
+        return self.source_hashes[key]
+
+    def uses_device(self, project, name):
+        # True if the template, or a template it includes, uses the "__device" System Bind Variable.  Only such
+        # templates can render differently for two devices given the same input data.
+        with self.lock:
+            source_hash = self.source_hash(project, name)
+        return '__device' in self.env.loader.sources[source_hash]
+
+    def compile(self, project, name):
+        # Return the compiled template, compiling it only the first time it is used.  The lock makes sure
+        # worker threads rendering the same template wait for one compile instead of each compiling it.
+        with self.lock:
+            source_hash = self.source_hash(project, name)
+            if source_hash not in self.compiled:
+                self.compiled[source_hash] = self.env.get_template(source_hash)
+            return self.compiled[source_hash]
+
+    def render(self, project, name, params, device=None):
+        # Render a template with the same variables that would be sent to the Preview API, and return the
+        # configuration text.  "device" supplies the "__device" System Bind Variable, e.g. an inventory record.
+        context = dict(params)
+        if device:
+            context['__device'] = device
+        return self.compile(project, name).render(context)
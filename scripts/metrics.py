@@ -0,0 +1,148 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Timing instrumentation for the template scripts.  Records the duration, HTTP status, retry count and payload
+# sizes of every DNA Center API call, and the duration of each phase of a run (auth, template lookup, device
+# lookup, deploy, deployment wait and so on).
+# Records are written as they happen to a JSON lines file, and totals are written at the end of the run to a
+# text file in the Prometheus exposition format (e.g. for the node_exporter "textfile" collector).
+
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+
+UUID_SEGMENT = re.compile(r'/[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}(?=/|$)')
+
+
+def endpoint_name(path):
+    # Remove the query string and replace UUIDs in an API path, so that calls are grouped by endpoint.
+    return UUID_SEGMENT.sub('/{id}', path.split('?', 1)[0])
+
+
+def label_value(value):
+    # Escape a Prometheus label value.
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def labels(**kwargs):
+    return '{' + ','.join(f'{k}="{label_value(v)}"' for k, v in kwargs.items()) + '}'
+
+
+class Metrics:
+    # Collects API call and phase timings for one run.  Safe to share between threads.
+
+    def __init__(self, jsonl_file=None, prometheus_file=None):
+        self.prometheus_file = prometheus_file
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.jsonl = open(jsonl_file, 'at') if jsonl_file else None
+        # (method, endpoint) -> totals, (method, endpoint, status) -> call count, and phase -> totals
+        self.calls = {}
+        self.statuses = {}
+        self.phases = {}
+
+    def write(self, record):
+        # Callers must hold self.lock.
+        if self.jsonl:
+            self.jsonl.write(json.dumps(record) + '\n')
+            self.jsonl.flush()
+
+    def record_call(self, method, path, status, duration, retries=0, request_bytes=0, response_bytes=0):
+        # Record one API call.  "status" is the final HTTP status code, or "error" if no response was received,
+        # and "duration" includes any retries.
+        endpoint = endpoint_name(path)
+        with self.lock:
+            totals = self.calls.setdefault((method, endpoint), {"count": 0, "seconds": 0.0, "retries": 0, "request_bytes": 0, "response_bytes": 0})
+            totals['count'] += 1
+            totals['seconds'] += duration
+            totals['retries'] += retries
+            totals['request_bytes'] += request_bytes
+            totals['response_bytes'] += response_bytes
+            key = (method, endpoint, str(status))
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+            self.write({"type": "api_call", "time": round(time.time(), 3), "method": method, "endpoint": endpoint,
+                        "status": status, "duration": round(duration, 4), "retries": retries,
+                        "request_bytes": request_bytes, "response_bytes": response_bytes})
+
+    def record_phase(self, phase, duration, **details):
+        # Record the duration of one phase.  "details" (e.g. the device name) are only written to the JSON lines file.
+        with self.lock:
+            totals = self.phases.setdefault(phase, {"count": 0, "seconds": 0.0})
+            totals['count'] += 1
+            totals['seconds'] += duration
+            self.write({"type": "phase", "time": round(time.time(), 3), "phase": phase, "duration": round(duration, 4), **details})
+
+    @contextlib.contextmanager
+    def phase(self, phase, **details):
+        # Time the enclosed block as one phase, even if it ends by raising an exception (including sys.exit()).
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record_phase(phase, time.monotonic() - start, **details)
+
+    def prometheus_text(self):
+        # Return the collected totals in the Prometheus text exposition format.
+        lines = []
+
+        def metric(name, metric_type, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            lines.extend(f'{name}{sample_labels} {value}' for sample_labels, value in samples)
+
+        with self.lock:
+            calls = sorted(self.calls.items())
+            statuses = sorted(self.statuses.items())
+            phases = sorted(self.phases.items())
+        metric('dnac_api_requests_total', 'counter', 'DNA Center API calls, by final HTTP status.',
+               [(labels(method=m, endpoint=e, status=s), count) for (m, e, s), count in statuses])
+        metric('dnac_api_request_duration_seconds', 'summary', 'Time spent on DNA Center API calls, including retries.',
+               [(f'_sum{labels(method=m, endpoint=e)}', round(x['seconds'], 6)) for (m, e), x in calls] +
+               [(f'_count{labels(method=m, endpoint=e)}', x['count']) for (m, e), x in calls])
+        metric('dnac_api_retries_total', 'counter', 'Extra attempts made by DNA Center API calls that were retried.',
+               [(labels(method=m, endpoint=e), x['retries']) for (m, e), x in calls])
+        metric('dnac_api_request_bytes_total', 'counter', 'Bytes sent in DNA Center API request bodies.',
+               [(labels(method=m, endpoint=e), x['request_bytes']) for (m, e), x in calls])
+        metric('dnac_api_response_bytes_total', 'counter', 'Bytes received in DNA Center API response bodies.',
+               [(labels(method=m, endpoint=e), x['response_bytes']) for (m, e), x in calls])
+        metric('dnac_phase_duration_seconds', 'summary', 'Time spent in each phase of the run.',
+               [(f'_sum{labels(phase=p)}', round(x['seconds'], 6)) for p, x in phases] +
+               [(f'_count{labels(phase=p)}', x['count']) for p, x in phases])
+        metric('dnac_run_start_time_seconds', 'gauge', 'Start time of the run, in seconds since the epoch.',
+               [('', round(self.started, 3))])
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        # Write the Prometheus text file and close the JSON lines file.  The text file is written to a temporary
+        # name and renamed, so a collector never reads a half-written file.
+        if self.prometheus_file:
+            temp_file = f'{self.prometheus_file}.{os.getpid()}.tmp'
+            with open(temp_file, 'wt') as f:
+                f.write(self.prometheus_text())
+            os.replace(temp_file, self.prometheus_file)
+        if self.jsonl:
+            self.jsonl.close()
+            self.jsonl = None
@@ -0,0 +1,102 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Streaming iterator for DNA Center list endpoints that are paged with "offset" and "limit" (device inventory,
+# template catalog, ...).  Records are yielded one at a time while the next few pages are already being fetched
+# on background threads, so a large collection downloads at network speed instead of one page after another.
+# Only "prefetch" pages are held at once, and each response body is parsed exactly once.
+# DNA Center offsets start at 1.  The end of the collection is the first page with fewer than "page_size" records.
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DEFAULT_PAGE_SIZE = 500
+DEFAULT_PREFETCH = 4
+
+
+class PageError(ValueError):
+    # A page request that DNA Center did not answer successfully.  "result" holds the HTTP response, or None when the
+    # request failed before a response arrived (connection errors and timeouts that outlasted the client's retries).
+
+    def __init__(self, path, offset, result=None, error=None):
+        detail = f'HTTP {result.status_code}\n{result.text}' if result is not None else error
+        super().__init__(f'Error fetching "{path}" at offset {offset}: {detail}')
+        self.result = result
+
+
+def page_records(body):
+    # Return the records of one parsed page: the "response" List of a DNA Center API reply, or the reply itself.
+    return body.get('response') or [] if isinstance(body, dict) else body or []
+
+
+def paginate(client, path, params=None, page_size=DEFAULT_PAGE_SIZE, prefetch=DEFAULT_PREFETCH, on_page=None, records=page_records):
+    # Yield every record of a paged list endpoint, in order.  "client" is a DnacClient (its rate limits and retries
+    # apply to every page).  "on_page(result, body)" is called with each response and its parsed body, e.g. for
+    # verbose output.  The first page is fetched alone, so a collection that fits in one page costs one request;
+    # after that up to "prefetch" pages are requested ahead of the consumer.  Pages requested past the end of the
+    # collection come back empty and are ignored.  Raises PageError for a page that fails, either with an HTTP error
+    # status or with a transport error.
+
+    def fetch(offset):
+        try:
+            result = client.get(path, params={**(params or {}), "offset": offset, "limit": page_size})
+            if result.status_code not in [200, 201, 202]:
+                raise PageError(path, offset, result)
+            body = result.json()
+        except requests.RequestException as e:
+            # Raised on a prefetch thread too, so it reaches the consumer as a PageError rather than a raw traceback
+            raise PageError(path, offset, error=e) from None
+        if on_page:
+            on_page(result, body)
+        return records(body)
+
+    page = fetch(1)
+    yield from page
+    if len(page) < page_size:
+        return
+    executor = ThreadPoolExecutor(max_workers=prefetch)
+    pending = deque()
+    next_offset = 1 + page_size
+    finished = False
+    try:
+        while True:
+            while not finished and len(pending) < prefetch:
+                pending.append(executor.submit(fetch, next_offset))
+                next_offset += page_size
+            if not pending:
+                return
+            page = pending.popleft().result()
+            if len(page) < page_size:
+                # The last page - anything requested after it is empty
+                finished = True
+                for future in pending:
+                    future.cancel()
+                pending.clear()
+            yield from page
+    finally:
+        # Also reached when the consumer stops early, so requests for pages it will never read are dropped
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
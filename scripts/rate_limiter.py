@@ -0,0 +1,173 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Request scheduling for the shared DNA Center API client.  DNA Center limits how often each API may be called,
+# so every call made through dnac_client.DnacClient first waits for a token from its endpoint's token bucket.
+# When DNA Center answers 429 (Too Many Requests) or 503 (Service Unavailable), the endpoint's rate is halved
+# and all calls to it pause for the "Retry-After" time; the rate then creeps back up by one call per second for
+# every second without throttling.  By default endpoints are not limited until DNA Center first throttles them,
+# so each endpoint settles just below the rate DNA Center allows.
+# Throttled calls are retried, as are idempotent calls (GET and PUT) that fail with a server or connection error.
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from metrics import endpoint_name
+
+DEFAULT_RATE = 0.0
+DEFAULT_MAX_RETRIES = 5
+
+# Never slow an endpoint below one call every 10 seconds, or honor a Retry-After longer than 5 minutes
+MIN_RATE = 0.1
+MAX_RETRY_AFTER = 5 * 60
+
+# Change an endpoint's rate at most once per second, so a burst of throttled calls only halves it once
+ADJUST_INTERVAL = 1.0
+
+# Calls per second that an endpoint without a limit is held to once DNA Center starts throttling it
+UNLIMITED_THROTTLE_RATE = 100.0
+
+# Responses that mean the request was not processed and may be sent again
+THROTTLE_STATUSES = [429, 503]
+SERVER_ERROR_STATUSES = [500, 502, 503, 504]
+IDEMPOTENT_METHODS = ['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE']
+
+
+def retry_after(result):
+    # Return the number of seconds requested by a "Retry-After" header, which may be a number of seconds or an
+    # HTTP date, or None if the header is missing or not understood.
+    value = result.headers.get('Retry-After') if result is not None else None
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+def backoff_delay(attempt, base=0.5, cap=30.0):
+    # Exponential backoff with full jitter, so that retrying threads do not all retry at the same moment.
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class TokenBucket:
+    # Allows "rate" calls per second on average, with bursts of up to "burst" calls.  Safe to share between threads.
+
+    def __init__(self, rate, burst=None):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.adjusted = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        # Wait until a call may be made.
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+    def throttled(self, pause=None):
+        # DNA Center is throttling this endpoint: halve the rate, and stop all calls for "pause" seconds.
+        with self.lock:
+            now = time.monotonic()
+            if now - self.adjusted >= ADJUST_INTERVAL:
+                # Never above the configured rate, even when that is below MIN_RATE
+                self.rate = min(self.max_rate, max(MIN_RATE, self.rate / 2))
+                self.adjusted = now
+            self.tokens = min(self.tokens, 0.0)
+            if pause:
+                self.paused_until = max(self.paused_until, now + pause)
+
+    def succeeded(self):
+        # Raise the rate by one call per second, at most once a second, back towards the configured rate.
+        with self.lock:
+            now = time.monotonic()
+            if self.rate < self.max_rate and now - self.adjusted >= ADJUST_INTERVAL:
+                self.rate = min(self.max_rate, self.rate + 1.0)
+                self.adjusted = now
+
+
+class RateLimiter:
+    # Per-endpoint token buckets plus the retry policy for the API client.  "rate" is the number of calls per second
+    # allowed to each endpoint, or 0 for no limit (throttled calls are still paused and retried).
+
+    def __init__(self, rate=DEFAULT_RATE, max_retries=DEFAULT_MAX_RETRIES):
+        self.rate = rate
+        self.max_retries = max_retries
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, path):
+        endpoint = endpoint_name(path)
+        with self.lock:
+            if endpoint not in self.buckets:
+                # Without a rate limit there is no bucket, until DNA Center throttles the endpoint (see retry_delay())
+                self.buckets[endpoint] = TokenBucket(self.rate) if self.rate else None
+            return self.buckets[endpoint]
+
+    def acquire(self, path):
+        bucket = self.bucket(path)
+        if bucket:
+            bucket.acquire()
+
+    def retry_delay(self, method, path, result, attempt):
+        # Given the outcome of an API call ("result" is None after a connection error), update the endpoint's rate
+        # and return the number of seconds to wait before retrying the call, or None if it should not be retried.
+        status = result.status_code if result is not None else None
+        if status in THROTTLE_STATUSES:
+            pause = retry_after(result)
+            with self.lock:
+                bucket = self.buckets.get(endpoint_name(path))
+                if bucket is None:
+                    bucket = self.buckets[endpoint_name(path)] = TokenBucket(UNLIMITED_THROTTLE_RATE)
+            bucket.throttled(pause)
+            if attempt >= self.max_retries or (status == 503 and pause is None and method not in IDEMPOTENT_METHODS):
+                return None
+            return pause if pause is not None else backoff_delay(attempt)
+        if result is not None and status < 500:
+            bucket = self.bucket(path)
+            if bucket:
+                bucket.succeeded()
+            return None
+        if method in IDEMPOTENT_METHODS and attempt < self.max_retries and (result is None or status in SERVER_ERROR_STATUSES):
+            return backoff_delay(attempt)
+        return None
@@ -0,0 +1,102 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Wave planning and the failure-rate circuit breaker used by "template_runner.py --waves".  A rollout starts with a
+# small canary wave, and each later wave grows by a fixed factor up to a maximum size.  Waves can also be limited to
+# a number of devices from any one group (site, device family, ...), so a bad change cannot take out every device
+# in a group at once.  As each device result arrives the breaker looks at the most recent results, and the rollout
+# stops as soon as too many of them failed.
+
+import math
+from collections import deque
+from itertools import islice
+
+# Statuses that count as a good result for the circuit breaker
+GOOD_STATES = ['SUCCESS', 'UNCHANGED']
+
+
+def wave_sizes(count, canary=1, growth=2.0, max_wave=None):
+    # Return the size of each wave for "count" devices: the canary wave, then waves growing by "growth" each time.
+    sizes = []
+    size = canary or max(1, min(count, max_wave or count))
+    while count > 0:
+        size = min(size, max_wave) if max_wave else size
+        sizes.append(min(size, count))
+        count -= sizes[-1]
+        size = max(size + 1, math.ceil(size * growth))
+    return sizes
+
+
+def plan_waves(devices, canary=1, growth=2.0, max_wave=None, group_of=None, max_per_group=None):
+    # Split a List of (device name, input_data) Tuples into waves.  With "group_of" (a function returning a
+    # device's group) and "max_per_group", no wave holds more than "max_per_group" devices from any one group, so
+    # devices over the limit move to later waves.  Otherwise devices keep their order in the input.
+    if not (group_of and max_per_group):
+        waves = []
+        position = 0
+        for size in wave_sizes(len(devices), canary, growth, max_wave):
+            waves.append(devices[position:position + size])
+            position += size
+        return waves
+    # One queue per group, holding (position in the input, device) so each wave can be put back in input order
+    queues = {}
+    for position, device in enumerate(devices):
+        queues.setdefault(group_of(device), deque()).append((position, device))
+    waves = []
+    size = canary or max(1, min(len(devices), max_wave or len(devices)))
+    remaining = len(devices)
+    while remaining:
+        size = min(size, max_wave) if max_wave else size
+        candidates = sorted(x for queue in queues.values() for x in islice(queue, max_per_group))
+        wave = candidates[:size]
+        taken = {x[0] for x in wave}
+        for group, queue in list(queues.items()):
+            while queue and queue[0][0] in taken:
+                queue.popleft()
+            if not queue:
+                del queues[group]
+        waves.append([x[1] for x in wave])
+        remaining -= len(wave)
+        size = max(size + 1, math.ceil(size * growth))
+    return waves
+
+
+class CircuitBreaker:
+    # Tracks the last "window" device results of a rollout and trips when more than "max_failure_rate" of them failed.
+
+    def __init__(self, max_failure_rate, window=50):
+        self.max_failure_rate = max_failure_rate
+        self.recent = deque(maxlen=window)
+        # Results are checked one at a time, so wait for the smallest number of results in which a single failure
+        # does not exceed the limit on its own - otherwise the first failure of a rollout would always trip it
+        self.min_results = min(window, math.ceil(1 / max_failure_rate)) if max_failure_rate > 0 else 1
+
+    def record(self, status):
+        self.recent.append(status not in GOOD_STATES)
+
+    @property
+    def failure_rate(self):
+        return sum(self.recent) / len(self.recent) if self.recent else 0.0
+
+    def tripped(self):
+        return len(self.recent) >= self.min_results and self.failure_rate > self.max_failure_rate
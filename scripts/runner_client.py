@@ -0,0 +1,64 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Thin client for a "template_runner.py --serve" daemon.  Sends the template_runner.py options given on the
+# command line to the daemon as a job, prints the job's output as it arrives and exits with the job's exit code.
+# Only the Python standard library is imported, so the client starts quickly.
+
+import json
+import os
+import socket
+import sys
+from argparse import ArgumentParser
+
+DEFAULT_SOCKET = os.path.join(os.path.expanduser('~'), '.dnac_templating', 'runner.sock')
+
+
+def submit_job(socket_file, argv):
+    # Send one job to the daemon, copy its output to this process's stdout and stderr, and return its exit code.
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_file)
+    except OSError as e:
+        print(f'Unable to reach the template_runner.py daemon at "{socket_file}": {e}\n', file=sys.stderr)
+        return 1
+    with client, client.makefile('rwb') as f:
+        f.write((json.dumps({"argv": argv, "cwd": os.getcwd()}) + '\n').encode())
+        f.flush()
+        for line in f:
+            message = json.loads(line)
+            if message['type'] == 'exit':
+                return message['code']
+            stream = sys.stderr if message['type'] == 'stderr' else sys.stdout
+            stream.write(message['data'])
+            stream.flush()
+    print('The template_runner.py daemon closed the connection before the job finished.\n', file=sys.stderr)
+    return 1
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Submit a job to a "template_runner.py --serve" daemon.  All other options are passed to template_runner.py.')
+    parser.add_argument('--socket', type=str, default=DEFAULT_SOCKET, help=f"Unix socket of the daemon (default: {DEFAULT_SOCKET})")
+    args, job_argv = parser.parse_known_args()
+
+    sys.exit(submit_job(args.socket, job_argv))
@@ -0,0 +1,158 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Resident job server for "template_runner.py --serve".  Jobs are received over a Unix socket that only the
+# current user can use, so the auth token, connection pool and lookup caches stay warm between jobs.
+#
+# Protocol: the client ("runner_client.py") sends one JSON line, {"argv": [...], "cwd": "..."}, holding the
+# template_runner.py options for the job and the directory they are relative to.  The server answers with JSON
+# lines as the job runs: {"type": "stdout" or "stderr", "data": "..."} for its output, and finally
+# {"type": "exit", "code": N} with the job's exit code.
+
+import contextlib
+import io
+import json
+import os
+import socket
+import socketserver
+import threading
+import traceback
+
+from dnac_client import CACHE_DIR
+
+DEFAULT_SOCKET = os.path.join(CACHE_DIR, 'runner.sock')
+
+
+class JobOutput(io.TextIOBase):
+    # File-like object that sends everything written to it to the client as "stdout" or "stderr" messages.
+    # If the client disconnects, output is dropped and the job carries on, so a deployment is never cut short.
+
+    def __init__(self, handler, stream):
+        self.handler = handler
+        self.stream = stream
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        if text:
+            self.handler.send({"type": self.stream, "data": text})
+        return len(text)
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    # Handles one client connection, which carries a single job.
+
+    def setup(self):
+        super().setup()
+        self.send_lock = threading.Lock()
+        self.connected = True
+
+    def send(self, message):
+        with self.send_lock:
+            if not self.connected:
+                return
+            try:
+                self.wfile.write((json.dumps(message) + '\n').encode())
+                self.wfile.flush()
+            except OSError:
+                self.connected = False
+
+    def handle(self):
+        try:
+            job = json.loads(self.rfile.readline())
+            argv = [str(x) for x in job['argv']]
+        except (ValueError, KeyError, TypeError):
+            self.send({"type": "stderr", "data": 'Invalid job request.\n'})
+            self.send({"type": "exit", "code": 2})
+            return
+        code = self.server.run(argv, job.get('cwd'), JobOutput(self, 'stdout'), JobOutput(self, 'stderr'))
+        self.send({"type": "exit", "code": code})
+
+
+def exit_code(e):
+    # Convert a SystemExit into a process exit code, printing its message if it has one.
+    if e.code is None:
+        return 0
+    if isinstance(e.code, int):
+        return e.code
+    print(e.code)
+    return 1
+
+
+class RunnerDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    # Accepts jobs on "socket_file" and runs them with "run_job(argv)".  template_runner.py keeps the state of a
+    # run in module globals and changes directory to the job's "cwd", so jobs run one at a time; later jobs wait.
+
+    daemon_threads = True
+
+    def __init__(self, socket_file, run_job):
+        self.socket_file = socket_file
+        self.run_job = run_job
+        self.job_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(socket_file)), mode=0o700, exist_ok=True)
+        remove_stale_socket(socket_file)
+        # Only the current user may connect, since jobs run with the daemon's DNAC credentials
+        umask = os.umask(0o177)
+        try:
+            super().__init__(socket_file, JobHandler)
+        finally:
+            os.umask(umask)
+
+    def run(self, argv, cwd, stdout, stderr):
+        # Run one job with its output sent to the client, and return its exit code.
+        with self.job_lock:
+            home = os.getcwd()
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                try:
+                    os.chdir(cwd or home)
+                    self.run_job(argv)
+                    code = 0
+                except SystemExit as e:
+                    code = exit_code(e)
+                except Exception:
+                    traceback.print_exc()
+                    code = 1
+                finally:
+                    os.chdir(home)
+            return code
+
+    def server_close(self):
+        super().server_close()
+        with contextlib.suppress(OSError):
+            os.remove(self.socket_file)
+
+
+def remove_stale_socket(socket_file):
+    # Remove a socket file left behind by a daemon that is no longer running.  Refuse to start if one still is.
+    if not os.path.exists(socket_file):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_file)
+    except OSError:
+        os.remove(socket_file)
+    else:
+        raise OSError(f'A template_runner.py daemon is already listening on "{socket_file}".')
+    finally:
+        probe.close()
@@ -0,0 +1,339 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Pushes the template project export files in the "templates" directory to DNA Center, creating, updating and
+# committing only the templates that differ from the controller.  Each template is compared by a hash of the parts
+# that change its output (content, parameters, language, device and software types).
+# The hash and committed version of every template synced are kept in a local SQLite record, so a template whose
+# export and controller version are both unchanged since the last sync costs no API calls at all: an unchanged
+# nightly sync makes one template list call.  Changed templates are pushed concurrently.
+
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from argparse import ArgumentParser
+
+import urllib3
+
+from dnac_client import CACHE_DIR, DEFAULT_REQUEST_TIMEOUT, DEFAULT_TOKEN_CACHE, connect
+from rate_limiter import DEFAULT_RATE, DEFAULT_MAX_RETRIES
+from paginator import PageError, paginate
+from template_cache import template_version
+from template_index import load_bundle, DEFAULT_TEMPLATES_DIR
+
+# Disable insecure connection warnings on destinations with untrusted certificates
+urllib3.disable_warnings()
+
+DEFAULT_SYNC_DB = os.path.join(CACHE_DIR, 'template_sync.db')
+
+# Seconds a sync is expected to run for at most.  Worker threads cannot ask for the password, so it is asked for before
+# the sync starts if the cached auth token expires sooner than this.
+SYNC_TOKEN_LIFE = 15 * 60
+
+# Template fields that change what a template renders to, and so are compared and pushed
+SYNC_FIELDS = ['templateContent', 'language', 'deviceTypes', 'softwareType', 'softwareVariant', 'description', 'tags']
+# Parameter fields that are compared.  DNA Center adds IDs and ordering details of its own to the rest.
+PARAM_FIELDS = ['parameterName', 'dataType', 'defaultValue', 'required', 'notParam', 'paramArray', 'binding', 'selection', 'range']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS synced (
+    server TEXT NOT NULL,
+    project TEXT NOT NULL,
+    name TEXT NOT NULL,
+    template_id TEXT NOT NULL,
+    version TEXT NOT NULL,
+    sync_hash TEXT NOT NULL,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (server, project, name)
+);
+"""
+
+
+def sync_hash(template):
+    # Hash the parts of a template record (from an export file or the API) that decide what it renders to.
+    params = [{x: param.get(x) for x in PARAM_FIELDS} for param in template.get('templateParams') or []]
+    fields = {x: template.get(x) for x in SYNC_FIELDS}
+    fields['templateContent'] = (fields['templateContent'] or '').replace('\r\n', '\n')
+    fields['templateParams'] = sorted(params, key=lambda x: x['parameterName'] or '')
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def local_templates(templates_dir, projects=None):
+    # Read every export file and return the templates keyed by (project, name).  A template found in more than one
+    # export is taken from the most recently changed copy, the same way as the local renderer and template index.
+    templates = {}
+    for bundle_file in sorted(glob.glob(os.path.join(templates_dir, '*.json'))):
+        for template in load_bundle(bundle_file):
+            key = (template['projectName'], template['name'])
+            if projects and key[0] not in projects:
+                continue
+            if key not in templates or (template.get('lastUpdateTime') or 0) >= (templates[key].get('lastUpdateTime') or 0):
+                templates[key] = template
+    return templates
+
+
+class SyncState:
+    # SQLite record of the templates pushed to each DNA Center server.  Safe to share between threads.
+
+    def __init__(self, db_file=DEFAULT_SYNC_DB):
+        if db_file != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(db_file)), mode=0o700, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_file, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock:
+            self.db.executescript(SCHEMA)
+
+    def get(self, server, project, name):
+        with self.lock:
+            row = self.db.execute('SELECT * FROM synced WHERE server = ? AND project = ? AND name = ?',
+                                  (server, project, name)).fetchone()
+        return dict(row) if row else None
+
+    def put(self, server, project, name, template_id, version, hash_value):
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO synced VALUES (?, ?, ?, ?, ?, ?, ?)',
+                            (server, project, name, template_id, version, hash_value, time.time()))
+
+    def close(self):
+        self.db.close()
+
+
+def api_error(action, result):
+    return RuntimeError(f'{action} failed with HTTP {result.status_code}: {result.text[:500]}')
+
+
+def response_json(result, action):
+    # Return the parsed body of a successful API response.  An error status, or a body that is not JSON, raises api_error().
+    if result.status_code not in [200, 201, 202]:
+        raise api_error(action, result)
+    try:
+        return result.json()
+    except ValueError:
+        raise api_error(action, result) from None
+
+
+def wait_for_task(client, result, action, timeout=120):
+    # Wait for the asynchronous task started by a template-programmer API call and return its "data" value.
+    body = response_json(result, action)
+    response = (body.get('response') if isinstance(body, dict) else None) or {}
+    task_id = response.get('taskId')
+    if not task_id:
+        raise api_error(action, result)
+    delay = 0.25
+    give_up = time.monotonic() + timeout
+    while True:
+        body = response_json(client.get(f'/dna/intent/api/v1/task/{task_id}'), f'{action} (checking task {task_id})')
+        task = (body.get('response') if isinstance(body, dict) else None) or {}
+        if task.get('isError'):
+            raise RuntimeError(f'{action} failed: {task.get("failureReason") or task.get("progress")}')
+        if task.get('endTime'):
+            return task.get('data')
+        if time.monotonic() >= give_up:
+            raise RuntimeError(f'{action} did not finish within {timeout} seconds.')
+        time.sleep(delay)
+        delay = min(delay * 2, 5.0)
+
+
+def list_controller_templates(client, projects=None):
+    # Return the controller's templates keyed by (project, name).  The catalog is read in pages, so a catalog that
+    # fits in one page costs one API call, and larger ones are fetched several pages at a time.
+    params = {"unCommitted": True}
+    if projects and len(projects) == 1:
+        params['projectName'] = projects[0]
+    try:
+        return {(x['projectName'], x['name']): x for x in paginate(client, '/dna/intent/api/v2/template-programmer/template', params)}
+    except PageError as e:
+        print(f'Error listing the DNA Center templates.\n{e}\n')
+        sys.exit(1)
+
+
+def project_id(client, project, project_ids, project_lock):
+    # Return the ID of a Template Editor project, creating the project if it does not exist.  "project_ids" caches the
+    # IDs already known, and "project_lock" stops two workers from creating the same project.
+    with project_lock:
+        if project not in project_ids:
+            result = client.get('/dna/intent/api/v1/template-programmer/project', params={"name": project})
+            projects = response_json(result, f'Looking up project "{project}"')
+            projects = projects.get('response', []) if isinstance(projects, dict) else projects
+            match = [x for x in projects if x.get('name') == project]
+            if match:
+                project_ids[project] = match[0]['id']
+            else:
+                result = client.post('/dna/intent/api/v1/template-programmer/project', json={"name": project})
+                project_ids[project] = wait_for_task(client, result, f'Creating project "{project}"')
+        return project_ids[project]
+
+
+def template_body(template, project):
+    # Build the create or update request body for a template from its export record.
+    body = {x: template.get(x) for x in SYNC_FIELDS if template.get(x) is not None}
+    body.update({"name": template['name'], "projectName": project, "templateParams": template.get('templateParams') or [],
+                 "composite": template.get('composite', False)})
+    return body
+
+
+def sync_template(client, args, state, template, remote, project_ids, project_lock):
+    # Create or update one template on the controller and commit it.  Returns the sync result Dictionary.
+    project, name = template['projectName'], template['name']
+    body = template_body(template, project)
+    if remote:
+        action = 'UPDATED'
+        template_id = remote['id']
+        result = client.put('/dna/intent/api/v1/template-programmer/template',
+                            json={**body, "id": template_id, "projectId": remote.get('projectId')})
+        wait_for_task(client, result, f'Updating "{project}/{name}"')
+    else:
+        action = 'CREATED'
+        parent_id = project_id(client, project, project_ids, project_lock)
+        result = client.post(f'/dna/intent/api/v1/template-programmer/project/{parent_id}/template', json=body)
+        template_id = wait_for_task(client, result, f'Creating "{project}/{name}"')
+    result = client.post('/dna/intent/api/v1/template-programmer/template/version',
+                         json={"templateId": template_id, "comments": args.comment})
+    wait_for_task(client, result, f'Committing "{project}/{name}"')
+    # Read back the committed version, so the next sync can tell whether the template was changed on the controller
+    result = client.get('/dna/intent/api/v2/template-programmer/template', params={"name": name, "projectName": project, "unCommitted": True})
+    try:
+        records = response_json(result, f'Reading back "{project}/{name}"').get('response', [])
+    except RuntimeError:
+        # The template is committed either way.  Without its version, the next sync compares it with the controller.
+        records = []
+    version = template_version(records[0]) if records else ''
+    state.put(client.dnac_server, project, name, template_id, version, sync_hash(template))
+    return {"template": f'{project}/{name}', "status": action, "version": version}
+
+
+def compare_template(client, state, template, remote, full=False):
+    # Decide whether one template needs to be pushed.  Returns the reason, or None when it matches the controller.
+    # With "full", the record of earlier syncs is ignored and the template is always read from the controller.
+    project, name = template['projectName'], template['name']
+    local_hash = sync_hash(template)
+    if not remote:
+        return 'new template'
+    version = template_version(remote)
+    synced = None if full else state.get(client.dnac_server, project, name)
+    if synced and synced['template_id'] == remote['id'] and synced['version'] == version:
+        # Nothing has been committed on the controller since our last sync, so only the export can have changed
+        return None if synced['sync_hash'] == local_hash else 'export changed'
+    result = client.get(f'/dna/intent/api/v1/template-programmer/template/{remote["id"]}')
+    if sync_hash(response_json(result, f'Reading "{project}/{name}"')) == local_hash:
+        state.put(client.dnac_server, project, name, remote['id'], version, local_hash)
+        return None
+    return 'differs from the controller'
+
+
+def run_sync(client, args, state, templates):
+    # Compare every template with the controller, then push the changed ones concurrently.  Returns the results.
+    remote_templates = list_controller_templates(client, args.project)
+    project_ids = {x.get('projectName'): x['projectId'] for x in remote_templates.values() if x.get('projectId')}
+    project_lock = threading.Lock()
+    results = []
+    changes = []
+
+    def compare(key):
+        try:
+            return key, compare_template(client, state, templates[key], remote_templates.get(key), args.full), None
+        except Exception as e:
+            return key, None, f'{type(e).__name__}: {e}'
+
+    def push(item):
+        key, reason = item
+        try:
+            result = sync_template(client, args, state, templates[key], remote_templates.get(key), project_ids, project_lock)
+        except Exception as e:
+            result = {"template": '/'.join(key), "status": 'FAILED', "result": f'{type(e).__name__}: {e}'}
+        result['reason'] = reason
+        print(f'{result["template"]}: {result["status"]} ({reason})' + (f' - {result["result"]}' if result.get('result') else ''), flush=True)
+        return result
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for key, reason, error in executor.map(compare, sorted(templates)):
+            if error:
+                print(f'{"/".join(key)}: FAILED - {error}')
+                results.append({"template": '/'.join(key), "status": 'FAILED', "result": error})
+            elif reason:
+                changes.append((key, reason))
+            else:
+                results.append({"template": '/'.join(key), "status": 'UNCHANGED'})
+        if args.dry_run:
+            for key, reason in changes:
+                print(f'{"/".join(key)}: would be {"created" if key not in remote_templates else "updated"} ({reason})')
+                results.append({"template": '/'.join(key), "status": 'PENDING', "reason": reason})
+        else:
+            results.extend(executor.map(push, changes))
+    return results
+
+
+def report_results(results, dry_run):
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    print(f'\n{len(results)} templates: ' + ', '.join(f'{y} {x.lower()}' for x, y in sorted(counts.items())) +
+          (' (dry run - nothing was changed)' if dry_run else '') + '.')
+    if counts.get('FAILED'):
+        sys.exit(1)
+
+
+def parse_args(argv=None):
+    parser = ArgumentParser(description='Push the template project export files to DNA Center, changing only the templates that differ:')
+    parser.add_argument('--username', '-u', type=str, required=True, help="DNAC Username")
+    parser.add_argument('--password', '-p', type=str, help="DNAC Password")
+    parser.add_argument('--dnac_server', type=str, required=True, help="DNAC Server IP")
+    parser.add_argument('--templates_dir', type=str, default=DEFAULT_TEMPLATES_DIR, help="Directory of template project export files (default: the repository's templates directory)")
+    parser.add_argument('--project', type=str, action='append', help="Only sync templates in this Template Editor project (may be repeated)")
+    parser.add_argument('--workers', type=int, default=10, help="Maximum number of templates compared or pushed at once (default: 10)")
+    parser.add_argument('--comment', type=str, default='Synced by sync_templates.py', help="Commit comment for each template version created")
+    parser.add_argument('--dry_run', action='store_true', help="Only report the templates that would be created or updated")
+    parser.add_argument('--full', action='store_true', help="Compare every template with the controller, ignoring the record of earlier syncs")
+    parser.add_argument('--sync_db', type=str, default=DEFAULT_SYNC_DB, help=f"Record of the templates pushed by earlier syncs (default: {DEFAULT_SYNC_DB})")
+    parser.add_argument('--rate_limit', type=float, default=DEFAULT_RATE, help="Maximum API calls per second to each DNAC API endpoint (default: 0, no limit until DNAC starts throttling)")
+    parser.add_argument('--max_retries', type=int, default=DEFAULT_MAX_RETRIES, help=f"Number of times a throttled or failed API call is retried (default: {DEFAULT_MAX_RETRIES})")
+    parser.add_argument('--request_timeout', type=float, default=DEFAULT_REQUEST_TIMEOUT, help=f"Seconds to wait for each DNAC API response before treating the call as failed (default: {DEFAULT_REQUEST_TIMEOUT})")
+    parser.add_argument('--token_cache', type=str, default=DEFAULT_TOKEN_CACHE, help=f"Auth token cache file (default: {DEFAULT_TOKEN_CACHE})")
+    parser.add_argument('--no_token_cache', action='store_true', help="Do not read or save cached auth tokens")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error('--workers must be 1 or greater')
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    templates = local_templates(args.templates_dir, args.project)
+    if not templates:
+        print(f'No templates found in "{args.templates_dir}".\n')
+        sys.exit(1)
+    state = SyncState(args.sync_db)
+    client = connect(args, token_life=SYNC_TOKEN_LIFE)
+    try:
+        results = run_sync(client, args, state, templates)
+    finally:
+        client.close()
+        state.close()
+    report_results(results, args.dry_run)
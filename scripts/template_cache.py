@@ -0,0 +1,128 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Local cache of template lookups, stored in SQLite.  Each (project, template name) pair is stored with the
+# template's UUID, latest version, parameter list and whether it uses System Bind Variables, so repeated runs
+# against the same template do not need to look it up again.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from dnac_client import CACHE_DIR
+
+DEFAULT_TEMPLATE_DB = os.path.join(CACHE_DIR, 'templates.db')
+DEFAULT_TEMPLATE_TTL = 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS templates (
+    server TEXT NOT NULL,
+    project TEXT NOT NULL,
+    name TEXT NOT NULL,
+    id TEXT NOT NULL,
+    version TEXT NOT NULL,
+    params TEXT NOT NULL,
+    bind_variables INTEGER NOT NULL,
+    checked_at REAL NOT NULL,
+    PRIMARY KEY (server, project, name)
+);
+"""
+
+
+def template_version(template):
+    # Return a version marker for a template record from the template-programmer API.
+    # Committed templates list their versions in "versionsInfo"; otherwise the last change time is used.
+    versions = [str(x['version']) for x in template.get('versionsInfo') or [] if x.get('version')]
+    if versions:
+        return max(versions, key=lambda x: int(x) if x.isdigit() else 0)
+    return str(template.get('latestVersionTime') or template.get('lastUpdateTime') or '')
+
+
+def uses_bind_variables(template_params):
+    # Check if a template is using implicit System Bind Variables
+    for param in template_params:
+        if param['parameterName'][0:2] == "__" or param['binding'] != "":
+            return True
+    return False
+
+
+def template_info(template):
+    # Build the cached Dictionary for one template record from the template-programmer API.
+    params = template.get('templateParams') or []
+    return {
+        "id": template['id'],
+        "version": template_version(template),
+        "params": params,
+        "bind_variables": uses_bind_variables(params),
+    }
+
+
+class TemplateCache:
+    # SQLite template lookup cache for one or more DNA Center servers.  Safe to share between threads.
+
+    def __init__(self, db_file=DEFAULT_TEMPLATE_DB, ttl=DEFAULT_TEMPLATE_TTL):
+        if db_file != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(db_file)), mode=0o700, exist_ok=True)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_file, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock:
+            self.db.executescript(SCHEMA)
+
+    def get(self, server, project, name):
+        # Return the cached template Dictionary, with a "stale" key set when it is older than the TTL, or None.
+        with self.lock:
+            row = self.db.execute('SELECT * FROM templates WHERE server = ? AND project = ? AND name = ?',
+                                  (server, project, name)).fetchone()
+        if not row:
+            return None
+        return {
+            "id": row['id'],
+            "version": row['version'],
+            "params": json.loads(row['params']),
+            "bind_variables": bool(row['bind_variables']),
+            "stale": time.time() - row['checked_at'] >= self.ttl,
+        }
+
+    def put(self, server, project, name, info):
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO templates VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                            (server, project, name, info['id'], info['version'], json.dumps(info['params']),
+                             int(info['bind_variables']), time.time()))
+
+    def touch(self, server, project, name):
+        # Mark a cached template as checked just now, when its version has not changed.
+        with self.lock, self.db:
+            self.db.execute('UPDATE templates SET checked_at = ? WHERE server = ? AND project = ? AND name = ?',
+                            (time.time(), server, project, name))
+
+    def invalidate(self, server, template_id):
+        # Forget a template, so that the next run looks it up again.
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM templates WHERE server = ? AND id = ?', (server, template_id))
+
+    def close(self):
+        self.db.close()
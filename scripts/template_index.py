@@ -0,0 +1,288 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Index of the template project export files in the "templates" directory, stored in SQLite.  Each export is
+# parsed once, and only parsed again when its modification time or size changes and its content hash differs.
+# For every template the index records its project, name, version, language, device types and declared
+# "templateParams", and the templates it pulls in with {% include %}, so templates can be looked up, and the
+# templates affected by a change (everything that includes a changed template, directly or not) can be found,
+# without reading the export files.
+
+import glob
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+
+from dnac_client import CACHE_DIR
+from template_cache import template_version
+
+DEFAULT_INDEX_DB = os.path.join(CACHE_DIR, 'template_index.db')
+DEFAULT_TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'templates')
+
+INCLUDE_TAG = re.compile(r'\{%-?\s*include\s+(?:"([^"]+)"|\'([^\']+)\'|([^\s%]+))\s*-?%\}')
+COMMENT_TAG = re.compile(r'\{#.*?#\}', re.DOTALL)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS templates (
+    file TEXT NOT NULL,
+    project TEXT NOT NULL,
+    name TEXT NOT NULL,
+    id TEXT,
+    version TEXT NOT NULL,
+    language TEXT,
+    last_update_time INTEGER NOT NULL,
+    device_types TEXT NOT NULL,
+    params TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    PRIMARY KEY (file, project, name)
+);
+CREATE INDEX IF NOT EXISTS templates_name ON templates (name);
+CREATE TABLE IF NOT EXISTS includes (
+    file TEXT NOT NULL,
+    project TEXT NOT NULL,
+    name TEXT NOT NULL,
+    target_project TEXT NOT NULL,
+    target_name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS includes_target ON includes (target_project, target_name);
+CREATE INDEX IF NOT EXISTS includes_source ON includes (file, project, name);
+-- The same template can appear in more than one export; like the local renderer, the most recently changed copy
+-- is used, and the later file name when they are equally recent.
+CREATE VIEW IF NOT EXISTS current_templates AS
+    SELECT * FROM templates t WHERE NOT EXISTS (
+        SELECT 1 FROM templates o WHERE o.project = t.project AND o.name = t.name
+        AND (o.last_update_time > t.last_update_time OR (o.last_update_time = t.last_update_time AND o.file > t.file)));
+"""
+
+
+def load_bundle(bundle_file):
+    # Read one template export file and return a List of its template records.  Project exports hold a List
+    # of projects, each with a "templates" List; single template exports hold the template record itself.
+    with open(bundle_file, 'rt') as f:
+        data = json.load(f)
+    projects = data if isinstance(data, list) else [data]
+    templates = []
+    for project in projects:
+        if 'templates' in project:
+            for template in project['templates']:
+                templates.append({**template, "projectName": template.get('projectName') or project['name']})
+        else:
+            templates.append({**project, "projectName": project.get('projectName') or project['name']})
+    return templates
+
+
+def template_includes(project, content):
+    # Return the (project, name) Tuples of the templates included by a template's content, in order.
+    # An include without a project name refers to a template in the same project.
+    includes = []
+    for match in INCLUDE_TAG.finditer(COMMENT_TAG.sub('', content or '')):
+        target = next(x for x in match.groups() if x)
+        target_project, _, target_name = target.rpartition('/')
+        if (target_project or project, target_name) not in includes:
+            includes.append((target_project or project, target_name))
+    return includes
+
+
+def split_name(name):
+    # Split "Project/Template" into (project, name).  A bare template name gives a project of None.
+    project, _, name = name.rpartition('/')
+    return project or None, name
+
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class TemplateIndex:
+    # SQLite index of the template export files in one or more directories.  Safe to share between threads.
+
+    def __init__(self, db_file=DEFAULT_INDEX_DB):
+        if db_file != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(db_file)), mode=0o700, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_file, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock:
+            self.db.executescript(SCHEMA)
+
+    def snapshot(self):
+        # Return "Project/Template" -> (content hash, version) for the current copy of every indexed template.
+        rows = self.db.execute('SELECT project, name, content_hash, version FROM current_templates').fetchall()
+        return {f'{x["project"]}/{x["name"]}': (x['content_hash'], x['version']) for x in rows}
+
+    def index_file(self, path, stat, sha256):
+        # Replace everything indexed from one export file.  Callers must hold self.lock and a transaction.
+        self.db.execute('DELETE FROM templates WHERE file = ?', (path,))
+        self.db.execute('DELETE FROM includes WHERE file = ?', (path,))
+        for template in load_bundle(path):
+            project = template['projectName']
+            content = template.get('templateContent') or ''
+            params = template.get('templateParams') or []
+            self.db.execute('INSERT OR REPLACE INTO templates VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                            (path, project, template['name'],
+                             template.get('id') or (template.get('validationErrors') or {}).get('templateId'),
+                             template_version(template), template.get('language'), template.get('lastUpdateTime') or 0,
+                             json.dumps(template.get('deviceTypes') or []), json.dumps(params),
+                             hashlib.sha256(content.encode()).hexdigest()))
+            self.db.executemany('INSERT INTO includes VALUES (?, ?, ?, ?, ?)',
+                                [(path, project, template['name'], x, y) for x, y in template_includes(project, content)])
+        self.db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)', (path, stat.st_mtime, stat.st_size, sha256, time.time()))
+
+    def update(self, templates_dir=DEFAULT_TEMPLATES_DIR):
+        # Bring the index up to date with the "*.json" exports in "templates_dir".  Files whose modification time
+        # and size are unchanged are not read at all, and files whose content hash is unchanged are not parsed.
+        # Returns a Dictionary with the number of files "parsed", and the "added", "changed" and "removed" templates.
+        templates_dir = os.path.abspath(templates_dir)
+        paths = sorted(glob.glob(os.path.join(templates_dir, '*.json')))
+        parsed = 0
+        with self.lock, self.db:
+            before = self.snapshot()
+            known = {x['path']: x for x in self.db.execute('SELECT * FROM files WHERE path LIKE ?', (os.path.join(templates_dir, '%'),))}
+            for path in set(known) - set(paths):
+                if os.path.dirname(path) == templates_dir:
+                    self.db.execute('DELETE FROM files WHERE path = ?', (path,))
+                    self.db.execute('DELETE FROM templates WHERE file = ?', (path,))
+                    self.db.execute('DELETE FROM includes WHERE file = ?', (path,))
+            for path in paths:
+                stat = os.stat(path)
+                row = known.get(path)
+                if row and row['mtime'] == stat.st_mtime and row['size'] == stat.st_size:
+                    continue
+                sha256 = file_hash(path)
+                if row and row['sha256'] == sha256:
+                    self.db.execute('UPDATE files SET mtime = ?, size = ? WHERE path = ?', (stat.st_mtime, stat.st_size, path))
+                    continue
+                self.index_file(path, stat, sha256)
+                parsed += 1
+            after = self.snapshot()
+        return {
+            "parsed": parsed,
+            "added": sorted(set(after) - set(before)),
+            "changed": sorted(x for x in set(after) & set(before) if after[x] != before[x]),
+            "removed": sorted(set(before) - set(after)),
+        }
+
+    def find(self, name):
+        # Return the records of the templates matching "Project/Template" or a bare template name.
+        project, name = split_name(name)
+        with self.lock:
+            if project:
+                rows = self.db.execute('SELECT * FROM current_templates WHERE project = ? AND name = ?', (project, name)).fetchall()
+            else:
+                rows = self.db.execute('SELECT * FROM current_templates WHERE name = ?', (name,)).fetchall()
+            records = []
+            for row in rows:
+                record = {x: row[x] for x in ['project', 'name', 'id', 'version', 'language', 'file']}
+                record['device_types'] = json.loads(row['device_types'])
+                record['params'] = json.loads(row['params'])
+                record['includes'] = [f'{x["target_project"]}/{x["target_name"]}' for x in self.db.execute(
+                    'SELECT target_project, target_name FROM includes WHERE file = ? AND project = ? AND name = ?',
+                    (row['file'], row['project'], row['name']))]
+                records.append(record)
+        return sorted(records, key=lambda x: (x['project'], x['name']))
+
+    def includers(self, name):
+        # Return the "Project/Template" names of the templates that include the named template directly.
+        project, name = split_name(name)
+        query = ('SELECT DISTINCT i.project, i.name FROM includes i JOIN current_templates c '
+                 'ON c.file = i.file AND c.project = i.project AND c.name = i.name WHERE i.target_name = ?')
+        params = (name,)
+        if project:
+            query += ' AND i.target_project = ?'
+            params += (project,)
+        with self.lock:
+            rows = self.db.execute(query, params).fetchall()
+        return sorted(f'{x["project"]}/{x["name"]}' for x in rows)
+
+    def dependents(self, names):
+        # Return every template that includes any of "names", directly or through other includes.
+        found = set()
+        pending = list(names)
+        while pending:
+            for includer in self.includers(pending.pop()):
+                if includer not in found:
+                    found.add(includer)
+                    pending.append(includer)
+        return sorted(found)
+
+    def affected(self, names):
+        # Return the templates whose output may change when "names" change: the templates themselves and their dependents.
+        return sorted(set(names) | set(self.dependents(names)))
+
+    def close(self):
+        self.db.close()
+
+
+def print_template(record):
+    print(f'{record["project"]}/{record["name"]}')
+    print(f'    id: {record["id"]}')
+    print(f'    version: {record["version"]}')
+    print(f'    language: {record["language"]}')
+    print(f'    device types: {", ".join(x.get("productFamily", "") for x in record["device_types"]) or "(any)"}')
+    print(f'    parameters: {", ".join(x["parameterName"] for x in record["params"]) or "(none)"}')
+    print(f'    includes: {", ".join(record["includes"]) or "(none)"}')
+    print(f'    file: {record["file"]}\n')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Index the template project export files and query the index:')
+    parser.add_argument('--templates_dir', type=str, default=DEFAULT_TEMPLATES_DIR, help="Directory of template project export files (default: the repository's templates directory)")
+    parser.add_argument('--index_db', type=str, default=DEFAULT_INDEX_DB, help=f"Template index database (default: {DEFAULT_INDEX_DB})")
+    parser.add_argument('--find', type=str, help='Show the indexed details of a template ("Project/Template" or just "Template")')
+    parser.add_argument('--included_by', type=str, help="List the templates that include this template, directly or indirectly")
+    parser.add_argument('--affected', action='store_true', help="List the templates changed since the last update, together with every template that includes them")
+    args = parser.parse_args()
+
+    index = TemplateIndex(args.index_db)
+    changes = index.update(args.templates_dir)
+    changed = changes['added'] + changes['changed'] + changes['removed']
+    print(f'Template index updated: {changes["parsed"]} files parsed, {len(changes["added"])} templates added, '
+          f'{len(changes["changed"])} changed, {len(changes["removed"])} removed.\n')
+    if args.find:
+        records = index.find(args.find)
+        if not records:
+            print(f'Template "{args.find}" was not found in the template export files.\n')
+            sys.exit(1)
+        for record in records:
+            print_template(record)
+    if args.included_by:
+        for name in index.dependents([args.included_by]):
+            print(name)
+    if args.affected:
+        for name in index.affected(changed):
+            print(name)
+    index.close()
@@ -21,158 +21,262 @@ __contributors__ = ""
 __copyright__ = "Copyright (c) 2023 Cisco and/or its affiliates."
 __license__ = "Cisco Sample Code License, Version 1.1"
 
-import csv
+import contextlib
+import cProfile
 import json
+import os
+import pstats
+import signal
+import sqlite3
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from functools import partial
+from itertools import takewhile
 from getpass import getpass
-from argparse import ArgumentParser
+from argparse import ArgumentParser, Namespace
 
-import requests
-from requests.auth import HTTPBasicAuth
 import urllib3
 
+import deployment_poller
+from dnac_client import PasswordRequired, DEFAULT_REQUEST_TIMEOUT, DEFAULT_TOKEN_CACHE, connect
+from template_cache import TemplateCache, DEFAULT_TEMPLATE_DB, DEFAULT_TEMPLATE_TTL, template_info, template_version
+from inventory_store import InventoryStore, DEFAULT_INVENTORY_DB, DEFAULT_INVENTORY_TTL, PAGE_SIZE, device_record
+from metrics import Metrics
+from rate_limiter import DEFAULT_RATE, DEFAULT_MAX_RETRIES
+from deploy_journal import DeployJournal, JournalError, FINISHED_STATES, IN_FLIGHT_STATES, ROLLBACK_PREFIX
+from deploy_state import DeployState, DEFAULT_DEPLOY_DB, config_hash
+from batch_preview import RenderCache, params_hash, render_key, write_preview_dir
+from runner_daemon import RunnerDaemon, DEFAULT_SOCKET
+from input_loaders import InputFormatError, detect_format, iter_records, load_input
+from event_receiver import EventReceiver, is_loopback, parse_listen
+from rollout_waves import CircuitBreaker, GOOD_STATES, plan_waves
+from paginator import PageError, paginate
+from cluster_map import ClusterMapError, cluster_args, load_cluster_map, pattern_cluster
+
 # Disable insecure connection warnings on destinations with untrusted certificates
 urllib3.disable_warnings()
 
 # Set global level variable for verbosity
 verbose = bool()
-bind_variables = False
 
-def verbose_output(func_name, response):
-    # Print verbose API response data to Console
-    print(f'{func_name} Response:\n{response.status_code}\n{response.headers}\n{response.json()}\n')
+# Timing instrumentation (metrics.Metrics), set when --metrics_file or --prometheus_file is used
+metrics = None
+
+# Checkpoint journal (deploy_journal.DeployJournal), set when --journal is used
+journal = None
+
+# Record of the configuration last deployed to each device (deploy_state.DeployState), set when --skip_unchanged or --changed_only is used
+deploy_state = None
+
+# Shared renders for previews of several devices (batch_preview.RenderCache)
+render_cache = None
+
+# Local template renderer (local_renderer.LocalRenderer), set when --local_preview or "--hash_source local" is used
+renderer = None
+
+# Listener for DNA Center deployment events (event_receiver.EventReceiver), set when --event_listen is used
+event_receiver = None
+
+# Options that change how the API client is set up.  The --serve daemon keeps one client for each combination.
+CLIENT_OPTIONS = ['workers', 'rate_limit', 'max_retries', 'request_timeout', 'token_cache', 'no_token_cache', 'inventory_db',
+                  'inventory_ttl', 'no_inventory', 'template_cache', 'template_ttl', 'no_template_cache']
+
+# Template project export files included with this repository
+DEFAULT_TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'templates')
+
+def verbose_output(func_name, response, body=None):
+    # Print verbose API response data to Console.  "body" is the response's already parsed JSON, when there is one.
+    print(f'{func_name} Response:\n{response.status_code}\n{response.headers}\n{response.json() if body is None else body}\n')
     return
 
 
-def auth(args):
-    # Authenticate to DNA Center API and return the access token.  Tokens are valid for 60 minutes.
-    if args.password:
-        password = args.password
-    else:
-        password = getpass("Enter the DNAC Password: ", stream=None)
-    credentials = HTTPBasicAuth(args.username, password)
-    url = f'https://{args.dnac_server}/api/system/v1/auth/token'
-    result = requests.post(url, auth=credentials, verify=False)
+def response_body(func_name, result, success=(200, 201, 202)):
+    # Parse the JSON body of a successful API response exactly once, printing it first with --verbose.
+    # Returns None for an unsuccessful response, whose body is only parsed if it is being printed.
+    body = result.json() if result.status_code in success else None
     if verbose:
-        verbose_output('auth()', result)
-    if result.status_code == 200:
-        return result.json()['Token']
-    else:
-        print('Error during authentication.\n')
-        sys.exit(1)
+        verbose_output(func_name, result, body)
+    return body
 
 
-def parse_csv(csv_file):
-    # Use Python built-in csv module to parse a CSV file, using the simplest method. 
-    # Creates a Dictionary for each CSV row (headers become Keys), and appends to a List.
-    csv_data = []
-    with open(csv_file, 'rt') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if 'additional_config' in row.keys():
-                row['additional_config'] = row['additional_config'].replace('\\n', '\n') # Fix up the escaped backslash problem
-            csv_data.append(row)
-        f.close()
-    if verbose:
-        print(f'CSV Data:\n{json.dumps(csv_data, indent=4)}\n')
-    return csv_data
+def phase(name, **details):
+    # Time a phase of the run when metrics are being collected, e.g. "with phase('deploy', device=device_name):"
+    return metrics.phase(name, **details) if metrics else contextlib.nullcontext()
 
 
-def parse_txt(txt_file):
-    # Reads input text file and creates a string
-    with open(txt_file, 'rt') as f:
-        txt_data = f.read()
-        f.close()
-    if verbose:
-        print(f'TXT Data:\n{txt_data}\n')
-    return txt_data
+def journal_device(device_result, state=None):
+    # Record a device's current state in the checkpoint journal, when one is being kept.  The states of a rollback
+    # deployment are prefixed with ROLLBACK_, so a resumed rollout never takes them for the rollout's own deployment.
+    if journal:
+        state = state or device_result['status']
+        if device_result.get('rollback_deploy'):
+            state = ROLLBACK_PREFIX + state
+        journal.record(device_result['device_name'], state,
+                       device_id=device_result['device_id'], deploy_id=device_result['deploy_id'])
 
 
-def parse_yaml(yaml_file):
-    # Use PyYAML package from PyPi to parse a YAML file into JSON
-    # Only import PyYAML if needed
-    import yaml # Packaged named "PyYAML" at pypi.org
-    with open(yaml_file, 'r') as f:
-        try:
-            result = yaml.safe_load(f)
-        except yaml.YAMLError as e:
-            print(f'Error parsing YAML file:\n{e}')
-            sys.exit(1)
-    f.close()
-    if args.verbose:
-        print(f'YAML Data:\n{json.dumps(result, indent=4)}\n')
-    return result
+def auth(args):
+    # Create the shared DNA Center API client and make sure it holds a valid access token (see dnac_client.connect()).
+    # Tokens are valid for 60 minutes; the password is asked for up front if the cached token may run out during the run.
+    on_response = partial(verbose_output, 'auth()') if verbose else None
+    return connect(args, metrics, args.timeout or args.deploy_timeout, on_response)
 
 
-def get_template_uuid(token, dnac_server, projectName, template_name):
-    global bind_variables
+def stream_input_devices(input_file, device_column):
+    # Read a CSV or NDJSON input file one record at a time and yield a (device name, input_data) Tuple for each device,
+    # where input_data is the List of that device's records.  Only one device's records are held in memory at a time, so
+    # the records for each device must be next to each other in the file (e.g. sorted by the device column).
+    seen = set()
+    device_name = None
+    device_rows = []
+    try:
+        for record_num, row in enumerate(iter_records(input_file), 1):
+            if not isinstance(row, dict) or device_column not in row:
+                print(f'Record {record_num} of input file "{input_file}" does not have a "{device_column}" field.\n')
+                sys.exit(1)
+            if row[device_column] != device_name:
+                if device_rows:
+                    yield device_name, device_rows
+                device_name = row[device_column]
+                device_rows = []
+                if device_name in seen:
+                    print(f'Records for device "{device_name}" are not grouped together (record {record_num}).  Sort the file by the "{device_column}" field.\n')
+                    sys.exit(1)
+                seen.add(device_name)
+            device_rows.append(row)
+    except (InputFormatError, OSError) as e:
+        print(f'{e}\n')
+        sys.exit(1)
+    if device_rows:
+        yield device_name, device_rows
+
+
+def parse_devices_file(devices_file):
+    # Reads a text file of target device hostnames, one per line, and returns a List.
+    # Blank lines and lines beginning with "#" are ignored, and duplicate hostnames are only returned once.
+    device_names = []
+    with open(devices_file, 'rt') as f:
+        for line in f:
+            name = line.strip()
+            if name and not name.startswith('#') and name not in device_names:
+                device_names.append(name)
+    if verbose:
+        print(f'Device List:\n{json.dumps(device_names, indent=4)}\n')
+    return device_names
+
+
+def get_template_info(client, projectName, template_name, refresh=False):
+    # Resolve a template name to a Dictionary holding its UUID, latest version, parameters and whether it uses
+    # System Bind Variables.  Results are kept in the local template cache, so repeated runs make no lookup call.
+    # Once a cached entry is older than the cache TTL (or "refresh" is set) it is looked up again, and only replaced
+    # if the template's version has changed.
+    cache = client.template_cache
+    cached = cache.get(client.dnac_server, projectName, template_name) if cache else None
+    if cached and not cached['stale'] and not refresh:
+        return cached
     # Make API call to DNAC to resolve template name to UUID
-    url = f'https://{dnac_server}/dna/intent/api/v2/template-programmer/template'
-    headers = {
-        "Content-Type": "application/json",
-        "x-auth-token": token
-    }
+    path = '/dna/intent/api/v2/template-programmer/template'
     params = {
         "name": template_name,
         "projectName": projectName,
         "unCommitted": True
     }
-    result = requests.get(url, headers=headers, params=params, verify=False)
-    if verbose:
-        verbose_output('get_template_uuid()', result)
-    if result.status_code in [200, 201, 202] and len(result.json()['response']) > 0:
-        # Check if this template is using implicit System Bind Variables
-        if len(result.json()['response'][0]['templateParams']) > 0:
-            for param in result.json()['response'][0]['templateParams']:
-                if param['parameterName'][0:2] == "__" or param['binding'] != "":
-                    bind_variables = True
-        # Returns only the first search result - this could be a problem if multiple matches are found.
-        return result.json()['response'][0]['id']
+    result = client.get(path, params=params)
+    body = response_body('get_template_uuid()', result)
+    templates = body.get('response', []) if body else []
+    if len(templates) > 0:
+        # Uses only the first search result - this could be a problem if multiple matches are found.
+        if cached and cached['id'] == templates[0]['id'] and cached['version'] == template_version(templates[0]):
+            cache.touch(client.dnac_server, projectName, template_name)
+            return cached
+        info = template_info(templates[0])
+        if cache:
+            cache.put(client.dnac_server, projectName, template_name, info)
+        return info
     else:
         print('Error locating template UUID.\n')
-        print(f'Response: {result.json()}')
+        print(f'Response: {result.text}')
+        sys.exit(1)
+
+
+def lookup_template(client, args):
+    # Look up the template being deployed.  --changed_only compares the template version with each device's last
+    # deployment, so it always checks DNAC for the latest version instead of trusting the cached lookup.
+    return get_template_info(client, args.template_project, args.template_name, args.refresh_templates or args.changed_only)
+
+
+def get_template_uuid(client, projectName, template_name):
+    # Resolve a template name to its UUID.
+    return get_template_info(client, projectName, template_name)['id']
+
+
+def forget_template(client, template_id):
+    # Drop a template from the local cache after an API error, in case the error was caused by stale cached details.
+    if client.template_cache:
+        client.template_cache.invalidate(client.dnac_server, template_id)
+
+
+def sync_inventory(client, inventory):
+    # Download the complete device inventory from DNAC, one page at a time, and store it in the local inventory database.
+    # Pages are fetched ahead of time on background threads, and only the stored fields of each device are kept.
+    on_page = partial(verbose_output, 'sync_inventory()') if verbose else None
+    devices = paginate(client, '/dna/intent/api/v1/network-device', page_size=PAGE_SIZE, on_page=on_page)
+    try:
+        count = inventory.replace_devices(client.dnac_server, (device_record(x) for x in devices))
+    except PageError as e:
+        print(f'Error downloading device inventory.\n{e}\n')
         sys.exit(1)
+    print(f'Device inventory synchronized: {count} devices.\n')
+    return count
 
 
-def get_device_uuid(token, dnac_server, device_name):
+def get_device_uuid(client, device_name, prefix=False):
+    # Resolve hostname to UUID, using the local device inventory when it has been synchronized recently.
+    # With "prefix" set, the inventory also matches hostnames that start with "device_name" (e.g. "switch1.example.com").
+    # A name matching more than one device is treated as an error rather than guessing which device was meant.
+    if client.inventory and client.inventory.is_fresh(client.dnac_server):
+        matches = client.inventory.lookup(client.dnac_server, device_name, prefix)
+        if len(matches) == 1:
+            return matches[0]['id']
+        if len(matches) > 1:
+            print(f'Device name "{device_name}" matches more than one device: {", ".join(x["hostname"] for x in matches)}\n')
+            sys.exit(1)
+        # Not found locally - the device may have been added since the last sync, so ask DNAC directly.
     # Make API call to DNAC to resolve hostname to UUID
-    url = f'https://{dnac_server}/dna/intent/api/v1/network-device'
-    headers = {
-        "Content-Type": "application/json",
-        "x-auth-token": token
-    }
+    path = '/dna/intent/api/v1/network-device'
     params = {
         "hostname": device_name
     }
-    result = requests.get(url, headers=headers, params=params, verify=False)
-    if verbose:
-        verbose_output('get_device_uuid()', result)
-    if result.status_code in [200, 201, 202]:
-        # Returns only the first search result - this could be a problem if multiple matches are found.
-        try:
-            device_id = result.json()['response'][0]['id']
-        except IndexError as e:
-            print(f'Function "get_device_uuid()" did not return any results.\n{e}')
+    result = client.get(path, params=params)
+    body = response_body('get_device_uuid()', result)
+    if body is not None:
+        devices = body['response']
+        if len(devices) == 0:
+            print(f'Function "get_device_uuid()" did not return any results for "{device_name}".\n')
             sys.exit(1)
-        return device_id
+        if len(devices) > 1:
+            devices = [x for x in devices if (x.get('hostname') or '').lower() == device_name.lower()]
+            if len(devices) != 1:
+                print(f'Device name "{device_name}" matches more than one device.\n')
+                sys.exit(1)
+        return devices[0]['id']
     else:
-        print('Error locating template UUID.\n')
+        print('Error locating device UUID.\n')
         sys.exit(1)
 
 
-def preview_template(token, dnac_server, template_id, device_id, input_data):
+def preview_template(client, template_id, device_id, input_data, bind_variables=False):
     # Send payload to Preview Template API and obtain the resulting configuration output.  DOES NOT DEPLOY.
-    url = f'https://{dnac_server}/dna/intent/api/v1/template-programmer/template/preview'
-    headers = {
-        "Content-Type": "application/json",
-        "x-auth-token": token
-    }
+    path = '/dna/intent/api/v1/template-programmer/template/preview'
     if bind_variables:
         payload = {
             "deviceId": device_id,
             "templateId": template_id,
-            "params": {},
+            "params": {
+                "input_data": input_data
+            },
             "resourceParams": [
                 {
                     "type": "MANAGED_DEVICE_UUID",
@@ -185,26 +289,24 @@ def preview_template(token, dnac_server, template_id, device_id, input_data):
         payload = {
             "deviceId": device_id,
             "templateId": template_id,
-            "params": {},
+            "params": {
+                "input_data": input_data
+            }
         }
-    result = requests.put(url, headers=headers, json=payload, verify=False)
-    if verbose:
-        verbose_output('preview_template()', result)
-    if result.status_code in [200, 201, 202]:
-        return result.json()['cliPreview']
+    result = client.put(path, json=payload)
+    body = response_body('preview_template()', result)
+    if body is not None:
+        return body['cliPreview']
     else:
         print('Error in template preview.\n')
+        forget_template(client, template_id)
         sys.exit(1)
 
 
-def deploy_template(token, dnac_server, template_id, device_id, input_data):
+def deploy_template(client, template_id, device_id, input_data, bind_variables=False):
     # Construct the API payload and deploy it to the target device.
     # Using V1 of this API endpoint; V2 adds an extra step of returning a Task ID - no real benefit
-    url = f'https://{dnac_server}/dna/intent/api/v1/template-programmer/template/deploy'
-    headers = {
-        "Content-Type": "application/json",
-        "x-auth-token": token
-    }
+    path = '/dna/intent/api/v1/template-programmer/template/deploy'
     if bind_variables:
         payload = {
             "forcePushTemplate": True,
@@ -240,88 +342,1070 @@ def deploy_template(token, dnac_server, template_id, device_id, input_data):
                 }
             ]
         }
-    result = requests.post(url, headers=headers, data=json.dumps(payload), verify=False)
-    if verbose:
-        verbose_output('deploy_template()', result)
-    if result.status_code in [201, 202]:
+    result = client.post(path, data=json.dumps(payload))
+    body = response_body('deploy_template()', result, success=(201, 202))
+    if body is not None:
         # DNA Center returns a poorly formatted response - we have to slice a string to obtain Deployment ID.
-        deploy_data = [x.strip() for x in result.json()['deploymentId'].split(':')]
+        deploy_data = [x.strip() for x in body['deploymentId'].split(':')]
         deploy_id = deploy_data[len(deploy_data)-1]
         print(f'Deployment ID: {deploy_id}\n')
         return deploy_id
     else:
         print('Error in template deployment.\n')
+        forget_template(client, template_id)
         sys.exit(1)
 
 
-def check_deployment(dnac_server, token, deploy_id):
-    # Check the status of the template deployment every 10 seconds until a proper response is received.
-    url = f'https://{dnac_server}/dna/intent/api/v1/template-programmer/template/deploy/status/{deploy_id}'
-    headers = {
-        "Content-Type": "application/json",
-        "x-auth-token": token
+def deploy_template_batch(client, template_id, targets, bind_variables=False):
+    # Deploy the template to several devices with a single API call, using one "targetInfo" entry per device.
+    # Each entry in "targets" is a Dictionary containing the "device_id" and "input_data" for one device.
+    # DNA Center returns a single Deployment ID for the whole batch.
+    path = '/dna/intent/api/v1/template-programmer/template/deploy'
+    target_info = []
+    for target in targets:
+        target_entry = {
+            "id": target['device_id'],
+            "type": "MANAGED_DEVICE_UUID",
+            "params": {
+                "input_data": target['input_data']
+            }
+        }
+        if bind_variables:
+            target_entry['resourceParams'] = [
+                {
+                    "type": "MANAGED_DEVICE_UUID",
+                    "scope": "RUNTIME",
+                    "value": target['device_id']
+                }
+            ]
+        target_info.append(target_entry)
+    payload = {
+        "forcePushTemplate": True,
+        "templateId": template_id,
+        "targetInfo": target_info
     }
-    while True:
-        result = requests.get(url, headers=headers, verify=False)
-        if verbose:
-            verbose_output('check_deployment()', result)
-        if result.status_code in [201, 202, 204]:
-            try:
-                status = result.json()['status']
-            except KeyError:
-                print('Waiting 10 seconds...')
-                time.sleep(10)
-                continue
-            if status in ['SUCCESS', 'FAILURE']:
-                # print('Deployment status:\n')
-                # print(json.dumps(result.json(), indent=4))
-                break
-            else:
-                print('Waiting 10 seconds...')
-                time.sleep(10)
-                continue
+    result = client.post(path, data=json.dumps(payload))
+    body = response_body('deploy_template_batch()', result, success=(201, 202))
+    if body is not None:
+        # DNA Center returns a poorly formatted response - we have to slice a string to obtain Deployment ID.
+        deploy_data = [x.strip() for x in body['deploymentId'].split(':')]
+        deploy_id = deploy_data[len(deploy_data)-1]
+        print(f'Deployment ID: {deploy_id} ({len(targets)} devices)\n')
+        return deploy_id
+    else:
+        print('Error in template batch deployment.\n')
+        forget_template(client, template_id)
+        sys.exit(1)
+
+
+def get_deployment_status(client, deploy_id):
+    # Make a single deployment status API call, with verbose output if requested, and return its parsed body
+    # (None if the call did not succeed).
+    result = client.get(f'/dna/intent/api/v1/template-programmer/template/deploy/status/{deploy_id}')
+    return response_body('check_deployment()', result)
+
+
+def event_options():
+    # Extra poll_deployments() options that resolve deployments from their events, when --event_listen is used.
+    if not event_receiver:
+        return {}
+    return {"events": event_receiver, "event_timeout": event_receiver.event_timeout}
+
+
+def check_deployment(client, deploy_id, deploy_timeout=None, deadline=None):
+    # Check the status of the template deployment until SUCCESS or FAILURE is returned.
+    # Checks start at half a second apart and back off to a maximum of 10 seconds, and the deployment is
+    # reported as "TIMEOUT" if it has not finished after "deploy_timeout" seconds, or once the overall
+    # "deadline" (--timeout) has passed, the same as when several devices are deployed.
+    fetch_status = lambda x: get_deployment_status(client, x)
+    return deployment_poller.wait_for_deployment(fetch_status, deploy_id, deploy_timeout=deploy_timeout, deadline=deadline,
+                                                 **event_options())
+
+
+def parse_input_file(input_file):
+    # Read the whole input file, in the format detected from its content or extension (see input_loaders.py)
+    try:
+        input_format = detect_format(input_file)
+        input_data = load_input(input_file, input_format)
+    except (InputFormatError, OSError) as e:
+        print(f'{e}\n')
+        sys.exit(1)
+    if verbose:
+        print(f'{input_format.upper()} Data:\n{input_data if input_format == "txt" else json.dumps(input_data, indent=4)}\n')
+    return input_data
+
+
+def preview_device(client, template, device_id, input_data):
+    # Preview the template for one device.  When several devices are previewed, devices that would render identically
+    # (same template version and input data, and the same device for templates using System Bind Variables) share one call.
+    render = partial(preview_template, client, template['id'], device_id, input_data, template['bind_variables'])
+    if render_cache is None:
+        return render()
+    key = render_key(f'{template["id"]}:{template["version"]}', input_data, device_id if template['bind_variables'] else None)
+    return render_cache.get(key, render)
+
+
+def render_local(args, input_data, device):
+    # Render the template locally for one device, sharing identical renders the same way as preview_device().
+    render = partial(renderer.render, args.template_project, args.template_name, {"input_data": input_data}, device)
+    if render_cache is None:
+        return render()
+    uses_device = renderer.uses_device(args.template_project, args.template_name)
+    key = render_key(renderer.source_hash(args.template_project, args.template_name), input_data, device if uses_device else None)
+    return render_cache.get(key, render)
+
+
+def rendered_config_hash(client, args, template, device_name, device_id, input_data):
+    # Render the template for one device, with the Preview API or with the local renderer ("args.hash_source"),
+    # and return a (hash source, hash) Tuple for the resulting configuration.  If the local renderer cannot render
+    # the template (e.g. it uses a Jinjava feature that is not emulated), the Preview API is used instead, and the
+    # hash is compared and saved as a "preview" hash.
+    if args.hash_source == 'local':
+        device = device_context(client.inventory, args.dnac_server, device_name)
+        try:
+            return 'local', config_hash(renderer.render(args.template_project, args.template_name, {"input_data": input_data}, device))
+        except Exception as e:
+            print(f'{device_name}: unable to render the template locally ({type(e).__name__}: {e}) - using the Preview API instead.')
+    return 'preview', config_hash(preview_template(client, template['id'], device_id, input_data, template['bind_variables']))
+
+
+def is_unchanged(client, args, template, device_result, input_data):
+    # Hash the device's rendered configuration into device_result['config_hash'] (and where the hash came from into
+    # device_result['hash_source']), and return True if it matches the hash saved by the last successful deployment
+    # of this template to the device.
+    with phase('config_hash', device=device_result['device_name']):
+        device_result['hash_source'], device_result['config_hash'] = rendered_config_hash(
+            client, args, template, device_result['device_name'], device_result['device_id'], input_data)
+    deployed_hash = deploy_state.get(client.dnac_server, device_result['device_id'], template['id'], device_result['hash_source'])
+    return device_result['config_hash'] == deployed_hash
+
+
+def save_deploy_state(client, args, template, device_result):
+    # Save the configuration hash and input data hash of a device that was deployed successfully, for the next
+    # --skip_unchanged or --changed_only run.
+    if not deploy_state or device_result['status'] not in ['SUCCESS', 'UNCHANGED']:
+        return
+    if device_result.get('config_hash'):
+        deploy_state.put(client.dnac_server, device_result['device_id'], template['id'], device_result['hash_source'], device_result['config_hash'])
+    if device_result.get('input_hash'):
+        deploy_state.put_input(client.dnac_server, template['id'], device_result['device_name'], device_result['input_hash'], template['version'])
+
+
+def bounded_map(executor, func, items, limit):
+    # Run "func" on each of "items" in the worker pool and yield the results as they complete.  Only "limit" items
+    # are read ahead of the results, so a very large (or streamed) list of items is never all held in memory.
+    pending = set()
+    for item in items:
+        pending.add(executor.submit(func, *item))
+        if len(pending) >= limit:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    for future in as_completed(pending):
+        yield future.result()
+
+
+def run_device(client, args, template, device_name, input_data):
+    # Run the resolve -> deploy (or preview) sequence for a single device.  Deployment status is
+    # checked afterwards for all devices at once, by "wait_for_devices()".
+    # The helper functions call sys.exit() on errors, so SystemExit is caught here to keep one
+    # failed device from stopping the rest of the worker pool.
+    device_result = {"device_name": device_name, "device_id": None, "deploy_id": None, "status": "ERROR", "result": None}
+    if getattr(args, 'rollback_deploy', False):
+        device_result['rollback_deploy'] = True
+    try:
+        with phase('device_lookup', device=device_name):
+            device_result['device_id'] = get_device_uuid(client, device_name, args.prefix_match)
+        journal_device(device_result, 'RESOLVED')
+        if args.skip_unchanged and is_unchanged(client, args, template, device_result, input_data):
+            device_result['status'] = 'UNCHANGED'
+            device_result['result'] = 'Rendered configuration is unchanged since the last successful deployment - not deployed.'
+        elif args.preview:
+            with phase('preview', device=device_name):
+                device_result['result'] = preview_device(client, template, device_result['device_id'], input_data)
+            device_result['status'] = 'PREVIEW'
+        elif args.batch_size:
+            # Keep the input data until the device's batch is deployed
+            device_result['input_data'] = input_data
+            device_result['status'] = 'RESOLVED'
+        else:
+            with phase('deploy', device=device_name):
+                device_result['deploy_id'] = deploy_template(client, template['id'], device_result['device_id'], input_data, template['bind_variables'])
+            device_result['status'] = 'DEPLOYING'
+            journal_device(device_result, 'SUBMITTED')
+    except SystemExit:
+        device_result['result'] = 'Processing stopped for this device - see the error output above.'
+    except Exception as e:
+        device_result['result'] = f'{type(e).__name__}: {e}'
+    if device_result['status'] in ['ERROR', 'UNCHANGED']:
+        journal_device(device_result)
+    return device_result
+
+
+def deploy_device_batch(client, args, template, batch):
+    # Deploy one batch of resolved devices in a single request.  Every device in the batch shares the Deployment ID.
+    try:
+        with phase('deploy', devices=len(batch)):
+            deploy_id = deploy_template_batch(client, template['id'], batch, template['bind_variables'])
+    except SystemExit:
+        deploy_id = None
+    except Exception as e:
+        deploy_id = None
+        print(f'Error in template batch deployment.\n{type(e).__name__}: {e}\n')
+    for device_result in batch:
+        del device_result['input_data']
+        device_result['deploy_id'] = deploy_id
+        if deploy_id:
+            device_result['status'] = 'DEPLOYING'
+            journal_device(device_result, 'SUBMITTED')
+        else:
+            device_result['status'] = 'ERROR'
+            device_result['result'] = 'Batch deployment failed - see the error output above.'
+            journal_device(device_result)
+            print(f'{device_result["device_name"]}: {device_result["status"]}')
+    return batch
+
+
+def wait_for_devices(client, args, template, device_results, start, on_result=None):
+    # Poll every outstanding Deployment ID in one loop and update each device's result as its deployment finishes.
+    # A batched deployment reports each target device separately, so that device's own status is used when available.
+    # "on_result" is called with each device result as soon as it is final.
+    pending = {}
+    for device_result in device_results:
+        if device_result['status'] == 'DEPLOYING':
+            pending.setdefault(device_result['deploy_id'], []).append(device_result)
+    fetch_status = lambda x: get_deployment_status(client, x)
+    by_event = 0
+    for deploy_id, result in deployment_poller.poll_deployments(fetch_status, pending, deploy_timeout=args.deploy_timeout,
+                                                                  deadline=args.timeout, **event_options()):
+        by_event += result.get('source') == 'event'
+        device_status = {x.get('deviceId'): x for x in result.get('devices', [])}
+        for device_result in pending[deploy_id]:
+            status = device_status.get(device_result['device_id'], result)
+            device_result['status'] = status.get('status', 'UNKNOWN')
+            device_result['result'] = status
+            device_result['elapsed'] = round(time.monotonic() - start, 2)
+            journal_device(device_result)
+            save_deploy_state(client, args, template, device_result)
+            print(f'{device_result["device_name"]}: {device_result["status"]} ({device_result["elapsed"]}s)')
+            if on_result:
+                on_result(device_result)
+    if event_receiver and pending:
+        print(f'{by_event} of {len(pending)} deployments finished by DNA Center event, {len(pending) - by_event} by polling.')
+
+
+def resume_devices(devices, results):
+    # When resuming from the checkpoint journal, skip devices that already succeeded and re-attach to deployments
+    # that may still be running, adding their results to "results".  Yields the devices that still need to be deployed,
+    # including devices that were being rolled back (ROLLBACK_ states) or were rolled back (ROLLED_BACK).
+    for device_name, input_data in devices:
+        previous = journal.previous(device_name) if journal else None
+        if previous and previous['state'] in FINISHED_STATES + IN_FLIGHT_STATES:
+            device_result = {"device_name": device_name, "device_id": previous['device_id'], "deploy_id": previous['deploy_id'],
+                             "status": "DEPLOYING", "result": None, "resumed": True}
+            if previous['state'] in FINISHED_STATES:
+                device_result['status'] = previous['state']
+                device_result['result'] = 'Already deployed by an earlier run - see the journal.'
+                device_result['elapsed'] = 0.0
+            results.append(device_result)
+        else:
+            yield device_name, input_data
+
+
+def changed_devices(client, template, devices, results, changes, removed):
+    # With --changed_only, compare each device's input data and the template version with the last successful
+    # deployment.  Unchanged devices are added to "results" without contacting DNAC.  Yields the devices that need
+    # to be deployed, and records why in "changes" (device name -> Dictionary of "change" and "input_hash").
+    # Devices deployed before that are missing from the input are added to "removed" once every device has been read.
+    seen = set()
+    last_input = last_hash = None
+    for device_name, input_data in devices:
+        seen.add(device_name)
+        # Every device shares one input_data object with --devices_file, so it only needs to be hashed once
+        if input_data is not last_input:
+            last_input, last_hash = input_data, params_hash(input_data)
+        previous = deploy_state.get_input(client.dnac_server, template['id'], device_name)
+        if not previous:
+            change = 'new device'
+        elif previous['input_hash'] != last_hash:
+            change = 'input data changed'
+        elif previous['template_version'] != template['version']:
+            change = f'template version changed ({previous["template_version"]} -> {template["version"]})'
         else:
-            print('Waiting 10 seconds...')
-            time.sleep(10)
+            device_result = {"device_name": device_name, "device_id": None, "deploy_id": None, "status": "UNCHANGED", "elapsed": 0.0,
+                             "result": 'Input data and template version are unchanged since the last successful deployment - not deployed.'}
+            journal_device(device_result)
+            results.append(device_result)
             continue
-    return result.json()
+        changes[device_name] = {"change": change, "input_hash": last_hash}
+        yield device_name, input_data
+    removed.extend(sorted(set(deploy_state.input_devices(client.dnac_server, template['id'])) - seen))
 
 
-def main(args):
-    global verbose
-    verbose = args.verbose
-    token = auth(args)
-    # Get input_file extension and evaluate it
-    if args.input_file.split('.')[1].lower() == 'csv':
-        input_data = parse_csv(args.input_file)
-    elif args.input_file.split('.')[1].lower() == 'txt':
-        input_data = parse_txt(args.input_file)
-    elif args.input_file.split('.')[1].lower() in ['yaml', 'yml']:
-        input_data = parse_yaml(args.input_file)
+def report_changes(results, removed):
+    # Print the devices that --changed_only is deploying and why, and the devices no longer in the input data.
+    deployed = [x for x in results if x.get('change')]
+    unchanged = len([x for x in results if x['status'] == 'UNCHANGED' and not x.get('change')])
+    print(f'\nChanges since the last successful deployment: {len(deployed)} devices to deploy, {unchanged} unchanged.')
+    for device_result in sorted(deployed, key=lambda x: x['device_name']):
+        print(f'  {device_result["device_name"]}: {device_result["change"]}')
+    if removed:
+        print(f'No longer in the input data (not changed on the device): {", ".join(removed)}')
+    print()
+
+
+def submit_devices(client, args, template, devices, results, changes, start):
+    # Run each device through a pool of worker threads up to the point where its deployment has been submitted,
+    # limited to "args.workers" devices at a time, and add the device results to "results".
+    # With "args.batch_size" set, resolved devices are packed into deployments of up to that many devices each.
+    batch = []
+    batch_futures = []
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for device_result in bounded_map(executor, partial(run_device, client, args, template), devices, args.workers * 2):
+            device_result.update(changes.pop(device_result['device_name'], {}))
+            if device_result['status'] == 'UNCHANGED':
+                # --skip_unchanged found the configuration already deployed, so the input data counts as deployed too
+                save_deploy_state(client, args, template, device_result)
+            if device_result['status'] != 'DEPLOYING':
+                device_result['elapsed'] = round(time.monotonic() - start, 2)
+            if device_result['status'] in ['ERROR', 'PREVIEW', 'UNCHANGED']:
+                print(f'{device_result["device_name"]}: {device_result["status"]} ({device_result["elapsed"]}s)')
+            if device_result['status'] == 'RESOLVED':
+                batch.append(device_result)
+                if len(batch) == args.batch_size:
+                    batch_futures.append(executor.submit(deploy_device_batch, client, args, template, batch))
+                    batch = []
+            results.append(device_result)
+        if batch:
+            batch_futures.append(executor.submit(deploy_device_batch, client, args, template, batch))
+        for future in as_completed(batch_futures):
+            future.result()
+
+
+def run_devices(client, args, template, devices):
+    # Run every device through a pool of worker threads, limited to "args.workers" devices at a time.
+    # "devices" yields a (device name, input_data) Tuple for each device and may be a generator, so that
+    # input is read only as fast as the workers can use it.
+    # All deployments are then checked together, so the total run time follows the slowest device.
+    # With "args.waves", the devices are deployed in waves instead (see run_waves()).
+    start = time.monotonic()
+    results = []
+    changes = {}
+    removed = []
+    if journal and journal.devices:
+        devices = resume_devices(devices, results)
+    if args.changed_only:
+        devices = changed_devices(client, template, devices, results, changes, removed)
+    if args.waves:
+        # Planning the waves reads every device first, so the resume and change reports are complete before wave 1
+        waves = plan_rollout(client, args, list(devices))
     else:
-        print('Input file type not supported.\n')
+        submit_devices(client, args, template, devices, results, changes, start)
+    if journal and journal.devices:
+        resumed = [x for x in results if x.get('resumed')]
+        skipped = len([x for x in resumed if x['status'] in FINISHED_STATES])
+        print(f'Resumed from the journal: skipped {skipped} devices that had succeeded, checking {len(resumed) - skipped} deployments still in progress.')
+    if args.changed_only:
+        # Devices waiting for their wave are not in "results" yet, only in "changes"
+        pending = [{"device_name": x, "status": None, **y} for x, y in changes.items()] if args.waves else []
+        report_changes(results + pending, removed)
+    if args.waves:
+        run_waves(client, args, template, waves, results, changes, start)
+        return results
+    with phase('deployment_wait', devices=len(results)):
+        wait_for_devices(client, args, template, results, start)
+    return results
+
+
+def device_group(client, args, device):
+    # Return the --group_by group of a (device name, input_data) Tuple: the device family or platform from the
+    # local inventory, or otherwise the value of that field in the device's input data (e.g. a "site" column).
+    device_name, input_data = device
+    if args.group_by in ['family', 'platform']:
+        matches = client.inventory.lookup(client.dnac_server, device_name, args.prefix_match) if client.inventory else []
+        return matches[0][args.group_by] if len(matches) == 1 else None
+    record = input_data[0] if isinstance(input_data, list) and input_data else input_data
+    return record.get(args.group_by) if isinstance(record, dict) else None
+
+
+def plan_rollout(client, args, devices):
+    # Split the devices into waves.
+    group_of = partial(device_group, client, args) if args.group_by else None
+    return plan_waves(devices, args.canary, args.wave_growth, args.max_wave_size, group_of, args.max_per_group)
+
+
+def run_wave(client, args, template, wave, changes, start, breaker, canary):
+    # Deploy one wave.  Deployments are checked while the rest of the wave is still being submitted, and every result
+    # goes to the circuit breaker as soon as it is known.  Once the breaker trips (or, in the canary wave, any device
+    # fails) no more of the wave's devices are submitted.  Returns the results of the devices that were started and
+    # the reason the rollout halted, or None.
+    wave_results = []
+    halted = threading.Event()
+    reason = []
+
+    def record(device_result):
+        breaker.record(device_result['status'])
+        if halted.is_set():
+            return
+        if canary and device_result['status'] not in GOOD_STATES:
+            reason.append(f'canary device {device_result["device_name"]} did not succeed')
+            halted.set()
+        elif breaker.tripped():
+            reason.append(f'{breaker.failure_rate:.0%} of the last {len(breaker.recent)} devices failed (limit {args.max_failure_rate:.0%})')
+            halted.set()
+
+    # Devices are only taken from the wave while the rollout has not halted
+    submitter = threading.Thread(target=submit_devices, daemon=True,
+                                 args=(client, args, template, takewhile(lambda _: not halted.is_set(), wave), wave_results, changes, start))
+    submitter.start()
+    checked = set()
+    while True:
+        finished = not submitter.is_alive()
+        # Devices waiting for their batch to be deployed are still RESOLVED, and are picked up once it has been
+        new = [x for x in list(wave_results) if id(x) not in checked and x['status'] != 'RESOLVED']
+        checked.update(id(x) for x in new)
+        for device_result in new:
+            if device_result['status'] != 'DEPLOYING':
+                record(device_result)
+        deploying = [x for x in new if x['status'] == 'DEPLOYING']
+        if deploying:
+            wait_for_devices(client, args, template, deploying, start, on_result=record)
+        elif finished and not new:
+            break
+        elif not new:
+            time.sleep(0.1)
+    return wave_results, reason[0] if reason else None
+
+
+def run_waves(client, args, template, waves, results, changes, start):
+    # Deploy one wave at a time, waiting for each wave to finish before starting the next.  The first wave is the
+    # canary when --canary is used: any failure in it stops the rollout.  As each result arrives, the circuit breaker
+    # checks the failure rate of the most recent --failure_window results, and the rollout stops as soon as it is over
+    # --max_failure_rate, without submitting the rest of the wave.  Devices that were not started are reported as HALTED.
+    print(f'Rollout plan: {sum(len(x) for x in waves)} devices in {len(waves)} waves of {", ".join(str(len(x)) for x in waves)} devices.\n')
+    breaker = CircuitBreaker(args.max_failure_rate, args.failure_window)
+    halted = None
+    deployed = {}
+    for number, wave in enumerate(waves, 1):
+        if not halted:
+            print(f'Wave {number} of {len(waves)}{" (canary)" if number == 1 and args.canary else ""}: {len(wave)} devices')
+            with phase('deployment_wait', wave=number, devices=len(wave)):
+                wave_results, reason = run_wave(client, args, template, wave, changes, start, breaker, number == 1 and args.canary)
+            results.extend(wave_results)
+            started = {x['device_name'] for x in wave_results}
+            deployed.update(x for x in wave if x[0] in started)
+            failed = [x for x in wave_results if x['status'] not in GOOD_STATES]
+            if reason:
+                halted = {"wave": number, "reason": reason}
+                print(f'\nRollout halted during wave {number} of {len(waves)}: {reason}.\n')
+            elif number < len(waves):
+                print(f'Wave {number} finished: {len(wave) - len(failed)} of {len(wave)} devices succeeded.\n')
+                if args.wave_pause:
+                    time.sleep(args.wave_pause)
+            wave = [x for x in wave if x[0] not in started]
+        for device_name, input_data in wave:
+            device_result = {"device_name": device_name, "device_id": None, "deploy_id": None, "status": "HALTED", "elapsed": 0.0,
+                             "result": f'Not deployed - the rollout was halted during wave {halted["wave"]}: {halted["reason"]}'}
+            journal_device(device_result)
+            results.append(device_result)
+    if halted and args.rollback_template:
+        roll_back(client, args, template, [x for x in results if x['status'] == 'SUCCESS' and x['device_name'] in deployed], deployed)
+
+
+def roll_back(client, args, template, device_results, deployed):
+    # Deploy --rollback_template to every device that the halted rollout changed successfully, with the same input data.
+    # Rolled back devices are recorded in the journal as ROLLED_BACK, so a resumed rollout deploys them again.
+    if not device_results:
+        return
+    print(f'\nRolling back {len(device_results)} devices with the "{args.rollback_template}" template.\n')
+    rollback_args = Namespace(**{**vars(args), "template_name": args.rollback_template, "skip_unchanged": False, "rollback_deploy": True})
+    with phase('template_lookup'):
+        rollback = get_template_info(client, args.template_project, args.rollback_template, args.refresh_templates)
+    rollback_results = []
+    start = time.monotonic()
+    submit_devices(client, rollback_args, rollback, [(x['device_name'], deployed[x['device_name']]) for x in device_results],
+                   rollback_results, {}, start)
+    with phase('deployment_wait', devices=len(rollback_results)):
+        wait_for_devices(client, rollback_args, rollback, rollback_results, start)
+    rollback_status = {x['device_name']: x['status'] for x in rollback_results}
+    for device_result in device_results:
+        device_result['rollback'] = rollback_status.get(device_result['device_name'], 'ERROR')
+        if device_result['rollback'] == 'SUCCESS':
+            device_result['status'] = 'ROLLED_BACK'
+            journal_device(device_result)
+            if deploy_state:
+                # The device no longer has this template's configuration, so --skip_unchanged and --changed_only must deploy it again
+                deploy_state.forget(client.dnac_server, template['id'], device_result['device_id'], device_result['device_name'])
+    rolled_back = len([x for x in device_results if x['status'] == 'ROLLED_BACK'])
+    print(f'\nRolled back {rolled_back} of {len(device_results)} devices.')
+
+
+def device_context(inventory, dnac_server, device_name):
+    # Build the "__device" System Bind Variable for a local preview from the local device inventory.
+    # Devices that are not in the inventory only get their hostname.
+    matches = inventory.lookup(dnac_server, device_name) if inventory else []
+    if len(matches) != 1:
+        return {"hostname": device_name}
+    device = matches[0]
+    return {
+        "hostname": device['hostname'],
+        "id": device['id'],
+        "managementIpAddress": device['management_ip'],
+        "platformId": device['platform'],
+        "serialNumber": device['serial'],
+        "family": device['family'],
+    }
+
+
+def render_device(args, inventory, device_name, input_data):
+    # Render the template locally for a single device.
+    device_result = {"device_name": device_name, "status": "ERROR", "result": None}
+    try:
+        device = device_context(inventory, args.dnac_server, device_name)
+        with phase('render', device=device_name):
+            device_result['result'] = render_local(args, input_data, device)
+        device_result['status'] = 'PREVIEW'
+    except Exception as e:
+        device_result['result'] = f'{type(e).__name__}: {e}'
+    return device_result
+
+
+def open_renderer(args):
+    # Load the template export files in "args.templates_dir" for rendering templates locally.
+    global renderer
+    from local_renderer import LocalRenderer, TemplateNotFound  # Only import Jinja2 if needed
+    renderer = LocalRenderer(args.templates_dir, args.bytecode_cache)
+    try:
+        renderer.find(args.template_project, args.template_name)
+    except TemplateNotFound as e:
+        print(f'{e}\n')
+        sys.exit(1)
+
+
+def run_local_preview(args, devices):
+    # Preview the template for every device without contacting DNAC, using the template export files in "args.templates_dir".
+    open_renderer(args)
+    inventory = None if args.no_inventory else InventoryStore(args.inventory_db, args.inventory_ttl)
+    start = time.monotonic()
+    results = []
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for device_result in bounded_map(executor, partial(render_device, args, inventory), devices, args.workers * 2):
+            device_result['elapsed'] = round(time.monotonic() - start, 2)
+            results.append(device_result)
+    return results
+
+
+def find_cluster_device(client, device_name):
+    # Ask DNAC whether it manages a device with this hostname.
+    result = client.get('/dna/intent/api/v1/network-device', params={"hostname": device_name})
+    body = response_body('find_cluster_device()', result, success=(200,))
+    return body is not None and len(body['response']) > 0
+
+
+def route_device(clusters, args, device_name, input_data):
+    # Find the cluster that manages a device.  A cluster whose "devices" patterns match the
+    # name is used first, then the recently synchronized local inventories, and only when no inventory has the device
+    # is every cluster asked through the API.  Returns a (device, cluster, error message) Tuple, with "cluster" set to
+    # None when no cluster, or more than one cluster, manages the device.
+    device = (device_name, input_data)
+    cluster = pattern_cluster(clusters, device_name)
+    if cluster:
+        if not cluster['client']:
+            return device, None, f'The "{cluster["name"]}" cluster could not be reached.'
+        return device, cluster, None
+    available = [x for x in clusters if x['client']]
+    owners = []
+    for cluster in available:
+        client = cluster['client']
+        if client.inventory and client.inventory.is_fresh(client.dnac_server) and \
+                client.inventory.lookup(client.dnac_server, device_name, args.prefix_match):
+            owners.append(cluster)
+    try:
+        if not owners:
+            # Not in any local inventory - the device may have been added since the last sync
+            with phase('device_route', device=device_name):
+                owners = [x for x in available if find_cluster_device(x['client'], device_name)]
+    except Exception as e:
+        return device, None, f'Unable to find the device\'s cluster.  {type(e).__name__}: {e}'
+    if len(owners) > 1:
+        return device, None, f'Device is managed by more than one cluster: {", ".join(x["name"] for x in owners)}'
+    if not owners:
+        unreachable = [x['name'] for x in clusters if not x['client']]
+        return device, None, 'Device was not found on any cluster' + (f' (not checked: {", ".join(unreachable)})' if unreachable else '') + '.'
+    return device, owners[0], None
+
+
+def setup_clusters(args, clusters):
+    # Set up an API client for each cluster of the --cluster_map, one at a time so password prompts do not overlap.
+    # A cluster that cannot be reached is left without a client, and the devices routed to it are reported as errors.
+    shared = None
+    for cluster in clusters:
+        cluster['args'] = cluster_args(args, cluster)
+        if not cluster['args'].username:
+            print(f'The "{cluster["name"]}" cluster in the cluster map has no "username", and --username was not given.\n')
+            sys.exit(1)
+        try:
+            cluster['client'] = shared = setup_client(cluster['args'], shared)
+        except SystemExit:
+            cluster['client'] = None
+        except Exception as e:
+            cluster['client'] = None
+            print(f'{type(e).__name__}: {e}\n')
+        if not cluster['client']:
+            print(f'Unable to connect to the "{cluster["name"]}" cluster ({cluster["dnac_server"]}) - its devices will not be deployed.\n')
+    if not any(x['client'] for x in clusters):
+        print('Unable to connect to any cluster in the cluster map.\n')
+        sys.exit(1)
+
+
+def run_cluster(args, cluster, devices):
+    # Look up the template on one cluster and run the devices routed to it, with the cluster's own API client,
+    # workers and rate limits.  An error that stops the whole cluster is reported against each of its devices,
+    # so the other clusters carry on.
+    try:
+        with phase('template_lookup', cluster=cluster['name']):
+            template = lookup_template(cluster['client'], args)
+        results = run_devices(cluster['client'], cluster['args'], template, devices)
+    except (SystemExit, PasswordRequired) as e:
+        if isinstance(e, PasswordRequired):
+            print(f'{e}\n')
+        results = [{"device_name": x[0], "device_id": None, "deploy_id": None, "status": "ERROR", "elapsed": 0.0,
+                    "result": f'Processing stopped for the "{cluster["name"]}" cluster - see the error output above.'} for x in devices]
+    for device_result in results:
+        device_result['cluster'] = cluster['name']
+    return results
+
+
+def run_clusters(args):
+    # With --cluster_map, deploy to devices spread over several DNA Center clusters in one run.  Each device is routed
+    # to the cluster that manages it, and every cluster is then run at the same time on its own thread, so the run
+    # takes as long as the slowest cluster rather than the sum of all of them.
+    try:
+        clusters = load_cluster_map(args.cluster_map)
+    except ClusterMapError as e:
+        print(f'{e}\n')
         sys.exit(1)
-    template_id = get_template_uuid(token, args.dnac_server, args.template_project, args.template_name)
-    device_id = get_device_uuid(token, args.dnac_server, args.device_name)
+    setup_clusters(args, clusters)
+    available = [x for x in clusters if x['client']]
+    if args.sync_inventory:
+        with phase('inventory_sync'), ThreadPoolExecutor(max_workers=len(available)) as executor:
+            for future in [executor.submit(sync_inventory, x['client'], x['client'].inventory) for x in available]:
+                future.result()
+        if not args.template_name:
+            return
+    if args.skip_unchanged or args.changed_only:
+        open_deploy_state(args)
+    if args.event_listen:
+        open_event_receiver(args)
+    if args.journal:
+        open_journal(args)
+    results = []
+    routed = {x['name']: [] for x in available}
+    with phase('device_routing'), ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for device, cluster, error in bounded_map(executor, partial(route_device, clusters, args), read_devices(args), args.workers * 2):
+            if cluster:
+                routed[cluster['name']].append(device)
+                continue
+            device_result = {"device_name": device[0], "device_id": None, "deploy_id": None, "status": "ERROR", "elapsed": 0.0, "result": error}
+            journal_device(device_result)
+            results.append(device_result)
+    print(f'Devices by cluster: {", ".join(f"{x}: {len(y)}" for x, y in routed.items())}' +
+          (f', not routed: {len(results)}' if results else '') + '\n')
+    with ThreadPoolExecutor(max_workers=len(available)) as executor:
+        futures = [executor.submit(run_cluster, args, x, routed[x['name']]) for x in available if routed[x['name']]]
+        for future in futures:
+            results.extend(future.result())
+    report_results(args, results)
+
+
+def report_results(args, results):
+    # Print the result for each device, followed by a summary.  Exits with an error if any device did not succeed.
+    failed = [x for x in results if x['status'] not in ['SUCCESS', 'PREVIEW', 'UNCHANGED']]
+    print(f'\n"{args.template_name}" Template Results:\n')
+    for device_result in sorted(results, key=lambda x: x['device_name']):
+        cluster = f' [{device_result["cluster"]}]' if device_result.get('cluster') else ''
+        print(f'{device_result["device_name"]}{cluster}: {device_result["status"]}')
+        if verbose or ((args.preview or args.local_preview) and not args.preview_dir) or device_result in failed:
+            print(f'{device_result["result"]}\n')
+    if render_cache is not None:
+        print(f'\n{len(results)} devices previewed with {len(render_cache)} distinct renders.')
+    if args.preview_dir:
+        save_previews(args, results)
+    unchanged = len([x for x in results if x['status'] == 'UNCHANGED'])
+    if unchanged:
+        print(f'\n{unchanged} devices were skipped because nothing has changed since their last successful deployment.')
+    if args.cluster_map:
+        print()
+        for cluster in sorted({x.get('cluster') or '(not routed)' for x in results}):
+            cluster_results = [x for x in results if (x.get('cluster') or '(not routed)') == cluster]
+            cluster_failed = len([x for x in cluster_results if x in failed])
+            print(f'{cluster}: {len(cluster_results) - cluster_failed} of {len(cluster_results)} devices succeeded.')
+    print(f'\n{len(results) - len(failed)} of {len(results)} devices succeeded.')
+    if failed:
+        sys.exit(1)
+
+
+def save_previews(args, results):
+    # Write every device's preview, and the index of devices with identical output, to "args.preview_dir".
+    run_info = {"template_project": args.template_project, "template_name": args.template_name,
+                "source": "local" if args.local_preview else "preview"}
+    try:
+        index = write_preview_dir(args.preview_dir, run_info, results)
+    except OSError as e:
+        print(f'Unable to write the previews to "{args.preview_dir}": {e}\n')
+        sys.exit(1)
+    print(f'Previews saved to "{args.preview_dir}": {index["distinct_outputs"]} distinct outputs for {index["device_count"]} devices.')
+
+
+def read_devices(args):
+    # Return the (device name, input_data) Tuples for every target device.  With "args.device_column" set, the
+    # devices and each device's input data are streamed from the CSV input file; otherwise every device listed
+    # in "args.devices_file" (or the single "args.device_name") gets the whole input file.
+    if args.device_column:
+        return stream_input_devices(args.input_file, args.device_column)
+    input_data = parse_input_file(args.input_file)
+    device_names = parse_devices_file(args.devices_file) if args.devices_file else [args.device_name]
+    return ((name, input_data) for name in device_names)
+
+
+def setup_client(args, shared=None):
+    # Authenticate and attach the local device inventory and template cache to the API client.
+    # "shared" is another client whose inventory and template cache are reused, as both keep their records per DNAC server.
+    with phase('auth'):
+        client = auth(args)
+    if not args.no_inventory:
+        client.inventory = shared.inventory if shared else InventoryStore(args.inventory_db, args.inventory_ttl)
+    if not args.no_template_cache:
+        client.template_cache = shared.template_cache if shared else TemplateCache(args.template_cache, args.template_ttl)
+    return client
+
+
+def open_journal(args):
+    # Open the checkpoint journal, loading the state of the earlier run with --resume.
+    global journal
+    run_info = {"dnac_server": args.dnac_server or args.cluster_map, "template_project": args.template_project, "template_name": args.template_name}
+    try:
+        journal = DeployJournal(args.journal, run_info, args.resume)
+    except (JournalError, OSError) as e:
+        print(f'{e}\n')
+        sys.exit(1)
+
+
+def open_deploy_state(args):
+    # Open the record of earlier deployments used by --skip_unchanged.
+    global deploy_state
+    if args.skip_unchanged and args.hash_source == 'local':
+        open_renderer(args)
+    try:
+        deploy_state = DeployState(args.deploy_state)
+    except (sqlite3.Error, OSError) as e:
+        print(f'Unable to open the deployment record "{args.deploy_state}": {e}\n')
+        sys.exit(1)
+
+
+def open_event_receiver(args):
+    # Start listening for DNA Center deployment events with --event_listen.
+    global event_receiver
+    try:
+        event_receiver = EventReceiver(args.event_listen, args.event_token, args.event_cert, args.event_timeout)
+    except (ValueError, OSError) as e:
+        print(f'Unable to listen for DNA Center events on "{args.event_listen}": {e}\n')
+        sys.exit(1)
+    print(f'Listening for DNA Center deployment events on {args.event_listen}.')
+
+
+def write_profile(profiler, profile_file):
+    # Save the cProfile statistics for the run and print the functions with the highest cumulative time.
+    profiler.dump_stats(profile_file)
+    print(f'\nProfile saved to "{profile_file}".  Top functions by cumulative time (main thread only):\n')
+    pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+
+
+def main(args, client=None):
+    # Run one invocation of the script.  "client" is an already authenticated API client to use, kept warm by --serve.
+    global verbose, metrics, journal, deploy_state, render_cache, renderer, event_receiver
+    verbose = args.verbose
+    metrics = Metrics(args.metrics_file, args.prometheus_file) if args.metrics_file or args.prometheus_file else None
+    journal = deploy_state = render_cache = renderer = event_receiver = None
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    # The metrics and profile are saved even when the run ends early with sys.exit()
+    try:
+        with phase('total'):
+            run(args, client)
+    finally:
+        if profiler:
+            profiler.disable()
+            write_profile(profiler, args.profile)
+        if metrics:
+            metrics.close()
+        if journal:
+            journal.close()
+        if deploy_state:
+            deploy_state.close()
+        if event_receiver:
+            event_receiver.close()
+
+
+def run(args, client=None):
+    global render_cache
+    multiple_devices = args.devices_file or args.device_column
+    if multiple_devices and (args.preview or args.local_preview):
+        render_cache = RenderCache()
+    if args.local_preview:
+        results = run_local_preview(args, read_devices(args))
+        if multiple_devices:
+            report_results(args, results)
+        elif results[0]['status'] == 'ERROR':
+            print(f'Error in local template preview.\n{results[0]["result"]}\n')
+            sys.exit(1)
+        else:
+            print(f'"{args.template_name}" Template Result:\n\n{results[0]["result"]}')
+        return
+    if args.cluster_map:
+        run_clusters(args)
+        return
+    if client:
+        client.metrics = metrics
+    else:
+        client = setup_client(args)
+    if args.sync_inventory:
+        with phase('inventory_sync'):
+            sync_inventory(client, client.inventory)
+        if not args.template_name:
+            return
+    with phase('template_lookup'):
+        template = lookup_template(client, args)
+    if args.skip_unchanged or args.changed_only:
+        open_deploy_state(args)
+    if args.event_listen:
+        open_event_receiver(args)
+    if multiple_devices:
+        if args.journal:
+            open_journal(args)
+        results = run_devices(client, args, template, read_devices(args))
+        report_results(args, results)
+        return
+    with phase('input_file'):
+        input_data = parse_input_file(args.input_file)
+    with phase('device_lookup', device=args.device_name):
+        device_id = get_device_uuid(client, args.device_name, args.prefix_match)
     if args.preview:
-        result = preview_template(token, args.dnac_server, template_id, device_id, input_data)
+        with phase('preview', device=args.device_name):
+            result = preview_template(client, template['id'], device_id, input_data, template['bind_variables'])
     else:
-        deploy_id = deploy_template(token, args.dnac_server, template_id, device_id, input_data)
-        result = check_deployment(args.dnac_server, token, deploy_id)
+        device_result = {"device_name": args.device_name, "device_id": device_id}
+        if args.skip_unchanged and is_unchanged(client, args, template, device_result, input_data):
+            print(f'"{args.template_name}" Template Result:\n\nUNCHANGED - the rendered configuration is the same as the last successful deployment, so it was not deployed again.')
+            return
+        with phase('deploy', device=args.device_name):
+            deploy_id = deploy_template(client, template['id'], device_id, input_data, template['bind_variables'])
+        with phase('deployment_wait', devices=1):
+            result = check_deployment(client, deploy_id, args.deploy_timeout, args.timeout)
+        device_result['status'] = result.get('status')
+        save_deploy_state(client, args, template, device_result)
     print(f'"{args.template_name}" Template Result:\n\n{result}')
 
 
-if __name__ == '__main__':
+def serve(args):
+    # Run as a resident daemon, taking jobs from "runner_client.py" over a Unix socket (see runner_daemon.py).
+    # One authenticated API client is kept for each combination of client options, with its token, connection pool,
+    # rate limits, device inventory and template cache, so each job can start work straight away.
+    password = args.password or getpass("Enter the DNAC Password: ", stream=None)
+    clients = {}
+
+    def run_job(argv):
+        # The daemon's own server and credentials are always used, whatever the job asks for
+        job_args = parse_args(argv + ['--dnac_server', args.dnac_server, '--username', args.username])
+        if job_args.serve:
+            print('A job cannot start another daemon.\n')
+            sys.exit(2)
+        job_args.password = password
+        client = None
+        if not job_args.local_preview:
+            key = tuple(getattr(job_args, x) for x in CLIENT_OPTIONS)
+            if key not in clients:
+                clients[key] = setup_client(job_args)
+            client = clients[key]
+        main(job_args, client)
+
+    try:
+        server = RunnerDaemon(args.socket, run_job)
+    except OSError as e:
+        print(f'{e}\n')
+        sys.exit(1)
+    print(f'Listening for jobs on "{args.socket}".  Press Ctrl+C to stop.', flush=True)
+    # Stop cleanly when asked to by a service manager, too
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for client in clients.values():
+            client.close()
+
+
+def build_parser():
+    # Build the command line parser.  Its defaults are also used by the Ansible action plugin in the "ansible" directory.
     parser = ArgumentParser(description='Select your options:')
-    parser.add_argument('--username', '-u', type=str, required=True, help="DNAC Username")
+    parser.add_argument('--username', '-u', type=str, help="DNAC Username")
     parser.add_argument('--password', '-p', type=str, help="DNAC Password")
-    parser.add_argument('--dnac_server', type=str, required=True, help="DNAC Server IP")
-    parser.add_argument('--template_project', type=str, required=True, help="Template Project Name")
-    parser.add_argument('--template_name', type=str, required=True, help="Template Name")
-    parser.add_argument('--device_name', type=str, required=True, help="Target Device Name")
-    parser.add_argument('--input_file', type=str, required=True, help="CSV, TXT or YAML Input File")
+    parser.add_argument('--dnac_server', type=str, help="DNAC Server IP")
+    parser.add_argument('--cluster_map', type=str, help="YAML or JSON file listing several DNAC clusters to deploy to at once, each device going to the cluster that manages it (instead of --dnac_server)")
+    parser.add_argument('--template_project', type=str, help="Template Project Name")
+    parser.add_argument('--template_name', type=str, help="Template Name")
+    targets = parser.add_mutually_exclusive_group()
+    targets.add_argument('--device_name', type=str, help="Target Device Name")
+    targets.add_argument('--devices_file', '--devices-file', type=str, help="Text File of Target Device Names, one per line")
+    targets.add_argument('--device_column', type=str, help="Read the target devices from this column (or field) of a CSV or NDJSON Input File, sending each device only its own records")
+    parser.add_argument('--input_file', type=str, help="CSV, TXT, YAML, JSON or NDJSON Input File (format detected from its content or extension)")
+    parser.add_argument('--workers', type=int, default=10, help="Maximum number of devices processed at once with --devices_file (default: 10)")
+    parser.add_argument('--batch_size', type=int, default=0, help="Deploy to up to this many devices per API call with --devices_file (default: 0, one device per call)")
+    parser.add_argument('--local_preview', action='store_true', help="Preview the template output offline from the template export files - does not contact DNAC.")
+    parser.add_argument('--templates_dir', type=str, default=DEFAULT_TEMPLATES_DIR, help="Directory of template project export files used by --local_preview")
+    parser.add_argument('--bytecode_cache', type=str, help="Directory for keeping compiled templates between --local_preview runs")
+    parser.add_argument('--deploy_timeout', type=int, default=900, help="Seconds to wait for each deployment to finish before reporting TIMEOUT (default: 900)")
+    parser.add_argument('--timeout', type=int, help="Overall number of seconds to wait for all deployments to finish")
     parser.add_argument('--preview', action='store_true', help="Only Preview the template output - do not deploy.")
+    parser.add_argument('--preview_dir', type=str, help="Write each device's --preview or --local_preview output to this directory, with an index of devices sharing identical output")
+    parser.add_argument('--template_cache', type=str, default=DEFAULT_TEMPLATE_DB, help=f"Local template lookup cache (default: {DEFAULT_TEMPLATE_DB})")
+    parser.add_argument('--template_ttl', type=int, default=DEFAULT_TEMPLATE_TTL, help="Seconds before a cached template lookup is checked against DNAC again (default: 3600)")
+    parser.add_argument('--refresh_templates', action='store_true', help="Check the template against DNAC now, even if the cached lookup is recent")
+    parser.add_argument('--no_template_cache', action='store_true', help="Do not read or save cached template lookups")
+    parser.add_argument('--sync_inventory', action='store_true', help="Download the DNAC device inventory to the local inventory database")
+    parser.add_argument('--inventory_db', type=str, default=DEFAULT_INVENTORY_DB, help=f"Local device inventory database (default: {DEFAULT_INVENTORY_DB})")
+    parser.add_argument('--inventory_ttl', type=int, default=DEFAULT_INVENTORY_TTL, help="Seconds before the local device inventory is considered out of date (default: 86400)")
+    parser.add_argument('--no_inventory', action='store_true', help="Always resolve device names with the DNAC API instead of the local inventory")
+    parser.add_argument('--prefix_match', action='store_true', help="Allow device names to match the start of a hostname in the local inventory")
+    parser.add_argument('--rate_limit', type=float, default=DEFAULT_RATE, help="Maximum API calls per second to each DNAC API endpoint (default: 0, no limit until DNAC starts throttling)")
+    parser.add_argument('--max_retries', type=int, default=DEFAULT_MAX_RETRIES, help=f"Number of times a throttled or failed API call is retried (default: {DEFAULT_MAX_RETRIES})")
+    parser.add_argument('--request_timeout', type=float, default=DEFAULT_REQUEST_TIMEOUT, help=f"Seconds to wait for each DNAC API response before treating the call as failed (default: {DEFAULT_REQUEST_TIMEOUT})")
+    parser.add_argument('--token_cache', type=str, default=DEFAULT_TOKEN_CACHE, help=f"Auth token cache file (default: {DEFAULT_TOKEN_CACHE})")
+    parser.add_argument('--no_token_cache', action='store_true', help="Do not read or save cached auth tokens")
+    parser.add_argument('--journal', type=str, help="Record each device's progress in this checkpoint journal file, so an interrupted rollout can be resumed")
+    parser.add_argument('--resume', action='store_true', help="Resume the rollout recorded in --journal: skip devices that succeeded and re-check deployments still in progress")
+    parser.add_argument('--skip_unchanged', action='store_true', help="Only deploy to devices whose rendered configuration has changed since their last successful deployment")
+    parser.add_argument('--hash_source', choices=['preview', 'local'], default='preview', help="Render the configuration for --skip_unchanged with the DNAC Preview API or locally from --templates_dir (default: preview)")
+    parser.add_argument('--changed_only', action='store_true', help="Only deploy to devices whose input data or template version has changed since their last successful deployment")
+    parser.add_argument('--deploy_state', type=str, default=DEFAULT_DEPLOY_DB, help=f"Record of the configuration last deployed to each device, used by --skip_unchanged and --changed_only (default: {DEFAULT_DEPLOY_DB})")
+    parser.add_argument('--waves', action='store_true', help="Deploy in waves: a canary wave, then waves growing by --wave_growth, halting when too many devices fail")
+    parser.add_argument('--canary', type=int, default=1, help="Number of devices in the first (canary) wave with --waves.  Any failure in it halts the rollout (default: 1)")
+    parser.add_argument('--wave_growth', type=float, default=2.0, help="Each wave is this many times larger than the one before, with --waves (default: 2)")
+    parser.add_argument('--max_wave_size', type=int, help="Largest number of devices in one wave, with --waves")
+    parser.add_argument('--group_by', type=str, help="Group devices by \"family\" or \"platform\" from the local inventory, or by this field of their input data (e.g. site), for --max_per_group")
+    parser.add_argument('--max_per_group', type=int, help="Largest number of devices from any one --group_by group in one wave")
+    parser.add_argument('--max_failure_rate', type=float, default=0.1, help="Halt the rollout when more than this fraction of the last --failure_window devices failed, with --waves (default: 0.1)")
+    parser.add_argument('--failure_window', type=int, default=50, help="Number of most recent device results checked by --max_failure_rate (default: 50)")
+    parser.add_argument('--wave_pause', type=float, default=0, help="Seconds to wait between waves, with --waves (default: 0)")
+    parser.add_argument('--rollback_template', type=str, help="When the rollout halts, deploy this template from the same project to the devices it changed")
+    parser.add_argument('--event_listen', type=str, help="Listen on this [host:]port for DNA Center event notifications, resolving deployments as their events arrive instead of polling")
+    parser.add_argument('--event_timeout', type=float, default=60.0, help="Seconds to wait for a deployment's event before polling its status instead, with --event_listen (default: 60)")
+    parser.add_argument('--event_token', type=str, help="Only accept events that carry this value in an X-Event-Token header, with --event_listen")
+    parser.add_argument('--event_cert', type=str, help="PEM file with the certificate and private key for receiving events over HTTPS, with --event_listen")
+    parser.add_argument('--metrics_file', type=str, help="Append the timing of every API call and phase of the run to this JSON lines file")
+    parser.add_argument('--prometheus_file', type=str, help="Write timing totals for the run to this file in the Prometheus text format")
+    parser.add_argument('--profile', type=str, help="Profile the run with cProfile and save the statistics to this file")
+    parser.add_argument('--serve', action='store_true', help="Run as a daemon that keeps the auth token, connections and caches warm, taking jobs from runner_client.py")
+    parser.add_argument('--socket', type=str, default=DEFAULT_SOCKET, help=f"Unix socket the --serve daemon listens on (default: {DEFAULT_SOCKET})")
     parser.add_argument('--verbose', '-v', action='store_true', help="Print verbose output")
-    args = parser.parse_args()
+    return parser
+
+
+def parse_args(argv=None):
+    # Parse and check the command line options.  "argv" defaults to the script's own command line.
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    check_args(parser, args)
+    return args
+
+
+def check_args(parser, args):
+    # Check the combinations of options, calling parser.error() for the first problem found.
+    # Also used by the Ansible action plugin, which builds the options itself.
+    # Template options are only needed when a template is being previewed or deployed
+    if not (args.sync_inventory or args.serve) or args.template_name:
+        missing = [f'--{x}' for x in ['template_project', 'template_name', 'input_file'] if not getattr(args, x)]
+        if not (args.device_name or args.devices_file or args.device_column):
+            missing.append('--device_name, --devices_file or --device_column')
+        if missing:
+            parser.error(f'the following arguments are required: {", ".join(missing)}')
+    if args.device_column and not args.input_file:
+        parser.error('--device_column requires a CSV or NDJSON --input_file')
+    if not args.local_preview and not (args.dnac_server or args.cluster_map):
+        parser.error('the following arguments are required: --dnac_server or --cluster_map')
+    if args.dnac_server and args.cluster_map:
+        parser.error('--dnac_server cannot be used with --cluster_map')
+    if not (args.local_preview or args.cluster_map) and not args.username:
+        parser.error('the following arguments are required: --username/-u')
+    if args.cluster_map and (args.serve or args.local_preview):
+        parser.error('--cluster_map cannot be used with --serve or --local_preview')
+    if args.serve and (args.local_preview or args.sync_inventory):
+        parser.error('--serve cannot be used with --local_preview or --sync_inventory')
+    if args.local_preview and args.sync_inventory:
+        parser.error('--local_preview cannot be used with --sync_inventory')
+    if args.sync_inventory and args.no_inventory:
+        parser.error('--sync_inventory cannot be used with --no_inventory')
+    if args.workers < 1:
+        parser.error('--workers must be 1 or greater')
+    if args.request_timeout <= 0:
+        parser.error('--request_timeout must be greater than 0')
+    if args.batch_size < 0:
+        parser.error('--batch_size cannot be negative')
+    if args.resume and not args.journal:
+        parser.error('--resume requires --journal')
+    if args.journal and not (args.devices_file or args.device_column):
+        parser.error('--journal requires --devices_file or --device_column')
+    if args.journal and (args.preview or args.local_preview):
+        parser.error('--journal cannot be used with --preview or --local_preview')
+    if args.preview_dir and not (args.preview or args.local_preview):
+        parser.error('--preview_dir requires --preview or --local_preview')
+    if args.preview_dir and not (args.devices_file or args.device_column):
+        parser.error('--preview_dir requires --devices_file or --device_column')
+    if args.skip_unchanged and (args.preview or args.local_preview):
+        parser.error('--skip_unchanged cannot be used with --preview or --local_preview')
+    if args.changed_only and not (args.devices_file or args.device_column):
+        parser.error('--changed_only requires --devices_file or --device_column')
+    if args.changed_only and (args.preview or args.local_preview):
+        parser.error('--changed_only cannot be used with --preview or --local_preview')
+    if args.waves and not (args.devices_file or args.device_column):
+        parser.error('--waves requires --devices_file or --device_column')
+    if args.waves and (args.preview or args.local_preview):
+        parser.error('--waves cannot be used with --preview or --local_preview')
+    wave_options = ['max_wave_size', 'group_by', 'max_per_group', 'wave_pause', 'rollback_template']
+    if not args.waves and any(getattr(args, x) for x in wave_options):
+        parser.error(f'{", ".join(f"--{x}" for x in wave_options)} require --waves')
+    if bool(args.group_by) != bool(args.max_per_group):
+        parser.error('--group_by and --max_per_group must be used together')
+    if args.canary < 0 or args.wave_growth < 1 or (args.max_wave_size is not None and args.max_wave_size < 1) or (args.max_per_group is not None and args.max_per_group < 1):
+        parser.error('--canary cannot be negative, --wave_growth must be 1 or greater, and --max_wave_size and --max_per_group must be 1 or greater')
+    if not 0 <= args.max_failure_rate <= 1 or args.failure_window < 1:
+        parser.error('--max_failure_rate must be between 0 and 1, and --failure_window must be 1 or greater')
+    if args.event_listen and (args.preview or args.local_preview):
+        parser.error('--event_listen cannot be used with --preview or --local_preview')
+    if (args.event_token or args.event_cert) and not args.event_listen:
+        parser.error('--event_token and --event_cert require --event_listen')
+    if args.event_listen:
+        try:
+            host = parse_listen(args.event_listen)[0]
+        except ValueError:
+            parser.error('--event_listen must be a port or host:port')
+        if not args.event_token and not is_loopback(host):
+            parser.error('--event_listen on an address other than loopback requires --event_token')
+    if args.event_timeout < 0:
+        parser.error('--event_timeout cannot be negative')
+    if args.rate_limit < 0:
+        parser.error('--rate_limit cannot be negative')
+    if args.max_retries < 0:
+        parser.error('--max_retries cannot be negative')
+
+
+if __name__ == '__main__':
+    args = parse_args()
     
-    main(args)
\ No newline at end of file
+    if args.serve:
+        serve(args)
+    else:
+        main(args)
\ No newline at end of file
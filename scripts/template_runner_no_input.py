@@ -27,7 +27,6 @@ __license__ = "Cisco Sample Code License, Version 1.1"
 import csv
 import json
 import sys
-import time
 from getpass import getpass
 from argparse import ArgumentParser
 
@@ -35,6 +34,8 @@ import requests
 from requests.auth import HTTPBasicAuth
 import urllib3
 
+import deployment_poller
+
 # Disable insecure connection warnings on destinations with untrusted certificates
 urllib3.disable_warnings()
 
@@ -211,37 +212,20 @@ def deploy_template(token, dnac_server, template_id, device_id):
         sys.exit(1)
 
 
-def check_deployment(dnac_server, token, deploy_id):
-    # Check the status of the template deployment every 10 seconds until a proper response is received.
-    url = f'https://{dnac_server}/dna/intent/api/v1/template-programmer/template/deploy/status/{deploy_id}'
-    headers = {
-        "Content-Type": "application/json",
-        "x-auth-token": token
-    }
-    while True:
-        result = requests.get(url, headers=headers, verify=False)
-        if verbose:
-            verbose_output('check_deployment()', result)
-        if result.status_code in [201, 202, 204]:
-            try:
-                status = result.json()['status']
-            except KeyError:
-                print('Waiting 10 seconds...')
-                time.sleep(10)
-                continue
-            if status in ['SUCCESS', 'FAILURE']:
-                # print('Deployment status:\n')
-                # print(json.dumps(result.json(), indent=4))
-                break
-            else:
-                print('Waiting 10 seconds...')
-                time.sleep(10)
-                continue
-        else:
-            print('Waiting 10 seconds...')
-            time.sleep(10)
-            continue
-    return result.json()
+def get_deployment_status(token, dnac_server, deploy_id):
+    # Make a single deployment status API call, with verbose output if requested.
+    result = deployment_poller.get_deployment_status(dnac_server, token, deploy_id)
+    if verbose:
+        verbose_output('check_deployment()', result)
+    return result
+
+
+def check_deployment(dnac_server, token, deploy_id, deploy_timeout=None):
+    # Check the status of the template deployment until SUCCESS or FAILURE is returned.
+    # Checks start at half a second apart and back off to a maximum of 10 seconds, and the deployment is
+    # reported as "TIMEOUT" if it has not finished after "deploy_timeout" seconds.
+    fetch_status = lambda x: get_deployment_status(token, dnac_server, x)
+    return deployment_poller.wait_for_deployment(fetch_status, deploy_id, deploy_timeout=deploy_timeout)
 
 
 def main(args):
@@ -254,7 +238,7 @@ def main(args):
         result = preview_template(token, args.dnac_server, template_id, device_id)
     else:
         deploy_id = deploy_template(token, args.dnac_server, template_id, device_id)
-        result = check_deployment(args.dnac_server, token, deploy_id)
+        result = check_deployment(args.dnac_server, token, deploy_id, args.deploy_timeout)
     print(f'"{args.template_name}" Template Result:\n\n{result}')
 
 
@@ -266,6 +250,7 @@ if __name__ == '__main__':
     parser.add_argument('--template_project', type=str, required=True, help="Template Project Name")
     parser.add_argument('--template_name', type=str, required=True, help="Template Name")
     parser.add_argument('--device_name', type=str, required=True, help="Target Device Name")
+    parser.add_argument('--deploy_timeout', type=int, default=900, help="Seconds to wait for the deployment to finish before reporting TIMEOUT (default: 900)")
     parser.add_argument('--preview', action='store_true', help="Only Preview the template output - do not deploy.")
     parser.add_argument('--verbose', '-v', action='store_true', help="Print verbose output")
     args = parser.parse_args()
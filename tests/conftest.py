@@ -0,0 +1,75 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# Shared pytest fixtures.  The scripts are imported the way they import each other (as top-level modules from the
+# "scripts" directory), and "mock_dnac" runs "benchmark/mock_dnac.py" in this process on a free local port.
+
+import os
+import sys
+import threading
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+for directory in ['scripts', 'benchmark']:
+    path = os.path.join(TESTS_DIR, '..', directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import mock_dnac  # noqa: E402
+
+
+@pytest.fixture
+def mock_dnac_server():
+    # Factory for mock DNA Center servers.  Takes mock_dnac.py command line options, e.g.
+    # mock_dnac_server('--devices', '20'), and returns the server.  "server.url" is its base URL and
+    # "server.state" its mock_dnac.MockState.  Responses are instant and deployments finish within 0.2 seconds
+    # unless the options say otherwise.
+    servers = []
+
+    def start(*argv):
+        options = mock_dnac.build_parser().parse_args(['--port', '0', '--latency', '0', '--latency_jitter', '0',
+                                                       '--deploy_min', '0.05', '--deploy_max', '0.2', *argv])
+        server = mock_dnac.create_server(options)
+        server.url = f'http://127.0.0.1:{server.server_address[1]}'
+        server.state = server.RequestHandlerClass.state
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def runner_options(tmp_path):
+    # Factory for template_runner.py command lines against a mock server, with every cache and state file kept
+    # in the test's temporary directory.
+    def options(server, *argv):
+        return ['-u', 'admin', '-p', 'password', '--dnac_server', server.url, '--no_token_cache', '--no_inventory',
+                '--template_cache', str(tmp_path / 'templates.db'), '--deploy_state', str(tmp_path / 'deployments.db'),
+                *argv]
+
+    return options
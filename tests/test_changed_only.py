@@ -0,0 +1,71 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# template_runner.py --changed_only against the mock DNA Center server.
+
+import json
+
+import pytest
+
+import template_runner
+
+DEVICES = [f'switch{x}' for x in range(1, 6)]
+
+
+@pytest.fixture
+def rollout(mock_dnac_server, runner_options, tmp_path):
+    # A committed template on a mock server, and a function that runs --changed_only for every device and
+    # returns its output.
+    server = mock_dnac_server('--devices', str(len(DEVICES)))
+    server.state.templates['template-1'] = {"id": 'template-1', "name": 'Ports', "projectName": 'Tests',
+                                            "templateParams": [{"parameterName": "vlan", "binding": ""}],
+                                            "versionsInfo": [{"version": "1"}]}
+    devices_file = tmp_path / 'devices.txt'
+    devices_file.write_text('\n'.join(DEVICES) + '\n')
+    input_file = tmp_path / 'input.json'
+    input_file.write_text(json.dumps({"vlan": 10}))
+
+    def run(capsys):
+        args = template_runner.parse_args(runner_options(server, '--template_project', 'Tests', '--template_name', 'Ports',
+                                                         '--devices_file', str(devices_file), '--input_file', str(input_file),
+                                                         '--changed_only'))
+        template_runner.main(args)
+        return capsys.readouterr().out
+
+    run.server = server
+    return run
+
+
+def test_unchanged_devices_are_not_deployed_again(rollout, capsys):
+    assert f'{len(DEVICES)} devices to deploy, 0 unchanged' in rollout(capsys)
+    assert f'0 devices to deploy, {len(DEVICES)} unchanged' in rollout(capsys)
+
+
+def test_new_template_version_marks_every_device_changed(rollout, capsys):
+    rollout(capsys)
+    # Commit version 2 within the template cache TTL - the cached lookup must not hide it
+    rollout.server.state.templates['template-1']['versionsInfo'].append({"version": "2"})
+    output = rollout(capsys)
+    assert f'{len(DEVICES)} devices to deploy, 0 unchanged' in output
+    for device_name in DEVICES:
+        assert f'{device_name}: template version changed (1 -> 2)' in output
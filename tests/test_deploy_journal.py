@@ -0,0 +1,94 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# deploy_journal.py, and resuming an interrupted template_runner.py --journal rollout against the mock server.
+
+import json
+
+import pytest
+
+import template_runner
+from deploy_journal import DeployJournal, JournalError, read_journal
+
+RUN = {"dnac_server": 'dnac.example.com', "template_project": 'Tests', "template_name": 'Ports'}
+DEPLOY = 'POST /dna/intent/api/v1/template-programmer/template/deploy'
+
+
+def test_records_are_replayed(tmp_path):
+    journal_file = str(tmp_path / 'journal.jsonl')
+    journal = DeployJournal(journal_file, RUN)
+    journal.record('switch1', 'RESOLVED', device_id='d1', deploy_id=None)
+    journal.record('switch1', 'SUBMITTED', device_id='d1', deploy_id='x1')
+    journal.close()
+    # A line cut short by a crash is ignored, and the next run starts on a fresh line
+    with open(journal_file, 'at') as f:
+        f.write('{"type": "device", "device_name": "swi')
+    journal = DeployJournal(journal_file, RUN, resume=True)
+    assert journal.previous('switch1')['state'] == 'SUBMITTED'
+    assert journal.previous('switch1')['deploy_id'] == 'x1'
+    journal.record('switch1', 'SUCCESS', device_id='d1', deploy_id='x1')
+    journal.close()
+    run, devices = read_journal(journal_file)
+    assert run['resumed'] and devices['switch1']['state'] == 'SUCCESS'
+
+
+def test_existing_journal_needs_resume(tmp_path):
+    journal_file = str(tmp_path / 'journal.jsonl')
+    DeployJournal(journal_file, RUN).close()
+    with pytest.raises(JournalError, match='already exists'):
+        DeployJournal(journal_file, RUN)
+    with pytest.raises(JournalError, match='different rollout'):
+        DeployJournal(journal_file, {**RUN, "template_name": 'Other'}, resume=True)
+
+
+def test_resume_interrupted_rollout(mock_dnac_server, runner_options, tmp_path, capsys):
+    server = mock_dnac_server('--devices', '3')
+    (tmp_path / 'devices.txt').write_text('switch1\nswitch2\nswitch3\n')
+    (tmp_path / 'input.json').write_text(json.dumps({"vlan": 10}))
+    journal_file = tmp_path / 'journal.jsonl'
+
+    def run(*argv):
+        template_runner.main(template_runner.parse_args(runner_options(
+            server, '--template_project', 'Tests', '--template_name', 'Ports', '--devices_file', str(tmp_path / 'devices.txt'),
+            '--input_file', str(tmp_path / 'input.json'), '--journal', str(journal_file), *argv)))
+        return capsys.readouterr().out
+
+    run()
+    assert server.state.stats[DEPLOY] == 3
+    # Cut the journal back to an interrupted rollout: switch1 finished, switch2 was submitted and switch3 not started
+    kept = []
+    for line in journal_file.read_text().splitlines():
+        record = json.loads(line)
+        device_name = record.get('device_name')
+        if device_name == 'switch3' or (device_name == 'switch2' and record['state'] not in ['RESOLVED', 'SUBMITTED']):
+            continue
+        kept.append(line)
+    journal_file.write_text('\n'.join(kept) + '\n')
+    assert read_journal(str(journal_file))[1]['switch2']['state'] == 'SUBMITTED'
+
+    output = run('--resume')
+    assert 'skipped 1 devices that had succeeded, checking 1 deployments still in progress' in output
+    # Only switch3 is deployed again; switch2's existing deployment is checked instead
+    assert server.state.stats[DEPLOY] == 4
+    assert {x: y['state'] for x, y in read_journal(str(journal_file))[1].items()} == \
+        {"switch1": 'SUCCESS', "switch2": 'SUCCESS', "switch3": 'SUCCESS'}
@@ -0,0 +1,90 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# deployment_poller.py: the shared status polling loop, driven by scripted status replies.
+
+import time
+
+import requests
+
+from deployment_poller import poll_deployments, wait_for_deployment
+
+FAST = {"initial_delay": 0.01, "max_delay": 0.02}
+
+
+def scripted(replies):
+    # Return a fetch_status function that answers each Deployment ID with its next scripted reply, repeating the
+    # last one.  A reply that is an exception is raised instead.
+    calls = {x: 0 for x in replies}
+
+    def fetch_status(deploy_id):
+        reply = replies[deploy_id][min(calls[deploy_id], len(replies[deploy_id]) - 1)]
+        calls[deploy_id] += 1
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    fetch_status.calls = calls
+    return fetch_status
+
+
+def status(value):
+    return {"status": value}
+
+
+def test_deployments_are_yielded_as_they_finish():
+    fetch_status = scripted({
+        "slow": [status('IN_PROGRESS')] * 4 + [status('SUCCESS')],
+        "fast": [status('FAILURE')],
+    })
+    results = list(poll_deployments(fetch_status, ['slow', 'fast'], **FAST))
+    assert [(x, y['status']) for x, y in results] == [('fast', 'FAILURE'), ('slow', 'SUCCESS')]
+    # A finished deployment is not checked again
+    assert fetch_status.calls['fast'] == 1
+
+
+def test_duplicate_deploy_ids_are_polled_once():
+    fetch_status = scripted({"a": [status('SUCCESS')]})
+    assert len(list(poll_deployments(fetch_status, ['a', 'a'], **FAST))) == 1
+    assert fetch_status.calls['a'] == 1
+
+
+def test_errors_only_delay_the_deployment():
+    # Unreadable replies and connection errors are checked again later, on the deployment's backoff schedule
+    fetch_status = scripted({"a": [ValueError('not JSON'), requests.ConnectionError('refused'), None, status('SUCCESS')]})
+    assert wait_for_deployment(fetch_status, 'a', **FAST)['status'] == 'SUCCESS'
+    assert fetch_status.calls['a'] == 4
+
+
+def test_deploy_timeout():
+    fetch_status = scripted({"a": [status('IN_PROGRESS')]})
+    start = time.monotonic()
+    result = wait_for_deployment(fetch_status, 'a', deploy_timeout=0.2, **FAST)
+    assert result['status'] == 'TIMEOUT'
+    assert time.monotonic() - start < 1
+
+
+def test_deadline_times_out_every_unfinished_deployment():
+    fetch_status = scripted({"a": [status('IN_PROGRESS')], "b": [status('IN_PROGRESS')], "c": [status('SUCCESS')]})
+    results = dict(poll_deployments(fetch_status, ['a', 'b', 'c'], deadline=0.2, **FAST))
+    assert {x: y['status'] for x, y in results.items()} == {"a": 'TIMEOUT', "b": 'TIMEOUT', "c": 'SUCCESS'}
@@ -0,0 +1,101 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# event_receiver.py: parsing, listening and token checks, and resolving polled deployments from events.
+
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+import event_receiver
+from deployment_poller import poll_deployments
+from event_receiver import EventReceiver, event_status, parse_listen
+
+
+def post(receiver, events, token=None):
+    # Post events to a receiver and return the HTTP status code.
+    host, port = receiver.address
+    request = urllib.request.Request(f'http://{host}:{port}/', data=json.dumps(events).encode(), method='POST',
+                                     headers={"Content-Type": 'application/json', **({"X-Event-Token": token} if token else {})})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def finished(deploy_id, status='SUCCESS'):
+    return {"eventId": 'NETWORK-TEMPLATE-DEPLOYMENT', "details": {"deploymentId": f'Template Deployemnt Id: {deploy_id}', "status": status}}
+
+
+def test_event_status():
+    assert event_status(finished('d1', 'failure')) == {"deploymentId": 'd1', "status": 'FAILURE', "source": 'event',
+                                                       "eventId": 'NETWORK-TEMPLATE-DEPLOYMENT'}
+    assert event_status(finished('d1', 'IN_PROGRESS')) is None
+    assert event_status({"status": 'SUCCESS'}) is None
+    assert event_status('not an event') is None
+
+
+def test_listens_on_loopback_unless_a_token_is_given():
+    assert parse_listen('9000') == ('127.0.0.1', 9000)
+    assert parse_listen('[::1]:9000') == ('::1', 9000)
+    with pytest.raises(ValueError, match='token'):
+        EventReceiver('0.0.0.0:0')
+    EventReceiver('0.0.0.0:0', token='secret').close()
+
+
+def test_token_is_checked():
+    receiver = EventReceiver('127.0.0.1:0', token='secret')
+    try:
+        assert post(receiver, finished('d1')) == 401
+        assert post(receiver, finished('d1'), token='wrong') == 401
+        assert post(receiver, [finished('d1'), finished('d2')], token='secret') == 200
+        assert list(receiver.take({'d1', 'd3'})) == ['d1']
+        # Taken events are removed
+        assert receiver.take({'d1'}) == {}
+    finally:
+        receiver.close()
+
+
+def test_unclaimed_events_are_capped(monkeypatch):
+    monkeypatch.setattr(event_receiver, 'MAX_EVENTS', 3)
+    receiver = EventReceiver('127.0.0.1:0')
+    try:
+        receiver.add([finished(f'd{x}') for x in range(10)])
+        assert list(receiver.finished) == ['d7', 'd8', 'd9']
+    finally:
+        receiver.close()
+
+
+def test_poller_takes_deployments_from_events():
+    receiver = EventReceiver('127.0.0.1:0')
+    try:
+        receiver.add([finished('d1'), finished('d2', 'FAILURE')])
+        polled = []
+        results = dict(poll_deployments(lambda x: polled.append(x), ['d1', 'd2'], events=receiver, event_timeout=30))
+        assert {x: y['status'] for x, y in results.items()} == {"d1": 'SUCCESS', "d2": 'FAILURE'}
+        assert polled == []
+    finally:
+        receiver.close()
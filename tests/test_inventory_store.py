@@ -0,0 +1,94 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# inventory_store.py, and template_runner.py --sync_inventory against the mock server.
+
+import pytest
+
+import template_runner
+from inventory_store import InventoryStore
+
+SERVER = 'dnac.example.com'
+
+
+def device(number, hostname=None):
+    return {"hostname": hostname or f'switch{number}', "id": f'id-{number}', "management_ip": f'10.0.0.{number}',
+            "platform": 'C9300-48P', "serial": f'FOC{number}', "family": 'Switches and Hubs'}
+
+
+@pytest.fixture
+def store():
+    store = InventoryStore(':memory:')
+    yield store
+    store.close()
+
+
+def test_lookup(store):
+    store.replace_devices(SERVER, [device(1, 'Core1.example.com'), device(2, 'core10.example.com'), device(3, 'edge1')])
+    assert [x['id'] for x in store.lookup(SERVER, 'CORE1.example.com')] == ['id-1']
+    assert store.lookup(SERVER, 'core1') == []
+    assert [x['id'] for x in store.lookup(SERVER, 'edge1', prefix=True)] == ['id-3']
+    # A prefix matching several devices returns all of them, so the caller can refuse to guess
+    assert sorted(x['id'] for x in store.lookup(SERVER, 'core1', prefix=True)) == ['id-1', 'id-2']
+    # LIKE wildcards in a name are matched literally
+    assert store.lookup(SERVER, 'core_', prefix=True) == []
+    assert store.lookup('other.example.com', 'edge1') == []
+
+
+def test_replace_devices_in_chunks(store):
+    assert store.replace_devices(SERVER, (device(x) for x in range(1, 1201))) == 1200
+    assert store.replace_devices(SERVER, (device(x) for x in range(1, 11))) == 10
+    assert store.lookup(SERVER, 'switch11') == []
+    assert store.db.execute('SELECT COUNT(*) FROM devices').fetchone()[0] == 10
+
+
+def test_failed_download_keeps_the_stored_devices(store):
+    store.replace_devices(SERVER, [device(1)])
+
+    def download():
+        yield from (device(x) for x in range(2, 700))
+        raise ConnectionError('lost the connection')
+
+    with pytest.raises(ConnectionError):
+        store.replace_devices(SERVER, download())
+    assert [x['id'] for x in store.lookup(SERVER, 'switch1')] == ['id-1']
+    assert store.lookup(SERVER, 'switch2') == []
+
+
+def test_freshness(store):
+    assert not store.is_fresh(SERVER)
+    store.replace_devices(SERVER, [device(1)])
+    assert store.is_fresh(SERVER)
+    store.ttl = 0
+    assert not store.is_fresh(SERVER)
+
+
+def test_sync_inventory(mock_dnac_server, runner_options, tmp_path, capsys):
+    server = mock_dnac_server('--devices', '1234')
+    options = [x for x in runner_options(server) if x != '--no_inventory']
+    template_runner.main(template_runner.parse_args(options + ['--sync_inventory', '--inventory_db', str(tmp_path / 'inventory.db')]))
+    assert 'Device inventory synchronized: 1234 devices.' in capsys.readouterr().out
+    store = InventoryStore(str(tmp_path / 'inventory.db'))
+    assert store.is_fresh(server.url)
+    assert store.lookup(server.url, 'SWITCH1234')[0]['serial'] == 'FOC00001234'
+    store.close()
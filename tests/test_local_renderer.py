@@ -0,0 +1,72 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# local_renderer.py: Jinjava behaviour, includes and the compiled template cache.
+
+import json
+
+import pytest
+
+from local_renderer import LocalRenderer, TemplateNotFound, split_filter
+
+
+def renderer(tmp_path, templates, bytecode_dir=None):
+    # Write the templates ("name": content) to an export file of project "Tests", and return a renderer for it.
+    project = {"name": 'Tests', "templates": [{"name": x, "language": 'JINJA', "templateContent": y}
+                                              for x, y in templates.items()]}
+    (tmp_path / 'export.json').write_text(json.dumps([project]))
+    return LocalRenderer(str(tmp_path), bytecode_dir)
+
+
+def test_split_filter():
+    assert split_filter(' Gi1/0/1  Gi1/0/2 ') == ['Gi1/0/1', 'Gi1/0/2']
+    assert split_filter('a, b,,c', ',') == ['a', 'b', 'c']
+    assert split_filter('a,b,c', ',', 2) == ['a', 'b,c']
+
+
+def test_java_methods_and_concatenation(tmp_path):
+    local = renderer(tmp_path, {"Demo": '{% set ports = ["a", "b", "c", "a"] %}{% do ports.remove(1) %}'
+                                        '{% do ports.remove("a") %}{{ ports }} {{ ports.remove("z") }} {{ "vlan" + 10 }} {{ 1 + 2 }} {{ true + "" }} '
+                                        '{{ name.toUpperCase() }} {{ {"a": 1}.size() }}'})
+    assert local.render('Tests', 'Demo', {"name": 'core'}) == "['c', 'a'] False vlan10 3 true CORE 1"
+
+
+def test_includes_are_expanded(tmp_path):
+    local = renderer(tmp_path, {"Macros": '{% macro port(x) %}interface {{ x }}{% endmacro %}',
+                                "Main": '{% include "Tests/Macros" %}{{ port(name) }}{{ __device.hostname }}',
+                                "Loop": '{% include "Loop" %}'})
+    assert local.render('Tests', 'Main', {"name": 'Gi1/0/1'}, device={"hostname": '!'}) == 'interface Gi1/0/1!'
+    assert local.uses_device('Tests', 'Main')
+    with pytest.raises(TemplateNotFound, match='includes itself'):
+        local.render('Tests', 'Loop', {})
+    with pytest.raises(TemplateNotFound):
+        local.render('Tests', 'Missing', {})
+
+
+def test_compiled_once_and_bytecode_cached(tmp_path):
+    templates = {"A": 'hostname {{ name }}', "B": 'hostname {{ name }}'}
+    local = renderer(tmp_path, templates, bytecode_dir=str(tmp_path / 'bytecode'))
+    # Templates with the same expanded source share one compiled template
+    assert local.compile('Tests', 'A') is local.compile('Tests', 'B')
+    assert len(list((tmp_path / 'bytecode').iterdir())) == 1
+    assert renderer(tmp_path, templates, bytecode_dir=str(tmp_path / 'bytecode')).render('Tests', 'A', {"name": 'sw1'}) == 'hostname sw1'
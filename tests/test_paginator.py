@@ -0,0 +1,90 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# paginator.py against the mock server's device inventory, and its error handling.
+
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from dnac_client import DnacClient
+from paginator import PageError, paginate
+
+DEVICES_PATH = '/dna/intent/api/v1/network-device'
+
+
+@pytest.fixture
+def client(mock_dnac_server):
+    server = mock_dnac_server('--devices', '1234')
+    client = DnacClient(server.url, 'admin', 'password', token_cache=None)
+    client.server = server
+    yield client
+    client.close()
+
+
+def test_every_record_in_order(client):
+    devices = list(paginate(client, DEVICES_PATH, page_size=100, prefetch=3))
+    assert [x['hostname'] for x in devices] == [f'switch{x}' for x in range(1, 1235)]
+    # 13 pages, plus at most "prefetch" requests past the end of the collection
+    assert 13 <= client.server.state.stats[f'GET {DEVICES_PATH}'] <= 16
+
+
+def test_single_page_costs_one_request(client):
+    assert len(list(paginate(client, DEVICES_PATH, page_size=2000))) == 1234
+    assert client.server.state.stats[f'GET {DEVICES_PATH}'] == 1
+
+
+def test_each_page_parsed_once(client):
+    pages = []
+    list(paginate(client, DEVICES_PATH, page_size=500, on_page=lambda result, body: pages.append(len(body['response']))))
+    assert sorted(pages, reverse=True)[:3] == [500, 500, 234]
+
+
+class FailingClient:
+    # Serves full pages until "fail_at", then fails with "error" (an exception) or an HTTP 500 reply.
+
+    def __init__(self, fail_at, error=None):
+        self.fail_at = fail_at
+        self.error = error
+
+    def get(self, path, params):
+        if params['offset'] < self.fail_at:
+            return SimpleNamespace(status_code=200, text='', json=lambda: {"response": [{}] * params['limit']})
+        if self.error:
+            raise self.error
+        return SimpleNamespace(status_code=500, text='Internal error')
+
+
+def test_http_error_raises_page_error():
+    with pytest.raises(PageError) as error:
+        list(paginate(FailingClient(21), DEVICES_PATH, page_size=10))
+    assert error.value.result.status_code == 500
+    assert 'offset 21' in str(error.value)
+
+
+def test_transport_error_in_a_prefetch_thread_raises_page_error():
+    with pytest.raises(PageError) as error:
+        list(paginate(FailingClient(31, requests.ConnectionError('refused')), DEVICES_PATH, page_size=10))
+    assert error.value.result is None
+    assert 'refused' in str(error.value)
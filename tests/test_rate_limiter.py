@@ -0,0 +1,91 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# rate_limiter.py: token buckets, throttling and the retry policy, and the API client against a throttling mock server.
+
+import time
+from types import SimpleNamespace
+
+from dnac_client import DnacClient
+from rate_limiter import MIN_RATE, UNLIMITED_THROTTLE_RATE, RateLimiter, TokenBucket, retry_after
+
+DEVICES_PATH = '/dna/intent/api/v1/network-device'
+
+
+def reply(status_code, **headers):
+    return SimpleNamespace(status_code=status_code, headers=headers)
+
+
+def test_retry_after():
+    assert retry_after(reply(429, **{"Retry-After": '2'})) == 2.0
+    assert retry_after(reply(429, **{"Retry-After": '100000'})) == 300
+    assert retry_after(reply(429, **{"Retry-After": 'soon'})) is None
+    assert retry_after(reply(429)) is None
+    assert retry_after(None) is None
+
+
+def test_bucket_paces_calls():
+    bucket = TokenBucket(20, burst=1)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.15
+
+
+def test_throttling_halves_the_rate_but_never_raises_it():
+    bucket = TokenBucket(8)
+    bucket.throttled()
+    assert bucket.rate == 4
+    # Only adjusted once per second, so a burst of throttled calls halves it once
+    bucket.throttled()
+    assert bucket.rate == 4
+    # A configured rate below MIN_RATE is kept, rather than raised to MIN_RATE
+    slow = TokenBucket(MIN_RATE / 4)
+    slow.throttled()
+    assert slow.rate == MIN_RATE / 4
+
+
+def test_retry_policy():
+    limiter = RateLimiter(max_retries=2)
+    # Throttled calls are retried after the Retry-After time, whatever the method
+    assert limiter.retry_delay('POST', DEVICES_PATH, reply(429, **{"Retry-After": '1'}), 0) == 1.0
+    assert limiter.retry_delay('GET', DEVICES_PATH, reply(429, **{"Retry-After": '1'}), 2) is None
+    # Server and connection errors are only retried for idempotent methods
+    assert limiter.retry_delay('GET', DEVICES_PATH, reply(500), 0) is not None
+    assert limiter.retry_delay('GET', DEVICES_PATH, None, 0) is not None
+    assert limiter.retry_delay('POST', DEVICES_PATH, reply(500), 0) is None
+    assert limiter.retry_delay('POST', DEVICES_PATH, None, 0) is None
+    assert limiter.retry_delay('GET', DEVICES_PATH, reply(200), 0) is None
+    assert limiter.retry_delay('GET', DEVICES_PATH, reply(404), 0) is None
+
+
+def test_client_settles_below_the_server_limit(mock_dnac_server):
+    # The mock answers 429 beyond 5 calls per second.  Without a configured rate, every call still succeeds.
+    server = mock_dnac_server('--rate_limit', '5')
+    client = DnacClient(server.url, 'admin', 'password', token_cache=None)
+    client.limiter = RateLimiter(max_retries=10)
+    results = [client.get(DEVICES_PATH, params={"hostname": f'switch{x}'}) for x in range(1, 13)]
+    assert [x.status_code for x in results] == [200] * 12
+    # The endpoint was throttled, so it now has a bucket held below the rate used for unlimited endpoints
+    assert client.limiter.buckets[DEVICES_PATH].rate < UNLIMITED_THROTTLE_RATE
+    client.close()
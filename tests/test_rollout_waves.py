@@ -0,0 +1,115 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# rollout_waves.py wave planning and circuit breaker, and template_runner.py --waves against the mock server.
+
+import json
+
+import pytest
+
+import template_runner
+from rollout_waves import CircuitBreaker, plan_waves, wave_sizes
+
+
+def test_wave_sizes():
+    assert wave_sizes(10) == [1, 2, 4, 3]
+    assert wave_sizes(10, canary=2, growth=1.5) == [2, 3, 5]
+    assert wave_sizes(10, canary=1, growth=2, max_wave=3) == [1, 2, 3, 3, 1]
+    # Without a canary the first wave is as large as allowed
+    assert wave_sizes(10, canary=0, max_wave=4) == [4, 4, 2]
+
+
+def test_plan_waves_limits_each_group():
+    devices = [(f'{site}-{x}', {"site": site}) for site in ['nyc', 'bos'] for x in range(4)]
+    waves = plan_waves(devices, canary=2, growth=2, group_of=lambda x: x[1]['site'], max_per_group=2)
+    assert [len(x) for x in waves] == [2, 4, 2]
+    for wave in waves:
+        assert all(len([x for x in wave if x[1]['site'] == site]) <= 2 for site in ['nyc', 'bos'])
+    assert sorted(x for wave in waves for x, _ in wave) == sorted(x for x, _ in devices)
+
+
+def test_breaker_waits_for_enough_results():
+    breaker = CircuitBreaker(0.25, window=8)
+    # One failure in the first result is not yet 25% of a meaningful sample
+    breaker.record('FAILURE')
+    assert not breaker.tripped()
+    for _ in range(3):
+        breaker.record('SUCCESS')
+    assert not breaker.tripped()
+    breaker.record('TIMEOUT')
+    assert breaker.tripped()
+    assert breaker.failure_rate == 0.4
+
+
+def test_breaker_window_forgets_old_results():
+    breaker = CircuitBreaker(0.5, window=4)
+    for status in ['FAILURE', 'FAILURE', 'FAILURE', 'SUCCESS', 'SUCCESS', 'UNCHANGED', 'SUCCESS']:
+        breaker.record(status)
+    assert breaker.failure_rate == 0.0 and not breaker.tripped()
+
+
+@pytest.fixture
+def rollout(mock_dnac_server, runner_options, tmp_path, capsys):
+    # Run template_runner.py --waves for 20 devices on a mock server started with "server_options", and return its
+    # output and the results for each device.
+    devices = [f'switch{x}' for x in range(1, 21)]
+    (tmp_path / 'devices.txt').write_text('\n'.join(devices) + '\n')
+    (tmp_path / 'input.json').write_text(json.dumps({"vlan": 10}))
+
+    def run(server_options, *argv):
+        server = mock_dnac_server('--devices', '20', *server_options)
+        args = template_runner.parse_args(runner_options(
+            server, '--template_project', 'Tests', '--template_name', 'Ports', '--devices_file', str(tmp_path / 'devices.txt'),
+            '--input_file', str(tmp_path / 'input.json'), '--waves', *argv))
+        try:
+            template_runner.main(args)
+        except SystemExit:
+            pass
+        output = capsys.readouterr().out
+        statuses = {x: line.split(': ', 1)[1].split(' ')[0] for line in output.split('Template Results:')[1].splitlines()
+                    for x in devices if line.startswith(f'{x}: ')}
+        return output, statuses
+
+    return run
+
+
+def test_rollout_completes_every_wave(rollout):
+    output, statuses = rollout([])
+    assert 'Rollout plan: 20 devices in 5 waves of 1, 2, 4, 8, 5 devices.' in output
+    assert set(statuses.values()) == {'SUCCESS'} and len(statuses) == 20
+
+
+def test_failed_canary_halts_the_rollout(rollout):
+    output, statuses = rollout(['--failure_rate', '1'])
+    assert 'Rollout halted during wave 1 of 5: canary device switch1 did not succeed' in output
+    assert statuses['switch1'] == 'FAILURE'
+    assert [x for x, y in statuses.items() if y != 'HALTED'] == ['switch1']
+
+
+def test_breaker_halts_part_way_through_a_wave(rollout):
+    # One wave of every device, submitted slowly enough for the first failures to arrive while it is being submitted
+    output, statuses = rollout(['--failure_rate', '1', '--latency', '0.05'], '--canary', '0', '--workers', '1',
+                               '--max_failure_rate', '0.5', '--failure_window', '4')
+    assert 'Rollout plan: 20 devices in 1 waves of 20 devices.' in output
+    assert 'Rollout halted during wave 1 of 1: 100% of the last' in output
+    assert list(statuses.values()).count('HALTED') >= 5
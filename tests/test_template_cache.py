@@ -0,0 +1,88 @@
+"""
+Copyright (c) 2024 Cisco and/or its affiliates.
+
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+
+               https://developer.cisco.com/docs/licenses
+
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+
+"""
+
+__author__ = "Aron Donaldson <ardonald@cisco.com>"
+__contributors__ = ""
+__copyright__ = "Copyright (c) 2024 Cisco and/or its affiliates."
+__license__ = "Cisco Sample Code License, Version 1.1"
+
+# template_cache.py, and template_runner.get_template_info() using it against the mock server.
+
+import pytest
+
+import template_runner
+from dnac_client import DnacClient
+from template_cache import TemplateCache, template_info, template_version
+
+SERVER = 'dnac.example.com'
+LOOKUP = 'GET /dna/intent/api/v2/template-programmer/template'
+
+
+def test_template_version():
+    assert template_version({"versionsInfo": [{"version": '2'}, {"version": '10'}, {"version": '9'}]}) == '10'
+    assert template_version({"versionsInfo": [], "lastUpdateTime": 1700000000000}) == '1700000000000'
+    assert template_version({}) == ''
+
+
+def test_template_info_detects_bind_variables():
+    record = {"id": 't1', "versionsInfo": [{"version": '1'}], "templateParams": [{"parameterName": '__device', "binding": ''}]}
+    assert template_info(record) == {"id": 't1', "version": '1', "params": record['templateParams'], "bind_variables": True}
+
+
+def test_cache_entries():
+    cache = TemplateCache(':memory:', ttl=3600)
+    info = {"id": 't1', "version": '1', "params": [], "bind_variables": False}
+    assert cache.get(SERVER, 'Project', 'Name') is None
+    cache.put(SERVER, 'Project', 'Name', info)
+    assert cache.get(SERVER, 'Project', 'Name') == {**info, "stale": False}
+    cache.ttl = 0
+    assert cache.get(SERVER, 'Project', 'Name')['stale']
+    cache.invalidate(SERVER, 't1')
+    assert cache.get(SERVER, 'Project', 'Name') is None
+    cache.close()
+
+
+@pytest.fixture
+def client(mock_dnac_server):
+    server = mock_dnac_server()
+    server.state.templates['t1'] = {"id": 't1', "name": 'Ports', "projectName": 'Tests', "templateParams": [],
+                                    "versionsInfo": [{"version": '1'}]}
+    client = DnacClient(server.url, 'admin', 'password', token_cache=None)
+    client.template_cache = TemplateCache(':memory:', ttl=3600)
+    client.server = server
+    yield client
+    client.template_cache.close()
+    client.close()
+
+
+def test_cached_lookup_makes_no_call(client):
+    assert template_runner.get_template_info(client, 'Tests', 'Ports')['version'] == '1'
+    assert template_runner.get_template_info(client, 'Tests', 'Ports')['version'] == '1'
+    assert client.server.state.stats[LOOKUP] == 1
+
+
+def test_stale_or_refreshed_lookup_finds_a_new_version(client):
+    template_runner.get_template_info(client, 'Tests', 'Ports')
+    client.server.state.templates['t1']['versionsInfo'].append({"version": '2'})
+    # Within the TTL the cached version is used, unless a refresh is asked for
+    assert template_runner.get_template_info(client, 'Tests', 'Ports')['version'] == '1'
+    assert template_runner.get_template_info(client, 'Tests', 'Ports', refresh=True)['version'] == '2'
+    client.server.state.templates['t1']['versionsInfo'].append({"version": '3'})
+    client.template_cache.ttl = 0
+    assert template_runner.get_template_info(client, 'Tests', 'Ports')['version'] == '3'
+    assert client.server.state.stats[LOOKUP] == 3